@@ -24,6 +24,8 @@
 #      the future is now.
 from __future__ import absolute_import
 
+import sys
+
 # These module used an __all__ to control importing
 from .sampling import *
 from .runtime import *
@@ -46,10 +48,13 @@ from .bundle import (Bundle, SortedBundle, ViewBundle, AndBundle,
 from .configuration import Configuration
 from .task import Task, PythonTask, DummyTask
 from .project import Project
+
+if sys.version_info >= (3, 5):
+    from .asyncproject import AsyncProject
 from .scheduler import Scheduler
 from .model import Model
 from .generator import TaskGenerator
-from .worker import WorkerScheduler, Worker
+from .worker import WorkerScheduler, SlotWorkerScheduler, Worker
 from .logentry import LogEntry
 from .reducer import (ActionParser, BashParser, ChainedParser,
                       DictFilterParser, PrefixParser, StageParser, StrFilterParser,
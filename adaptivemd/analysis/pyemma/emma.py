@@ -26,7 +26,6 @@ import os
 from ._remote import remote_analysis
 from ..analysis import Analysis
 from ...task import PythonTask
-from ...mongodb import DataDict
 from ...model import Model
 
 
@@ -104,8 +103,8 @@ class PyEMMAAnalysis(Analysis):
         # from the task we get the used generator and then its outtype
         data['input']['modeller'] = task.generator
 
-        # wrapping in a DataDict allows storage of large files!
-        model = Model(DataDict(data))
+        # each section is stored as a separate ModelSection and loaded on access
+        model = Model(data)
         project.models.add(model)
 
     def execute(self,
@@ -0,0 +1,414 @@
+##############################################################################
+# adaptiveMD: A Python Framework to Run Adaptive Molecular Dynamics (MD)
+#             Simulations on HPC Resources
+# Copyright 2017 FU Berlin and the Authors
+#
+# Authors: Jan-Hendrik Prinz
+#          John Ossyra
+# Contributors:
+#
+# `adaptiveMD` is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with MDTraj. If not, see <http://www.gnu.org/licenses/>.
+##############################################################################
+"""
+Asyncio front end of a `Project`
+
+All DB access of adaptivemd is blocking, so calls are run in a thread pool
+while the coroutines wait. Conditions are checked again when the change
+notifier of the storage reports a change of a store they depend on, so many
+concurrent adaptive loops can be driven from a single event loop without a
+thread per loop.
+
+Examples
+--------
+>>> async def main():  # doctest: +SKIP
+...     async with await AsyncProject.open('test') as project:
+...         await project.queue(tasks)
+...         await project.wait_until(tasks[0].is_done)
+>>> asyncio.get_event_loop().run_until_complete(main())  # doctest: +SKIP
+
+"""
+from __future__ import absolute_import
+
+import asyncio
+import functools
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+from .condition import Condition, merge_dependencies
+from .plan import ExecutionPlan
+from .project import Project
+
+from .util import get_logger
+logger = get_logger(__name__)
+
+
+# returned by `next` in the thread pool if a plan is finished. Raising
+# `StopIteration` into a future is not possible
+_finished = object()
+
+
+class TasksProgressed(Condition):
+    """
+    Condition that is True if any or all tasks left the queue
+
+    """
+    progressed = {'running', 'cancelled', 'success', 'fail'}
+
+    def __init__(self, tasks, require=all):
+        super(TasksProgressed, self).__init__()
+        self.tasks = list(tasks)
+        self.require = require
+
+    def check(self):
+        return self.require(t.state in self.progressed for t in self.tasks)
+
+    def dependencies(self):
+        return {'tasks'}
+
+
+class AsyncProject(object):
+    """
+    Awaitable interface to queue tasks, wait for conditions and run plans
+
+    Attributes
+    ----------
+    project : `Project`
+        the wrapped project
+    executor : `concurrent.futures.Executor`
+        the pool that runs the blocking calls
+
+    """
+    def __init__(self, project, executor=None, max_workers=8):
+        """
+
+        Parameters
+        ----------
+        project : `Project`
+            the project to be wrapped
+        executor : `concurrent.futures.Executor` or None
+            the pool to run blocking calls. If None a thread pool with
+            `max_workers` threads is created and shut down on `close`
+        max_workers : int
+            the size of the created thread pool
+
+        """
+        self.project = project
+        self._own_executor = executor is None
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        self.executor = executor
+        self._loop = None
+        self._notifier = None
+        self._waiters = []
+
+    @classmethod
+    async def open(cls, name, executor=None, max_workers=8):
+        """
+        Open a project without blocking the event loop
+
+        Parameters
+        ----------
+        name : str
+            the name of the project
+
+        Returns
+        -------
+        `AsyncProject`
+            the opened project
+
+        """
+        obj = cls(None, executor, max_workers)
+        obj.project = await obj.call(Project, name)
+        return obj
+
+    async def close(self):
+        """
+        Close the project and the created thread pool
+
+        """
+        if self._notifier is not None:
+            self._notifier.remove_listener(self._listener)
+            self._notifier = None
+
+        await self.call(self.project.close)
+
+        if self._own_executor:
+            self.executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def call(self, func, *args, **kwargs):
+        """
+        Run a blocking function in the thread pool
+
+        Parameters
+        ----------
+        func : function
+            the function to be called with the given arguments
+
+        Returns
+        -------
+        object
+            the result of the function
+
+        """
+        return await asyncio.get_event_loop().run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs))
+
+    async def queue(self, *tasks, **kwargs):
+        """
+        Submit tasks to the worker queue, see `Project.queue`
+
+        """
+        return await self.call(self.project.queue, *tasks, **kwargs)
+
+    async def trigger(self):
+        """
+        Check the events of the project, see `Project.trigger`
+
+        """
+        return await self.call(self.project.trigger)
+
+    async def check(self, condition):
+        """
+        Evaluate a condition in the thread pool
+
+        Parameters
+        ----------
+        condition : `Condition` or callable -> bool
+            the condition
+
+        Returns
+        -------
+        bool
+            the result of the condition
+
+        """
+        return bool(await self.call(condition))
+
+    def _listener(self, name):
+        # called in the thread of the notifier
+        self._loop.call_soon_threadsafe(self._wake, name)
+
+    def _wake(self, name):
+        for names, future in self._waiters:
+            if name in names and not future.done():
+                future.set_result(True)
+
+    async def notifier(self):
+        """
+        Return the change notifier of the storage
+
+        Returns
+        -------
+        :class:`mongodb.notifier.ChangeNotifier`
+            the running notifier that wakes up this event loop
+
+        """
+        notifier = self.project.storage.change_notifier()
+        if notifier is not self._notifier:
+            if self._notifier is not None:
+                self._notifier.remove_listener(self._listener)
+
+            self._loop = asyncio.get_event_loop()
+            notifier.add_listener(self._listener)
+            self._notifier = notifier
+
+        return notifier
+
+    async def wait_for_changes(self, names, since, timeout=None):
+        """
+        Wait until a document of one of the stores changes
+
+        Parameters
+        ----------
+        names : iterable of str
+            the names of the stores
+        since : dict of str, int
+            a snapshot of the versions of the change notifier. Changes after
+            the snapshot return immediately
+        timeout : float or None
+            maximal number of seconds to wait
+
+        Returns
+        -------
+        bool
+            True if a store was changed, False after a timeout
+
+        """
+        names = set(names)
+        notifier = await self.notifier()
+        await self.call(notifier.watch, names)
+
+        waiter = (names, asyncio.get_event_loop().create_future())
+        self._waiters.append(waiter)
+        try:
+            versions = notifier.snapshot()
+            if any(
+                    versions.get(name, 0) != since.get(name, 0)
+                    for name in names):
+                return True
+
+            await asyncio.wait_for(waiter[1], timeout)
+            return True
+
+        except asyncio.TimeoutError:
+            return False
+
+        finally:
+            self._waiters.remove(waiter)
+
+    async def wait_until(self, condition, timeout=None):
+        """
+        Wait until a condition evaluates to True
+
+        The events of the project are triggered meanwhile like in
+        `Project.wait_until`.
+
+        Parameters
+        ----------
+        condition : (list of) `Condition` or callable -> bool
+            the condition is checked whenever a store it depends on
+            changes, conditions with unknown dependencies in regular
+            intervals. A list waits until all conditions are True
+        timeout : float or None
+            maximal number of seconds to wait
+
+        Returns
+        -------
+        bool
+            True if the condition is met, False after a timeout
+
+        """
+        end = None if timeout is None else time.time() + timeout
+
+        if isinstance(condition, (list, tuple)):
+            for c in condition:
+                remaining = None if end is None else end - time.time()
+                if not await self.wait_until(c, remaining):
+                    return False
+
+            return True
+
+        await self.notifier()
+
+        while True:
+            # watches the stores of the condition, which reads the DB
+            since = await self.call(
+                self.project._snapshot_changes, [condition])
+            if await self.check(condition):
+                return True
+
+            await self.trigger()
+
+            if end is not None and time.time() >= end:
+                return False
+
+            await self._wait_for_events(since, [condition], end)
+
+    async def _wait_for_events(self, since, conditions=(), end=None):
+        # the async version of `Project._wait_for_changes`
+        project = self.project
+        deps = merge_dependencies(list(project._events) + list(conditions))
+        if deps is None:
+            deps = set()
+            wait = project._trigger_interval
+        else:
+            wait = project._max_trigger_interval
+
+        if end is not None:
+            wait = max(0.0, min(wait, end - time.time()))
+
+        return await self.wait_for_changes(deps, since, wait)
+
+    async def queue_tasks(self, tasks, wait=False, batchsize=9999999):
+        """
+        Queue tasks in batches, see `runtime.control.queue_tasks`
+
+        Parameters
+        ----------
+        tasks : list of `Task`
+            the tasks to be queued
+        wait : False, `any` or `all`
+            if given, the next batch is queued once any or all tasks of the
+            previous batch left the queue
+        batchsize : int
+            the number of tasks queued at a time
+
+        """
+        if wait:
+            if wait == 'any':
+                require = any
+            elif wait == 'all':
+                require = all
+            else:
+                raise ValueError(
+                    "Wait argument must be 'any' or 'all' if given")
+
+        for i in range(0, len(tasks), batchsize):
+            batch = tasks[i:i + batchsize]
+            await self.queue(batch)
+
+            if wait:
+                await self.wait_until(TasksProgressed(batch, require))
+
+    async def run_plan(self, plan):
+        """
+        Execute an `ExecutionPlan` generator
+
+        The code of the generator runs in the thread pool and every yielded
+        condition is awaited before it continues. Several plans can run
+        concurrently using e.g. `asyncio.gather`.
+
+        Parameters
+        ----------
+        plan : generator, generator function or `ExecutionPlan`
+            the plan that yields (lists of) conditions to wait for
+
+        """
+        if isinstance(plan, ExecutionPlan):
+            generator = plan._generator
+        elif isinstance(plan, types.GeneratorType):
+            generator = plan
+        else:
+            generator = plan()
+
+        while True:
+            conditions = await self.call(next, generator, _finished)
+            if conditions is _finished:
+                break
+
+            if conditions is not None:
+                await self.wait_until(conditions)
+
+    async def run(self):
+        """
+        Trigger the events of the project until all are done
+
+        This is the asynchronous equivalent of `Project.run`. Cancel the
+        task to stop early.
+
+        """
+        await self.notifier()
+
+        while not self.project.events_done():
+            since = await self.call(self.project._snapshot_changes)
+            await self.trigger()
+            await self._wait_for_events(since)
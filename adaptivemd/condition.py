@@ -60,6 +60,22 @@ class Condition(object):
     def check(self):
         return True
 
+    def dependencies(self):
+        """
+        Return the names of the stores the condition depends on
+
+        The result of the condition can only change if a document in one
+        of these stores changes, so it does not need to be checked before.
+
+        Returns
+        -------
+        set of str or None
+            the store names or None if the dependencies are unknown and the
+            condition has to be checked regularly
+
+        """
+        return None
+
     # implement limited set of logic operations
 
     def __or__(self, other):
@@ -93,6 +109,9 @@ class InvertCondition(Condition):
     def __call__(self):
         return not self.condition()
 
+    def dependencies(self):
+        return dependencies(self.condition)
+
 
 class AndCondition(Condition):
     def __init__(self, condition1, condition2):
@@ -103,6 +122,9 @@ class AndCondition(Condition):
     def __call__(self,):
         return self.condition1() and self.condition2()
 
+    def dependencies(self):
+        return merge_dependencies([self.condition1, self.condition2])
+
 
 class OrCondition(Condition):
     def __init__(self, condition1, condition2):
@@ -113,6 +135,9 @@ class OrCondition(Condition):
     def __call__(self,):
         return self.condition1() or self.condition2()
 
+    def dependencies(self):
+        return merge_dependencies([self.condition1, self.condition2])
+
 
 class Now(Condition):
     """
@@ -125,6 +150,9 @@ class Now(Condition):
     def check(self):
         return True
 
+    def dependencies(self):
+        return set()
+
 
 class Never(Condition):
     """
@@ -137,6 +165,9 @@ class Never(Condition):
     def check(self):
         return False
 
+    def dependencies(self):
+        return set()
+
 
 class ConditionList(list):
     """
@@ -148,3 +179,59 @@ class ConditionList(list):
     def is_done(self):
         return all([x() for x in self])
 
+    def dependencies(self):
+        return merge_dependencies(self)
+
+
+def dependencies(condition):
+    """
+    Return the names of the stores a condition depends on
+
+    Parameters
+    ----------
+    condition : `Condition` or callable -> bool
+        the condition. Besides conditions, methods of stored objects like
+        `Task.is_done` depend on the store of the object
+
+    Returns
+    -------
+    set of str or None
+        the store names or None if the dependencies are unknown
+
+    """
+    if hasattr(condition, 'dependencies'):
+        return condition.dependencies()
+
+    store = getattr(getattr(condition, '__self__', None), '__store__', None)
+    if store is not None:
+        return {store.name}
+
+    return None
+
+
+def merge_dependencies(conditions):
+    """
+    Return the names of the stores any of the conditions depends on
+
+    Parameters
+    ----------
+    conditions : iterable of `Condition` or callable -> bool
+        the conditions
+
+    Returns
+    -------
+    set of str or None
+        the store names or None if the dependencies of one of the
+        conditions are unknown
+
+    """
+    result = set()
+    for condition in conditions:
+        deps = dependencies(condition)
+        if deps is None:
+            return None
+
+        result.update(deps)
+
+    return result
+
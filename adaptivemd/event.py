@@ -23,7 +23,7 @@ from __future__ import print_function, absolute_import
 
 from itertools import chain
 
-from .condition import Condition
+from .condition import Condition, dependencies, merge_dependencies
 from .task import Task
 
 
@@ -118,6 +118,24 @@ class Event(object):
         self._update_conditions()
         return self._current_when is not None or self.has_running_tasks
 
+    def dependencies(self):
+        """
+        Return the names of the stores the next trigger depends on
+
+        Returns
+        -------
+        set of str or None
+            the store names or None if the dependencies are unknown
+
+        """
+        conditions = list(self._finish_conditions)
+        if self._current_when is not None:
+            conditions.append(self._current_when)
+            if self._until is not None:
+                conditions.append(self._until)
+
+        return merge_dependencies(conditions)
+
     def _generate(self, scheduler):
         if self._generator is not None:
             # todo: this should be cleaner and not guess the number of args
@@ -269,6 +287,9 @@ class TasksFinished(Condition):
     def check(self):
         return not bool(self.event)
 
+    def dependencies(self):
+        return dependencies(self.event)
+
 
 class StopEvent(Event):
     """
@@ -3,6 +3,7 @@ from __future__ import print_function, absolute_import
 import os
 import time
 import six
+from pymongo import ReturnDocument
 
 from .mongodb import (StorableMixin, ObjectJSON,
                       JSONDataSyncVariable, SyncVariable, ObjectSyncVariable, DataDict)
@@ -709,6 +710,13 @@ class URLGenerator(object):
 
     Helps you to generate unique filenames.
 
+    If a counter in a storage is used, numbers are reserved atomically in the
+    DB so several processes never hand out the same name. Numbers are
+    reserved in blocks that start with a single name and double with each
+    reservation up to `block_size`, so names are unique but not necessarily
+    consecutive. A process that creates only a few names leaves only small
+    gaps.
+
     Examples
     --------
     >>> gen = URLGenerator('mypath/{count:04}.dcd')
@@ -717,25 +725,119 @@ class URLGenerator(object):
     >>> next(gen)
     'mypath/0001.dcd'
 
+    Attributes
+    ----------
+    block_size : int
+        the largest number of names reserved per DB round trip
+
     """
-    def __init__(self, shape, bundle=None):
+    def __init__(self, shape, bundle=None, block_size=256):
         if bundle is None:
             self.count = 0
         else:
             self.count = len(bundle)
 
         self.shape = shape
+        self.block_size = block_size
+        self._files = None
+        self._storage = None
+        self._key = None
+        # reserved numbers as list of [next, stop]
+        self._reserved = []
+        self._next_block = 1
 
     def __iter__(self):
         return self
 
     def next(self):
+        if self._storage is not None:
+            self.reserve(1)
+            block = self._reserved[0]
+            count = block[0]
+            block[0] += 1
+            if block[0] == block[1]:
+                del self._reserved[0]
+
+            return self.shape.format(count=count)
+
+        if self._files is not None:
+            files, self._files = self._files, None
+            self.initialize_from_files(files())
+
         fn = self.shape.format(count=self.count)
         self.count += 1
         return fn
 
     __next__ = next
 
+    def use_counter(self, storage, key):
+        """
+        Use a counter document in a storage to reserve numbers
+
+        Parameters
+        ----------
+        storage : :class:`mongodb.MongoDBStorage`
+            the storage that holds the `counters` collection
+        key : str
+            the name of the counter
+
+        """
+        self._storage = storage
+        self._key = key
+        self._reserved = []
+        self._next_block = 1
+
+    @property
+    def available(self):
+        """
+        int : the number of names reserved but not used yet
+        """
+        return sum(stop - start for start, stop in self._reserved)
+
+    def reserve(self, number):
+        """
+        Make sure that a number of names is reserved for this generator
+
+        Uses at most one DB round trip. If names need to be reserved, the
+        next block is reserved if it is larger than the missing number.
+
+        Parameters
+        ----------
+        number : int
+            the number of names that will be requested
+
+        """
+        if self._storage is None:
+            return
+
+        missing = number - self.available
+        if missing <= 0:
+            return
+
+        counters = self._storage.db['counters']
+
+        if self._files is not None:
+            # initialize the counter of projects that did not have one
+            files, self._files = self._files, None
+            if counters.find_one({'_id': self._key}) is None:
+                self.initialize_from_files(files())
+                counters.update_one(
+                    {'_id': self._key},
+                    {'$max': {'count': self.count}},
+                    upsert=True)
+
+        size = max(missing, min(self._next_block, self.block_size))
+        self._next_block = min(2 * size, self.block_size)
+
+        dct = counters.find_one_and_update(
+            {'_id': self._key},
+            {'$inc': {'count': size}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER)
+
+        stop = dct['count']
+        self._reserved.append([stop - size, stop])
+
     def initialize_from_files(self, files):
         """
         Set the next available number from a list of files
@@ -746,8 +848,6 @@ class URLGenerator(object):
 
         """
         # a little cheat to figure out the last number
-
-        # todo: might be better to store the current number in the project DB
         self.count = 0
         left = len(self.shape.split('{')[0].split('/')[-1])
         right = len(self.shape.split('}')[-1])
@@ -758,6 +858,21 @@ class URLGenerator(object):
             except Exception:
                 pass
 
+    def initialize_on_demand(self, files):
+        """
+        Set the next available number from files once a name is requested
+
+        If a counter is used, the files are only scanned if the counter does
+        not exist yet.
+
+        Parameters
+        ----------
+        files : callable
+            returns the list of `Location` objects to be scanned
+
+        """
+        self._files = files
+
 
 ##############################################################################
 # Actions
@@ -49,19 +49,24 @@ class LogEntry(StorableMixin):
         pick `LogEntry.SEVERE`, `LogEntry.ERROR` or `LogEntry.INFO` (default)
     objs : dict of storable objects
         you can attach objects that can help with specifying the error message
+    location : str or None
+        the path of a file with the full message, if `message` only holds a
+        part of it
     """
 
     SEVERE = 1
     ERROR = 2
     INFO = 3
 
-    def __init__(self, logger, title, message, level=INFO, objs=None):
+    def __init__(self, logger, title, message, level=INFO, objs=None,
+                 location=None):
         super(LogEntry, self).__init__()
         self.logger = logger
         self.title = title
         self.message = message
         self.level = level
         self.objs = objs
+        self.location = location
 
     def __str__(self):
         return '%s [%s:%s] %s\n%s' % (
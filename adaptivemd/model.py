@@ -21,34 +21,240 @@
 ##############################################################################
 from __future__ import absolute_import
 
-from .mongodb import StorableMixin
+import numbers
+
+import numpy as np
+import six
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+from .mongodb import StorableMixin, DataDict
+
+
+def _is_parameter(value):
+    return value is None or isinstance(
+        value, (numbers.Number, six.string_types, np.generic))
+
+
+def _as_parameter(value):
+    if isinstance(value, np.generic):
+        return value.item()
+
+    return value
+
+
+def model_header(data):
+    """
+    Collect the scalar parameters and the shapes of the sections of a model
+
+    Parameters
+    ----------
+    data : dict of str : dict
+        the full model data as returned by the analysis
+
+    Returns
+    -------
+    header : dict of str : dict
+        for each section the values of all scalar entries
+    shapes : dict of str : dict
+        for each section the shape of all arrays and the length of all lists
+
+    """
+    header = dict()
+    shapes = dict()
+    for key, section in data.items():
+        if not isinstance(section, dict):
+            continue
+
+        header[key] = {
+            name: _as_parameter(value) for name, value in section.items()
+            if _is_parameter(value)}
+
+        shapes[key] = dict()
+        for name, value in section.items():
+            if isinstance(value, np.ndarray):
+                shapes[key][name] = list(value.shape)
+            elif isinstance(value, (list, tuple)):
+                shapes[key][name] = [len(value)]
+
+    return header, shapes
+
+
+class ModelSection(DataDict):
+    """
+    A `DataDict` holding one section of a `Model`
+
+    References to a section are built as a `LoaderProxy`, so the content is
+    only read from GridFS once it is accessed.
+    """
+
+    _load_lazy = True
+
+
+class ModelData(Mapping):
+    """
+    Read-only view of the sections of a `Model`
+
+    A section is only loaded from the storage when it is accessed.
+    """
+    def __init__(self, model):
+        self._model = model
+
+    @property
+    def data(self):
+        # used to be a `DataDict`, so `model.data.data` still works
+        return self
+
+    def __getitem__(self, item):
+        return self._model._section(item)
+
+    def __iter__(self):
+        return iter(self._model._keys())
+
+    def __len__(self):
+        return len(self._model._keys())
+
+    def __contains__(self, item):
+        return item in self._model._keys()
 
 
 class Model(StorableMixin):
     """
     A wrapper to hold model data
 
+    Each top-level section of the data is stored as a separate `ModelSection`
+    that is only loaded when the section is accessed. A small header with all
+    scalar parameters and the shapes of all arrays is kept in the model
+    document itself so that models can be listed and filtered cheaply.
+
     Examples
     --------
-    >>> m = Model({'msm' : [[0.9, 0.1], [0.1, 0.9]]})
-    >>> print(m.msm)
+    >>> m = Model({'msm' : {'lagtime': 2, 'P': [[0.9, 0.1], [0.1, 0.9]]}})
+    >>> print(m.msm['P'])
     [[0.9, 0.1], [0.1, 0.9]]
-    >>> print(m['msm'])
+    >>> print(m['msm']['P'])
     [[0.9, 0.1], [0.1, 0.9]]
+    >>> print(m.parameter('msm', 'lagtime'))
+    2
 
 
     Attributes
     ----------
-    data : dict of str : anything
-        the data of the model
+    data : `ModelData`
+        the data of the model, sections are loaded on access
+    header : dict of str : dict
+        the scalar parameters of each section
+    shapes : dict of str : dict
+        the shapes of the arrays and lists of each section
     """
-    def __init__(self, data):
+    def __init__(self, data, header=None, shapes=None):
         super(Model, self).__init__()
-        self.data = data
+
+        if isinstance(data, dict):
+            if header is None:
+                header, shapes = model_header(data)
+
+            data = {
+                key: value if isinstance(value, DataDict)
+                else ModelSection(value)
+                for key, value in data.items()}
+
+        # a model stored as a single `DataDict` has no header
+        self._sections = data
+        self.header = header or dict()
+        self.shapes = shapes or dict()
+
+    def to_dict(self):
+        return {
+            'data': self._sections,
+            'header': self.header,
+            'shapes': self.shapes
+        }
+
+    @property
+    def data(self):
+        return ModelData(self)
+
+    def _keys(self):
+        if isinstance(self._sections, dict):
+            return list(self._sections)
+        else:
+            return list(self._sections.data)
+
+    def _section(self, key):
+        if isinstance(self._sections, dict):
+            return self._sections[key].data
+        else:
+            return self._sections.data[key]
+
+    def parameter(self, section, name):
+        """
+        Return a scalar parameter of the model
+
+        The header is used if possible so the section is not loaded.
+
+        Parameters
+        ----------
+        section : str
+            the name of the section, e.g. `msm`
+        name : str
+            the name of the parameter, e.g. `lagtime`
+
+        Returns
+        -------
+        object
+            the value or `None` if not present
+
+        """
+        if section in self.header:
+            return self.header[section].get(name)
+
+        return self.data.get(section, dict()).get(name)
+
+    def shape(self, section, name):
+        """
+        Return the shape of an array or list in the model
+
+        Parameters
+        ----------
+        section : str
+            the name of the section, e.g. `msm`
+        name : str
+            the name of the entry, e.g. `P`
+
+        Returns
+        -------
+        list of int or None
+            the shape of the array or the length of the list, `None` if the
+            entry is neither
+
+        """
+        if section in self.shapes:
+            return self.shapes[section].get(name)
+
+        # a model stored without shapes. Do not use `np.shape` on lists, it
+        # never stops on items like `Trajectory` that return `None` for any
+        # index instead of raising an `IndexError`
+        value = self.data[section][name]
+        if isinstance(value, np.ndarray):
+            return list(value.shape)
+        elif isinstance(value, (list, tuple)):
+            return [len(value)]
+
+        return None
 
     def __getitem__(self, item):
         return self.data[item]
 
     def __getattr__(self, item):
+        # avoid recursion while the object is not yet initialized
+        if item.startswith('_'):
+            raise AttributeError(item)
+
         if item in self.data:
-            return self.data[item]
\ No newline at end of file
+            return self.data[item]
+
+        raise AttributeError(item)
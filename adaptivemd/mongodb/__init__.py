@@ -28,14 +28,20 @@ from __future__ import absolute_import
 
 
 from .base import StorableMixin, create_to_dict
-from .syncvar import SyncVariable, ObjectSyncVariable, JSONDataSyncVariable
+from .syncvar import SyncVariable, ObjectSyncVariable, JSONDataSyncVariable, \
+    refresh_sync_variables, exchange_sync_variables
+from .watcher import SyncWatcher
+from .notifier import ChangeNotifier, QueueBell
+from .batch import WriteBatch
+from .connection import get_client
 from .cache import WeakKeyCache, WeakLRUCache, WeakValueCache, MaxCache, \
-    NoCache, Cache, LRUCache
+    NoCache, Cache, LRUCache, MemoryLRUCache
 from .dictify import ObjectJSON, UUIDObjectJSON
 from .mongodb import MongoDBStorage
 
 from .object import ObjectStore
 
-from .proxy import DelayedLoader, lazy_loading_attributes, LoaderProxy
+from .proxy import DelayedLoader, lazy_loading_attributes, LoaderProxy, \
+    DocumentProxy
 
 from .file import FileStore, DataDict
@@ -57,6 +57,14 @@ class StorableMixin(object):
     _args = None
     _ignore = False
     _find_by = []
+    # derived attributes that are stored as top-level fields to be used in
+    # queries and indexes. They are not restored when loading
+    _index_by = []
+    # compound indexes as lists of (field, direction) created with the store
+    _indexes = []
+    # if True references to objects of this class are stored with a `_lazy`
+    # flag and built as a `LoaderProxy` that is only loaded on access
+    _load_lazy = False
 
     INSTANCE_UUID = list(uuid.uuid1().fields[:-1])
     CREATION_COUNT = long_t(0)
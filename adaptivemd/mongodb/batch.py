@@ -0,0 +1,115 @@
+##############################################################################
+# adaptiveMD: A Python Framework to Run Adaptive Molecular Dynamics (MD)
+#             Simulations on HPC Resources
+# Copyright 2017 FU Berlin and the Authors
+#
+# Authors: Jan-Hendrik Prinz
+# Contributors:
+#
+# `adaptiveMD` is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with MDTraj. If not, see <http://www.gnu.org/licenses/>.
+##############################################################################
+from __future__ import absolute_import
+
+from collections import OrderedDict
+
+from pymongo import UpdateOne
+
+from ..util import get_logger
+logger = get_logger(__name__)
+
+
+class WriteBatch(object):
+    """
+    Buffer of sync variable writes that are sent using a single `bulk_write`
+
+    Writes to the same document are merged into one update in the order they
+    were made, so the last value written wins. Documents are updated in the
+    order of their first write.
+
+    Attributes
+    ----------
+    max_ops : int
+        the number of buffered writes after which the batch is flushed
+        automatically
+
+    """
+    def __init__(self, max_ops=100):
+        self.max_ops = max_ops
+        self._updates = OrderedDict()
+        self._n_ops = 0
+
+    def __len__(self):
+        return self._n_ops
+
+    def set(self, store, idx, name, data):
+        """
+        Buffer a write of a single field
+
+        Parameters
+        ----------
+        store : :class:`mongodb.ObjectStore`
+            the store of the changed object
+        idx : str
+            the `_id` of the document
+        name : str
+            the name of the field
+        data : object
+            the new value in its stored representation
+
+        """
+        updates = self._updates.get(store)
+        if updates is None:
+            updates = self._updates[store] = OrderedDict()
+
+        fields = updates.get(idx)
+        if fields is None:
+            fields = updates[idx] = dict()
+
+        fields[name] = data
+        self._n_ops += 1
+
+        if self._n_ops >= self.max_ops:
+            self.flush()
+
+    def is_pending(self, store, idx, name):
+        """
+        Return True if a write of the field has not been sent yet
+
+        """
+        updates = self._updates.get(store)
+        if updates is None:
+            return False
+
+        fields = updates.get(idx)
+        return fields is not None and name in fields
+
+    def flush(self):
+        """
+        Send all buffered writes, one `bulk_write` per store
+
+        """
+        updates = self._updates
+        self._updates = OrderedDict()
+        self._n_ops = 0
+
+        for store, documents in updates.items():
+            store._document.bulk_write([
+                UpdateOne(
+                    {'_id': idx},
+                    {
+                        '$set': fields,
+                        '$currentDate': {'_modified': True}
+                    })
+                for idx, fields in documents.items()
+            ], ordered=True)
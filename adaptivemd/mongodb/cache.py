@@ -27,8 +27,11 @@
 
 
 from collections import OrderedDict
+import sys
 import weakref
 
+import numpy as np
+
 __author__ = 'Jan-Hendrik Prinz'
 
 
@@ -403,3 +406,261 @@ class WeakKeyCache(weakref.WeakKeyDictionary, Cache):
     @property
     def size(self):
         return 0, -1
+
+
+def approximate_size(obj, _depth=3):
+    """
+    Estimate the memory footprint of an object in bytes
+
+    Containers and the `__dict__` of objects are followed up to a few levels,
+    numpy arrays contribute their buffer. Other stored objects that are only
+    referenced are not counted, they are cached in their own store.
+
+    Parameters
+    ----------
+    obj : object
+        the object to be measured
+
+    Returns
+    -------
+    int
+        the approximate size in bytes
+    """
+    size = sys.getsizeof(obj, 64)
+
+    if isinstance(obj, np.ndarray):
+        # owned buffers are already included by `getsizeof`
+        return size if obj.base is None else size + obj.nbytes
+
+    if _depth == 0:
+        return size
+
+    if isinstance(obj, dict):
+        items = list(obj.keys()) + list(obj.values())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        items = obj
+    elif hasattr(obj, '__dict__'):
+        items = obj.__dict__.values()
+        size += sys.getsizeof(obj.__dict__, 64)
+    else:
+        return size
+
+    for item in items:
+        if hasattr(item, '__uuid__') and item is not obj and \
+                not isinstance(item, np.ndarray):
+            # a reference to another stored object
+            size += 64
+        else:
+            size += approximate_size(item, _depth - 1)
+
+    return size
+
+
+class MemoryLRUCache(Cache):
+    """
+    Implements a Least Recently Used Cache limited by memory instead of count
+
+    The approximate size of each object is computed when it is added to the
+    cache and the least recently used objects are evicted once the total
+    exceeds the byte limit. Evicted objects are kept as weak references so
+    that objects which are still in use elsewhere are not loaded twice.
+
+    """
+
+    def __init__(self, byte_limit=64 * 1024 ** 2, sizeof=None):
+        """
+        Parameters
+        ----------
+        byte_limit : int
+            the approximate number of bytes of strongly referenced objects.
+            Default is 64 MB.
+        sizeof : callable or None
+            a function returning the size of an object in bytes. If `None`
+            `approximate_size` is used.
+        """
+        super(MemoryLRUCache, self).__init__()
+        self._byte_limit = byte_limit
+        self._sizeof = sizeof or approximate_size
+
+        self._cache = OrderedDict()
+        self._sizes = dict()
+        self._bytes = 0
+        self._weak_cache = weakref.WeakValueDictionary()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def count(self):
+        return len(self._cache), len(self._weak_cache)
+
+    @property
+    def size(self):
+        return -1, -1
+
+    def __str__(self):
+        return '%s(%d/%d, %d of %d bytes)' % (
+            self.__class__.__name__,
+            len(self._cache), len(self._weak_cache),
+            self._bytes, self._byte_limit
+        )
+
+    @property
+    def byte_limit(self):
+        return self._byte_limit
+
+    @byte_limit.setter
+    def byte_limit(self, new_limit):
+        self._byte_limit = new_limit
+        self._check_byte_limit()
+
+    @property
+    def bytes(self):
+        """
+        int : the approximate number of bytes held by strong references
+        """
+        return self._bytes
+
+    @property
+    def stats(self):
+        """
+        dict : the number of hits, misses and evictions
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'bytes': self._bytes,
+            'count': len(self._cache),
+            'weak': len(self._weak_cache)
+        }
+
+    def reset_stats(self):
+        """
+        Reset the hit, miss and eviction counters
+        """
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def clear(self):
+        self._cache.clear()
+        self._sizes.clear()
+        self._bytes = 0
+        self._weak_cache.clear()
+
+    def __getitem__(self, item):
+        try:
+            obj = self._cache.pop(item)
+            self._cache[item] = obj
+            self.hits += 1
+            return obj
+        except KeyError:
+            try:
+                obj = self._weak_cache[item]
+            except KeyError:
+                self.misses += 1
+                raise
+
+            self.hits += 1
+            del self._weak_cache[item]
+            self._add(item, obj)
+            return obj
+
+    def __setitem__(self, key, value):
+        self._remove(key)
+        self._weak_cache.pop(key, None)
+        self._add(key, value)
+
+    def __delitem__(self, key):
+        found = key in self._cache or key in self._weak_cache
+        self._remove(key)
+        self._weak_cache.pop(key, None)
+        if not found:
+            raise KeyError(key)
+
+    def _add(self, key, value):
+        size = self._sizeof(value)
+        self._cache[key] = value
+        self._sizes[key] = size
+        self._bytes += size
+        self._check_byte_limit()
+
+    def _remove(self, key):
+        if key in self._cache:
+            del self._cache[key]
+            self._bytes -= self._sizes.pop(key)
+
+    def _check_byte_limit(self):
+        # the most recent object is kept even if it exceeds the limit
+        while self._bytes > self._byte_limit and len(self._cache) > 1:
+            key, value = self._cache.popitem(last=False)
+            self._bytes -= self._sizes.pop(key)
+            self.evictions += 1
+            try:
+                self._weak_cache[key] = value
+            except TypeError:
+                # object cannot be weakly referenced
+                pass
+
+    def transfer(self, old_cache):
+        # fill in order so the most recently added objects are kept
+        for key in list(old_cache):
+            try:
+                self[key] = old_cache[key]
+            except KeyError:
+                pass
+
+        return self
+
+    def get_silent(self, item):
+        """
+        Return item from the without reordering the LRU
+
+        Parameters
+        ----------
+        item : object
+            the item index to be retrieved from the cache
+
+        Returns
+        -------
+        object or None
+            the requested object if it exists else None
+        """
+        if item is None:
+            return None
+
+        try:
+            return self._cache[item]
+        except KeyError:
+            return self._weak_cache.get(item)
+
+    def __contains__(self, item):
+        return item in self._cache or item in self._weak_cache
+
+    def keys(self):
+        res = []
+        res.extend(self._cache.keys())
+        res.extend(self._weak_cache.keys())
+        return res
+
+    def values(self):
+        res = []
+        res.extend(self._cache.values())
+        res.extend(self._weak_cache.values())
+        return res
+
+    def __len__(self):
+        return len(self._cache) + len(self._weak_cache)
+
+    def __iter__(self):
+        for key in self.keys():
+            yield key
+
+    def __reversed__(self):
+        for key in list(self._weak_cache.keys()):
+            yield key
+
+        for key in reversed(self._cache):
+            yield key
@@ -0,0 +1,174 @@
+##############################################################################
+# adaptiveMD: A Python Framework to Run Adaptive Molecular Dynamics (MD)
+#             Simulations on HPC Resources
+# Copyright 2017 FU Berlin and the Authors
+#
+# Authors: Jan-Hendrik Prinz
+# Contributors:
+#
+# `adaptiveMD` is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with MDTraj. If not, see <http://www.gnu.org/licenses/>.
+##############################################################################
+"""
+Process-wide registry of `MongoClient` instances
+
+A `MongoClient` maintains its own connection pool and is thread-safe, so
+all storages of a process that connect to the same URL share one client.
+Clients are not fork-safe, so the registry is keyed by the process id and a
+forked process creates its own clients.
+"""
+from __future__ import absolute_import
+
+import os
+import threading
+import weakref
+
+from pymongo import MongoClient, monitoring
+
+from ..util import get_logger
+logger = get_logger(__name__)
+
+
+# default options of new clients, change using `configure`
+client_options = {
+    'maxPoolSize': 50,
+    'serverSelectionTimeoutMS': 30000,
+    'retryWrites': True
+}
+
+_clients = dict()
+_lock = threading.Lock()
+
+
+class CommandDispatcher(monitoring.CommandListener):
+    """
+    Forward command events of the shared clients to registered listeners
+
+    Listeners are referenced weakly and can be added after the client has
+    been created.
+    """
+    def __init__(self):
+        self.listeners = weakref.WeakSet()
+
+    def started(self, event):
+        for listener in list(self.listeners):
+            listener.started(event)
+
+    def succeeded(self, event):
+        for listener in list(self.listeners):
+            listener.succeeded(event)
+
+    def failed(self, event):
+        for listener in list(self.listeners):
+            listener.failed(event)
+
+
+dispatcher = CommandDispatcher()
+
+
+def configure(**options):
+    """
+    Change the default options of clients created afterwards
+
+    Parameters
+    ----------
+    options : dict
+        keyword arguments of `pymongo.MongoClient`, e.g. `maxPoolSize`,
+        `serverSelectionTimeoutMS` or `retryWrites`
+
+    """
+    client_options.update(options)
+
+
+def get_client(url, **options):
+    """
+    Return the shared client of this process for a URL
+
+    Parameters
+    ----------
+    url : str
+        the MongoDB URL
+    options : dict
+        keyword arguments of `pymongo.MongoClient` that override the
+        defaults in `client_options`. Different options use a different
+        client.
+
+    Returns
+    -------
+    `pymongo.MongoClient`
+        the client
+
+    """
+    opts = dict(client_options)
+    opts.update(options)
+
+    key = (os.getpid(), url, tuple(sorted(opts.items())))
+
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            logger.debug('Creating MongoClient for %s' % url)
+            client = MongoClient(url, event_listeners=[dispatcher], **opts)
+            _clients[key] = client
+
+    return client
+
+
+def close_client(url):
+    """
+    Close all clients of this process connected to a URL
+
+    Parameters
+    ----------
+    url : str
+        the MongoDB URL
+
+    """
+    pid = os.getpid()
+    with _lock:
+        for key in [k for k in _clients if k[0] == pid and k[1] == url]:
+            _clients.pop(key).close()
+
+
+def close_all():
+    """
+    Close all clients of this process
+
+    """
+    pid = os.getpid()
+    with _lock:
+        for key in list(_clients):
+            client = _clients.pop(key)
+            if key[0] == pid:
+                client.close()
+
+
+def add_command_listener(listener):
+    """
+    Receive the command events of all shared clients
+
+    Parameters
+    ----------
+    listener : `pymongo.monitoring.CommandListener`
+        the listener, it is referenced weakly
+
+    """
+    dispatcher.listeners.add(listener)
+
+
+def remove_command_listener(listener):
+    """
+    Stop receiving the command events of the shared clients
+
+    """
+    dispatcher.listeners.discard(listener)
@@ -26,6 +26,7 @@
 # for details and license
 
 import base64
+import hashlib
 import importlib
 
 import numpy as np
@@ -36,11 +37,16 @@ from uuid import UUID
 import six
 import ujson
 
+import gridfs
+from bson import BSON
+from bson.binary import Binary
+
 import marshal
 import types
 import opcode
 
 from .base import StorableMixin, long_t
+from .proxy import LoaderProxy
 
 __author__ = 'Jan-Hendrik Prinz'
 
@@ -138,12 +144,7 @@ class ObjectJSON(object):
             #             '_units': self.unit_to_dict(obj.unit)
             #         }
             if obj.__class__ is np.ndarray:
-                # this is maybe not the best way to store large numpy arrays!
-                return {
-                    '_numpy': self.simplify(obj.shape),
-                    '_dtype': str(obj.dtype),
-                    '_data': base64.b64encode(obj.copy(order='C'))
-                }
+                return self.simplify_array(obj)
             elif hasattr(obj, 'to_dict'):
                 # the object knows how to dismantle itself into a json string
                 if hasattr(obj, '__uuid__'):
@@ -203,6 +204,27 @@ class ObjectJSON(object):
             oo = obj
             return oo
 
+    def simplify_array(self, obj):
+        # this is maybe not the best way to store large numpy arrays!
+        return {
+            '_numpy': self.simplify(obj.shape),
+            '_dtype': str(obj.dtype),
+            '_data': base64.b64encode(obj.copy(order='C')).decode('ascii')
+        }
+
+    def build_array(self, obj):
+        if '_binary' in obj:
+            # raw bytes can be used without copying
+            buffer = obj['_binary']
+        else:
+            buffer = base64.b64decode(obj['_data'])
+
+        return np.frombuffer(
+            buffer,
+            dtype=np.dtype(obj['_dtype'])).reshape(
+                self.build(obj['_numpy'])
+        )
+
     @staticmethod
     def _unicode2str(s):
         res = s
@@ -221,11 +243,7 @@ class ObjectJSON(object):
                 return slice(*obj['_slice'])
 
             elif '_numpy' in obj:
-                return np.frombuffer(
-                    base64.b64decode(obj['_data']),
-                    dtype=np.dtype(obj['_dtype'])).reshape(
-                        self.build(obj['_numpy'])
-                )
+                return self.build_array(obj)
 
             elif '_float' in obj:
                 return float(str(obj['_float']))
@@ -514,6 +532,10 @@ class ObjectJSON(object):
         simplified = ujson.loads(json_string)
         return self.build(simplified)
 
+    def from_bson(self, data):
+        simplified = BSON(data).decode()
+        return self.build(simplified)
+
     # def unit_to_json(self, unit):
     #     simple = self.unit_to_dict(unit)
     #     return self.to_json(simple)
@@ -555,14 +577,144 @@ class ObjectJSON(object):
             if hasattr(obj, key):
                 dct[key] = self.simplify(getattr(obj, key))
 
+        for key in obj._index_by:
+            dct[key] = self.simplify(getattr(obj, key))
+
         return dct
 
 
 class UUIDObjectJSON(ObjectJSON):
-    def __init__(self, storage, unit_system=None):
+    """
+    Simplifier that stores referenced storable objects in their own stores
+
+    Parameters
+    ----------
+    storage : :class:`mongodb.MongoDBStorage`
+        the storage holding the stores for referenced objects
+    unit_system : object
+        the unit system to be used
+    binary_arrays : bool
+        if True numpy arrays are simplified to BSON binary data which cannot
+        be converted to JSON. Arrays larger than `array_gridfs_limit` bytes
+        are stored in the `arrays` GridFS of the storage instead. These are
+        stored by their content, so saving the same array again does not
+        add another copy. Use `MongoDBStorage.remove_unused_arrays` to
+        delete arrays that are no longer referenced.
+    """
+
+    array_gridfs_limit = 2 ** 20
+
+    def __init__(self, storage, unit_system=None, binary_arrays=False):
         super(UUIDObjectJSON, self).__init__(unit_system)
         self.excluded_keys = ['json']
         self.storage = storage
+        self.binary_arrays = binary_arrays
+
+    @property
+    def array_grid(self):
+        return gridfs.GridFS(self.storage.db, collection='arrays')
+
+    def simplify_array(self, obj):
+        if not self.binary_arrays:
+            return super(UUIDObjectJSON, self).simplify_array(obj)
+
+        buffer = np.ascontiguousarray(obj).tobytes()
+        simplified = {
+            '_numpy': self.simplify(obj.shape),
+            '_dtype': str(obj.dtype)
+        }
+
+        if len(buffer) > self.array_gridfs_limit:
+            simplified['_gridfs'] = self.put_array(
+                buffer, simplified['_dtype'], obj.shape)
+        else:
+            simplified['_binary'] = Binary(buffer)
+
+        return simplified
+
+    def put_array(self, buffer, dtype, shape):
+        """
+        Store the buffer of an array in GridFS unless it is present
+
+        A present array is marked as used, so
+        `MongoDBStorage.remove_unused_arrays` keeps it during its grace
+        period even if the referencing object is not stored yet.
+
+        Parameters
+        ----------
+        buffer : bytes
+            the content of the array
+        dtype : str
+            the name of the dtype of the array
+        shape : tuple of int
+            the shape of the array
+
+        Returns
+        -------
+        str
+            the GridFS id, a hash of the content
+
+        """
+        digest = hashlib.sha1(
+            ('%s%s' % (dtype, tuple(shape))).encode('utf8'))
+        digest.update(buffer)
+        _id = digest.hexdigest()
+
+        touched = self.storage.db['arrays.files'].update_one(
+            {'_id': _id}, {'$currentDate': {'_used': True}})
+
+        if touched.matched_count == 0:
+            try:
+                self.array_grid.put(buffer, _id=_id)
+            except gridfs.errors.FileExists:
+                # stored by someone else in the meantime
+                pass
+
+        return _id
+
+    @classmethod
+    def collect_arrays(cls, simplified, ids=None):
+        """
+        Find the GridFS ids of all arrays in a simplified object
+
+        Parameters
+        ----------
+        simplified : dict or list
+            the simplified object to be searched
+        ids : set, optional
+            add found ids to this set
+
+        Returns
+        -------
+        set
+            the GridFS ids
+
+        """
+        if ids is None:
+            ids = set()
+
+        if type(simplified) is dict:
+            if '_gridfs' in simplified:
+                ids.add(simplified['_gridfs'])
+            else:
+                for value in simplified.values():
+                    cls.collect_arrays(value, ids)
+
+        elif type(simplified) is list:
+            for value in simplified:
+                cls.collect_arrays(value, ids)
+
+        return ids
+
+    def build_array(self, obj):
+        if '_gridfs' in obj:
+            return np.frombuffer(
+                self.array_grid.get(obj['_gridfs']).read(),
+                dtype=np.dtype(obj['_dtype'])).reshape(
+                    self.build(obj['_numpy'])
+            )
+
+        return super(UUIDObjectJSON, self).build_array(obj)
 
     def simplify(self, obj, base_type=''):
         if obj is self.storage:
@@ -573,13 +725,115 @@ class UUIDObjectJSON(ObjectJSON):
                 if not obj._ignore:
                     store = self.storage._obj_store[obj.__class__]
                     store.save(obj)
-                    return {
+                    ref = {
                         '_hex_uuid': hex(obj.__uuid__),
                         '_store': store.name
                         }
+                    if obj.__class__._load_lazy:
+                        # mark the reference so it is built as a proxy
+                        ref['_lazy'] = True
+
+                    return ref
 
         return super(UUIDObjectJSON, self).simplify(obj, base_type)
 
+    @staticmethod
+    def _reference_uuid(obj):
+        if '_hex_uuid' in obj:
+            return long_t(str(obj['_hex_uuid']).rstrip("L"), 16)
+        elif '_obj_uuid' in obj:
+            return int(UUID(obj['_obj_uuid']))
+
+        return None
+
+    def collect_references(self, simplified, refs=None):
+        """
+        Find all references to stored objects in a simplified object
+
+        Parameters
+        ----------
+        simplified : dict or list
+            the simplified object to be searched
+        refs : dict of str, set, optional
+            add found references to this dict
+
+        Returns
+        -------
+        dict of str, set of int
+            the referenced uuids grouped by the name of the store
+
+        """
+        if refs is None:
+            refs = dict()
+
+        if type(simplified) is dict:
+            if '_store' in simplified:
+                uuid = self._reference_uuid(simplified)
+                if uuid is not None:
+                    refs.setdefault(simplified['_store'], set()).add(uuid)
+                    return refs
+
+            if '_numpy' not in simplified:
+                for value in simplified.values():
+                    self.collect_references(value, refs)
+
+        elif type(simplified) is list:
+            for value in simplified:
+                self.collect_references(value, refs)
+
+        return refs
+
+    def prefetch(self, simplified):
+        """
+        Fetch all objects referenced by a simplified object with one query per store
+
+        References of the fetched documents are followed as well, so a whole
+        object graph is fetched level by level before it is built.
+
+        Parameters
+        ----------
+        simplified : dict or list
+            the simplified object(s) to be built afterwards
+
+        Returns
+        -------
+        list of (:class:`mongodb.ObjectStore`, list of int)
+            the fetched uuids by store. Use `release` to drop the fetched
+            documents that were not used
+
+        """
+        fetched = []
+        refs = self.collect_references(simplified)
+        while refs:
+            docs = []
+            for name, uuids in refs.items():
+                store = self.storage._stores.get(name)
+                if store is None:
+                    continue
+
+                idxs = store.prefetch(uuids)
+                if idxs:
+                    fetched.append((store, idxs))
+                    docs.extend(store._prefetched[idx] for idx in idxs)
+
+            refs = self.collect_references(docs)
+
+        return fetched
+
+    @staticmethod
+    def release(fetched):
+        for store, idxs in fetched:
+            store.release(idxs)
+
+    def from_simple_dict(self, simplified, builders=list()):
+        fetched = self.prefetch(simplified)
+        try:
+            return super(UUIDObjectJSON, self).from_simple_dict(
+                simplified, builders)
+
+        finally:
+            self.release(fetched)
+
     def build(self, obj, builders=list()):
         if type(obj) is dict:
             if '_storage' in obj:
@@ -616,6 +870,9 @@ class UUIDObjectJSON(ObjectJSON):
                 #    result = builders[0]
 
                 else:
+                    if obj.get('_lazy') and _long not in store.cache:
+                        return LoaderProxy(store, _long)
+
                     load_args = [ _long ]
 
                     if builders:
@@ -1,6 +1,7 @@
 from __future__ import absolute_import, print_function
 
 import gridfs
+from bson import BSON
 from uuid import UUID
 import time
 import six
@@ -8,6 +9,7 @@ import six
 from .base import StorableMixin, long_t, hex_t
 from .object import ObjectStore
 from .proxy import LoaderProxy
+from .stats import instrumented, mark_hit
 
 from ..util import get_logger
 logger = get_logger(__name__)
@@ -25,6 +27,12 @@ class FileStore(ObjectStore):
 
     def restore(self):
         self.grid = gridfs.GridFS(self.storage.db)
+        super(FileStore, self).restore()
+
+    def rebind(self):
+        super(FileStore, self).rebind()
+        if self.grid is not None:
+            self.grid = gridfs.GridFS(self.storage.db)
 
     def consume_one(self, test_fnc=None):
         raise NotImplementedError()
@@ -35,8 +43,30 @@ class FileStore(ObjectStore):
     def modify_test_one(self, test_fnc, key, value, update):
         raise NotImplementedError()
 
+    def ensure_indexes(self):
+        # GridFS maintains the indexes of its collections itself
+        pass
+
+    def backfill_index_fields(self):
+        return 0
+
+    def collect_arrays(self, ids):
+        for f in self.grid.find({'_arrays': {'$ne': []}}):
+            ids.update(getattr(f, '_arrays', []))
+
+        return ids
+
+    def prefetch(self, idxs):
+        # files are loaded from GridFS one by one
+        return []
+
     def load_indices(self):
-        self.index = [long_t(x, 16) for x in self.grid.list()]
+        self.index.clear()
+        self.index.extend(long_t(x, 16) for x in self.grid.list())
+        self._index_complete = True
+
+    def update_indices(self):
+        self.load_indices()
 
     def __len__(self):
         if self.grid:
@@ -44,12 +74,17 @@ class FileStore(ObjectStore):
 
         return 0
 
+    @instrumented('_load')
     def _load(self, idx):
         _id = hex_t(idx).rstrip("L")
 
         f = self.grid.find_one({'_id': _id})
 
-        obj = self.storage.simplifier.from_json(f.read())
+        if getattr(f, '_format', None) == 'bson':
+            obj = self.storage.simplifier.from_bson(f.read())
+        else:
+            # stored as JSON by older versions
+            obj = self.storage.json_simplifier.from_json(f.read())
         obj.__store__ = self
         obj.__uuid__ = idx
         obj.__time__ = f._time  # use time or 0 if unset
@@ -59,25 +94,24 @@ class FileStore(ObjectStore):
     def cache_all(self):
         pass
 
+    @instrumented('_save')
     def _save(self, obj):
         _id = hex(obj.__uuid__)
 
-        s = self.storage.simplifier.to_json_object(obj)
+        # BSON keeps arrays binary and large ones in the `arrays` GridFS
+        simplifier = self.storage.simplifier
+        simplified = simplifier.simplify_object(obj)
+        fields = {x: getattr(obj, x) for x in self._find_by}  # search indices
         if hasattr(obj, 'name'):
-            self.grid.put(
-                s,
-                filename=obj.name,
-                _id=_id,
-                _time=obj.__time__,
-                encoding='utf8',
-                **{x: getattr(obj, x) for x in self._find_by})  # add search indices
-        else:
-            self.grid.put(
-                s,
-                _id=_id,
-                _time=obj.__time__,
-                encoding='utf8',
-                **{x: getattr(obj, x) for x in self._find_by})  # add search indices
+            fields['filename'] = obj.name
+
+        self.grid.put(
+            BSON.encode(simplified),
+            _id=_id,
+            _time=obj.__time__,
+            _format='bson',
+            _arrays=list(simplifier.collect_arrays(simplified)),
+            **fields)
 
         obj.__store__ = self
         return obj
@@ -90,6 +124,7 @@ class FileStore(ObjectStore):
         idx = self.grid.find_one(dct)['filename']
         return self.load(int(UUID(idx)))
 
+    @instrumented('load')
     def load(self, idx):
         """
         Returns an object from the storage.
@@ -125,11 +160,14 @@ class FileStore(ObjectStore):
                 # update cache
                 self.index.append(idx)
 
+            mark_hit(self, True)
             return obj
 
         except KeyError:
             pass
 
+        mark_hit(self, False)
+
         logger.debug(
             'Calling load object of type `%s` @ IDX #%d' %
             (self.content_class.__name__, idx))
@@ -158,6 +196,7 @@ class FileStore(ObjectStore):
 
         return obj
 
+    @instrumented('save')
     def save(self, obj):
         """
         Saves an object to the storage.
@@ -175,7 +214,6 @@ class FileStore(ObjectStore):
             return self.reference(obj)
 
         # mark as saved so circular dependencies will not cause infinite loops
-        n_idx = len(self.index)
         self.index.append(uuid)
 
         q = self.grid.find_one({'_id': hex(uuid)})
@@ -213,26 +251,27 @@ class FileStore(ObjectStore):
 
         except:
             # in case we did not succeed remove the mark as being saved
-            del self.index[n_idx]
+            self.index.discard(uuid)
             raise
 
         return self.reference(obj)
 
-    def __contains__(self, item):
-        uuid = item.__uuid__
-
-        if item.__uuid__ in self.index:
+    def is_stored(self, idx):
+        if idx in self.index:
             return True
 
-        q = self.grid.find_one({'_id': hex(uuid)})
+        q = self.grid.find_one({'_id': hex(idx)})
 
         if q is not None:
             # exists
-            self.index.append(uuid)
+            self.index.append(idx)
             return True
 
         return False
 
+    def __contains__(self, item):
+        return self.is_stored(item.__uuid__)
+
 
 class DataDict(StorableMixin):
     """
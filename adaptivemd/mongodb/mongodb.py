@@ -27,11 +27,19 @@
 from __future__ import absolute_import, print_function
 
 import abc
+import datetime
+import threading
+from contextlib import contextmanager
 
-from pymongo import MongoClient
 from collections import OrderedDict
 from .dictify import UUIDObjectJSON
 from .object import ObjectStore
+from .watcher import SyncWatcher
+from .notifier import ChangeNotifier, QueueBell
+from .stats import StorageStats
+from .batch import WriteBatch
+from .connection import get_client, add_command_listener, \
+    remove_command_listener
 
 from ..util import get_logger
 logger = get_logger(__name__)
@@ -43,6 +51,11 @@ class MongoDBStorage(object):
     """
     _db_url = 'mongodb://localhost:27017/'
 
+    # increase when indexes or `_index_by` fields are added, so existing
+    # projects are migrated by `ensure_indexes` once when they are opened
+    index_version = 1
+    _meta_name = 'storage_meta'
+
     @classmethod
     def set_host(cls, host):
         #cls._db_url = cls._db_url.replace('localhost', host)
@@ -110,6 +123,7 @@ class MongoDBStorage(object):
 
         """
         self.simplifier.update_class_list()
+        self.json_simplifier.update_class_list()
 
     def __init__(self, filename, mode=None):
         """
@@ -135,11 +149,24 @@ class MongoDBStorage(object):
 
         self.mode = mode
 
-        self._client = MongoClient(self._db_url)
         self._db_name = 'storage-' + filename
 
+        # instrumentation is disabled until `enable_stats` is called
+        self.recorder = StorageStats(self._db_name)
+        add_command_listener(self.recorder)
+
+        # the client and its connection pool are shared within the process
+        self._client = get_client(self._db_url)
+
         self.filename = filename
 
+        self.watcher = None
+        self.notifier = None
+        self._bells = dict()
+
+        # the write batch of each thread
+        self._batches = threading.local()
+
         # this can be set to false to re-store proxies from other stores
         self.exclude_proxy_from_other = False
 
@@ -165,6 +192,9 @@ class MongoDBStorage(object):
             # If not we just make sure
             self.finalize_stores()
 
+            # new stores create their indexes on initialization
+            self._stamp_index_version()
+
             logger.info("Finished setting up netCDF file")
 
         elif mode == 'a' or mode == 'r+' or mode == 'r':
@@ -189,6 +219,10 @@ class MongoDBStorage(object):
 
             self._restore_storages()
 
+            if mode != 'r':
+                # migrate projects created by older versions
+                self._ensure_index_version()
+
             # only if we have a new style file
             if hasattr(self, 'attributes'):
                 for attribute, store in zip(
@@ -200,26 +234,329 @@ class MongoDBStorage(object):
 
     def close(self):
         """
-        Close the DB connection
+        Close the storage
+
+        The shared client stays connected for other storages of this
+        process. Use `mongodb.connection.close_all` to close all connections.
+
+        """
+        self.unwatch()
+        self._stop_notifier()
+        remove_command_listener(self.recorder)
+
+    def reconnect(self):
+        """
+        Bind the storage and all stores to the current shared client
+
+        The stores are not registered or restored again and cached objects
+        are kept. pymongo reconnects a client automatically, this also makes
+        sure that a forked process uses a client of its own.
+
+        """
+        self._client = get_client(self._db_url)
+        self.db = self._client[self._db_name]
+        for store in self._stores.values():
+            store.rebind()
+
+        # a new notifier is started on demand using the new connection
+        self._stop_notifier()
+
+        add_command_listener(self.recorder)
+
+    @contextmanager
+    def batch(self, max_ops=100):
+        """
+        Buffer sync variable writes of this thread and send them in bulk
+
+        Inside the context writes of sync variables like `Task.state` are
+        not sent immediately. They are sent as a single `bulk_write` per
+        store when the context is left or after `max_ops` writes. Reading a
+        variable with a pending write returns the local value. Nested
+        contexts use the batch of the outermost one.
+
+        Parameters
+        ----------
+        max_ops : int
+            the number of buffered writes after which the batch is flushed
+
+        Examples
+        --------
+        >>> with storage.batch():  # doctest: +SKIP
+        ...     worker.seen = time.time()
+        ...     worker.command = None
+
+        """
+        batch = self.current_batch()
+        if batch is not None:
+            yield batch
+            return
+
+        batch = WriteBatch(max_ops)
+        self._batches.current = batch
+        try:
+            yield batch
+        finally:
+            self._batches.current = None
+            batch.flush()
+
+    def current_batch(self):
+        """
+        Return the active write batch of this thread
+
+        Returns
+        -------
+        :class:`mongodb.batch.WriteBatch` or None
+            the batch if called inside `batch` else None
+
+        """
+        return getattr(self._batches, 'current', None)
+
+    def enable_stats(self, enabled=True):
+        """
+        Start or stop recording counters and latencies of store operations
+
+        Parameters
+        ----------
+        enabled : bool
+            if False recording is stopped. The counters are kept.
+
+        """
+        self.recorder.enabled = enabled
+
+    def stats(self, reset=False):
+        """
+        Return the counters recorded since `enable_stats` or the last reset
+
+        Parameters
+        ----------
+        reset : bool
+            if True all counters are cleared after they have been returned
+
+        Returns
+        -------
+        dict
+            `operations` contains counters by store and operation, e.g.
+            `load`, `_load`, `save` or `state.get`: calls, cache hits and
+            misses, server round trips issued during the operation, total
+            time and a latency histogram. `commands` contains the server
+            round trips by collection and command. `caches` contains the
+            state of the cache of each store.
+
+        """
+        result = self.recorder.to_dict()
+        result['enabled'] = self.recorder.enabled
+        result['caches'] = dict()
+        for name, store in self._stores.items():
+            cache = getattr(store, 'cache', None)
+            if cache is None:
+                continue
+
+            info = {
+                'type': cache.__class__.__name__,
+                'count': list(cache.count)
+            }
+            if hasattr(cache, 'stats'):
+                info.update(cache.stats)
+
+            result['caches'][name] = info
+
+        if reset:
+            self.recorder.reset()
+
+        return result
+
+    def ensure_indexes(self):
+        """
+        Create missing DB indexes and derived fields of all stores
+
+        New stores create their indexes on initialization. Projects created
+        by older versions are migrated once when they are opened, see
+        `index_version`. Call this after adding indexes to a content class.
+
+        """
+        for store in self._stores.values():
+            store.ensure_indexes()
+            updated = store.backfill_index_fields()
+            if updated:
+                logger.info(
+                    "Added index fields to %d objects in store '%s'" %
+                    (updated, store.name))
+
+    def remove_unused_arrays(self, grace=3600):
+        """
+        Delete arrays from GridFS that no stored object references anymore
+
+        Large arrays are kept in GridFS and shared by all objects with the
+        same content. If objects are removed their arrays stay. This reads
+        all stored documents, so run it occasionally, e.g. after deleting
+        models.
+
+        An array that was stored or reused within the last `grace` seconds
+        is kept even without references, since the object using it might
+        still be on its way to the DB.
+
+        Parameters
+        ----------
+        grace : float
+            the time in seconds since the last use of an array before it can
+            be deleted
+
+        Returns
+        -------
+        int
+            the number of deleted arrays
+
+        """
+        cutoff = datetime.datetime.utcnow() - \
+            datetime.timedelta(seconds=grace)
+
+        used = set()
+        for store in self._stores.values():
+            if store._document is not None and \
+                    store.content_class is not None:
+                store.collect_arrays(used)
+
+        grid = self.simplifier.array_grid
+        unused = [
+            dct['_id'] for dct in self.db['arrays.files'].find(
+                {}, projection=['_id', 'uploadDate', '_used'])
+            if dct['_id'] not in used and
+            dct.get('_used', dct['uploadDate']) < cutoff]
+
+        for _id in unused:
+            grid.delete(_id)
+
+        return len(unused)
+
+    def _ensure_index_version(self):
+        stamp = self.db[self._meta_name].find_one({'_id': 'indexes'})
+        if stamp is None or stamp.get('version', 0) < self.index_version:
+            logger.info(
+                'Creating indexes and index fields of storage %s version %d'
+                % (self._db_name, self.index_version))
+            self.ensure_indexes()
+            self._stamp_index_version()
+
+    def _stamp_index_version(self):
+        self.db[self._meta_name].update_one(
+            {'_id': 'indexes'},
+            {'$set': {'version': self.index_version}},
+            upsert=True)
+
+    def watch(self, stores=None, max_staleness=30.0, interval=1.0):
+        """
+        Keep sync variables of cached objects updated by a background thread
+
+        While watched, reading a sync variable like `Task.state` does not
+        query the DB unless the local value is older than `max_staleness`.
+
+        Parameters
+        ----------
+        stores : list of str or None
+            the names of the stores to be watched. If None all stores are
+            watched
+        max_staleness : float
+            maximal age in seconds of a value that is read without a query
+        interval : float
+            seconds between two polls if change streams are not supported
+
+        Returns
+        -------
+        :class:`mongodb.watcher.SyncWatcher`
+            the running watcher
+
+        """
+        self.unwatch()
+
+        if stores is None:
+            stores = [
+                store for store in self._stores.values()
+                if store.content_class is not None]
+        else:
+            stores = [self._stores[name] for name in stores]
+
+        self.watcher = SyncWatcher(stores, max_staleness, interval)
+        for store in stores:
+            store._watcher = self.watcher
+
+        self.watcher.start()
+
+        return self.watcher
+
+    def unwatch(self):
+        """
+        Stop the watcher started with `watch`
+
+        """
+        if self.watcher is not None:
+            self.watcher.stop()
+            for store in self.watcher.stores:
+                store._watcher = None
+
+            self.watcher = None
+
+    def change_notifier(self, interval=1.0):
+        """
+        Return the running notifier of changes of this storage
+
+        The notifier is started on the first call and shared afterwards.
+
+        Parameters
+        ----------
+        interval : float
+            seconds between two polls if change streams are not supported
+
+        Returns
+        -------
+        :class:`mongodb.notifier.ChangeNotifier`
+            the running notifier
+
+        """
+        if self.notifier is None or not self.notifier.is_alive():
+            self.notifier = ChangeNotifier(self, interval)
+            self.notifier.start()
+
+        return self.notifier
+
+    def bell(self, name='queue_bell'):
+        """
+        Return a notification channel of this storage
+
+        Parameters
+        ----------
+        name : str
+            the name of the capped collection used by the bell
+
+        Returns
+        -------
+        :class:`mongodb.notifier.QueueBell`
+            the bell, shared by all calls with the same name
 
         """
-        self._client.close()
+        bell = self._bells.get(name)
+        if bell is None:
+            bell = self._bells[name] = QueueBell(self, name)
+
+        return bell
+
+    def _stop_notifier(self):
+        if self.notifier is not None:
+            self.notifier.stop()
+            self.notifier = None
 
     def _create_simplifier(self):
-        self.simplifier = UUIDObjectJSON(self)
+        # documents store arrays as binary data, JSON in GridFS needs text
+        self.simplifier = UUIDObjectJSON(self, binary_arrays=True)
+        self.json_simplifier = UUIDObjectJSON(self)
 
     @classmethod
     def list_storages(cls):
-        c = MongoClient(cls._db_url)
-        names = c.database_names()
-        c.close()
+        names = get_client(cls._db_url).list_database_names()
         return [n[8:] for n in names if n.startswith('storage-')]
 
     @classmethod
     def delete_storage(cls, name):
-        c = MongoClient(cls._db_url)
-        c.drop_database('storage-' + name)
-        c.close()
+        get_client(cls._db_url).drop_database('storage-' + name)
 
     @staticmethod
     def _cmp_version(v1, v2):
@@ -287,6 +624,9 @@ class MongoDBStorage(object):
         self.register_store(store, register_attr=register_attr)
         self.stores.save(store)
 
+        if not store.is_created():
+            store.initialize()
+
     def finalize_stores(self):
         """
         Run initializations for all added stores.
@@ -308,6 +648,7 @@ class MongoDBStorage(object):
                 store.initialize()
 
         self.simplifier.update_class_list()
+        self.json_simplifier.update_class_list()
 
     def register_store(self, store, register_attr=True):
         """
@@ -488,8 +829,7 @@ class MongoDBStorage(object):
 
         # need to update
         for store in self.objects.values():
-            store.check_size()
-            if uuid in store.index:
+            if store.is_stored(uuid):
                 return store[uuid]
 
         # nothing found.
@@ -0,0 +1,427 @@
+##############################################################################
+# adaptiveMD: A Python Framework to Run Adaptive Molecular Dynamics (MD)
+#             Simulations on HPC Resources
+# Copyright 2017 FU Berlin and the Authors
+#
+# Authors: Jan-Hendrik Prinz
+# Contributors:
+#
+# `adaptiveMD` is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with MDTraj. If not, see <http://www.gnu.org/licenses/>.
+##############################################################################
+from __future__ import absolute_import
+
+import threading
+import time
+
+from pymongo import CursorType
+from pymongo.errors import OperationFailure, CollectionInvalid
+
+from ..util import get_logger
+logger = get_logger(__name__)
+
+
+class ChangeNotifier(threading.Thread):
+    """
+    Background thread that wakes up threads waiting for changes of stores
+
+    Inserts, updates and deletions are received from a MongoDB change stream.
+    If the server does not support change streams (e.g. a standalone mongod)
+    the stores that are waited for are polled for documents with a recent
+    `_saved` or `_modified` stamp instead. Deletions are not detected by
+    polling, so waiting should always use a timeout.
+
+    Each store has a version that is increased for every change. A waiting
+    thread takes a `snapshot` of the versions before it checks its
+    conditions and passes it to `wait`, so changes in between are not lost.
+
+    Attributes
+    ----------
+    storage : :class:`mongodb.MongoDBStorage`
+        the storage of the watched stores
+    interval : float
+        number of seconds between polls or waits for the change stream
+    mode : str or None
+        either `changestream` or `polling` once started
+
+    """
+    def __init__(self, storage, interval=1.0):
+        super(ChangeNotifier, self).__init__()
+        self.daemon = True
+        self.storage = storage
+        self.interval = interval
+        self.mode = None
+        self._versions = dict()
+        self._changed = threading.Condition()
+        self._stopped = threading.Event()
+        self._ready = threading.Event()
+        self._listeners = []
+
+        # newest `_modified` and `_saved` stamps of the polled stores
+        self._polled = dict()
+
+    def start(self):
+        super(ChangeNotifier, self).start()
+        # make sure changes after `start` returns are seen
+        self._ready.wait(10.0)
+
+    def stop(self):
+        """
+        Stop watching and wake up all waiting threads
+
+        """
+        self._stopped.set()
+        with self._changed:
+            self._changed.notify_all()
+
+    def is_alive(self):
+        return not self._stopped.is_set() and \
+            super(ChangeNotifier, self).is_alive()
+
+    def add_listener(self, callback):
+        """
+        Call a function for every change
+
+        Parameters
+        ----------
+        callback : function
+            called with the name of the changed store in the thread of the
+            notifier. It must not block
+
+        """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        """
+        Stop calling a function added with `add_listener`
+
+        """
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def snapshot(self, names=None):
+        """
+        Return the current versions of all stores
+
+        Parameters
+        ----------
+        names : iterable of str or None
+            the names of the stores that will be waited for. They are
+            watched from now on, so changes before the first `wait` are not
+            missed while polling
+
+        Returns
+        -------
+        dict of str, int
+            the number of changes seen for each store name
+
+        """
+        if names is not None:
+            self.watch(names)
+
+        with self._changed:
+            return dict(self._versions)
+
+    def watch(self, names):
+        """
+        Make sure changes of stores are detected
+
+        Only required for polling. The newest stamps of stores that are not
+        polled yet are read immediately, so later changes are not missed.
+
+        Parameters
+        ----------
+        names : iterable of str
+            the names of the stores
+
+        """
+        if self.mode != 'polling':
+            return
+
+        for name in names:
+            if name not in self._polled:
+                self._polled[name] = self._newest(name)
+
+    def wake(self):
+        """
+        Wake up all waiting threads to check their `cancel` events
+
+        """
+        with self._changed:
+            self._changed.notify_all()
+
+    def wait(self, names, since=None, timeout=None, cancel=None):
+        """
+        Block until a document of one of the stores changes
+
+        Parameters
+        ----------
+        names : iterable of str
+            the names of the stores
+        since : dict of str, int or None
+            a `snapshot` of the versions. Changes after the snapshot was
+            taken return immediately. If None only new changes are waited for
+        timeout : float or None
+            maximal number of seconds to wait
+        cancel : `threading.Event` or None
+            if set, waiting is stopped. Call `wake` after setting it
+
+        Returns
+        -------
+        bool
+            True if a change was detected, False after a timeout, if
+            cancelled or if the notifier was stopped
+
+        """
+        names = set(names)
+        self.watch(names)
+
+        if since is None:
+            since = self.snapshot()
+
+        if timeout is not None:
+            end = time.time() + timeout
+
+        with self._changed:
+            while not self._stopped.is_set():
+                if cancel is not None and cancel.is_set():
+                    break
+
+                if any(
+                        self._versions.get(name, 0) != since.get(name, 0)
+                        for name in names):
+                    return True
+
+                if timeout is None:
+                    self._changed.wait()
+                else:
+                    remaining = end - time.time()
+                    if remaining <= 0:
+                        break
+
+                    self._changed.wait(remaining)
+
+        return False
+
+    def _notify(self, name):
+        with self._changed:
+            self._versions[name] = self._versions.get(name, 0) + 1
+            self._changed.notify_all()
+
+        for callback in list(self._listeners):
+            try:
+                callback(name)
+            except Exception as e:
+                logger.warning('Change listener failed: %s' % e)
+
+    def run(self):
+        try:
+            try:
+                self._watch_changes()
+
+            except OperationFailure as e:
+                logger.info(
+                    'Change streams not available (%s). Using polling.' % e)
+                self._poll()
+
+        except Exception as e:
+            # waiting threads fall back to their timeouts
+            logger.warning('ChangeNotifier stopped: %s' % e)
+            raise
+
+        finally:
+            self._ready.set()
+
+    def _watch_changes(self):
+        with self.storage.db.watch(
+                [{'$match': {'operationType': {
+                    '$in': ['insert', 'update', 'replace', 'delete']}}}],
+                max_await_time_ms=int(self.interval * 1000)) as stream:
+            self.mode = 'changestream'
+            self._ready.set()
+            while not self._stopped.is_set():
+                change = stream.try_next()
+                if change is not None:
+                    self._notify(change['ns']['coll'])
+
+    def _newest(self, name):
+        document = self.storage.db[name]
+        newest = []
+        for stamp in ['_modified', '_saved']:
+            doc = document.find_one(
+                {stamp: {'$exists': True}},
+                projection=[stamp],
+                sort=[(stamp, -1)])
+
+            newest.append(doc[stamp] if doc else None)
+
+        return newest
+
+    def _poll(self):
+        self.mode = 'polling'
+        self._ready.set()
+        while not self._stopped.wait(self.interval):
+            for name, last in list(self._polled.items()):
+                newest = self._newest(name)
+                if any(
+                        new is not None and (old is None or new > old)
+                        for new, old in zip(newest, last)):
+                    self._polled[name] = newest
+                    self._notify(name)
+
+
+class QueueBell(object):
+    """
+    Notification channel using a capped collection
+
+    Ringing the bell inserts a small document. Waiting threads use a
+    tailable cursor that returns as soon as a new document arrives. Unlike
+    change streams this works with a standalone mongod. If tailable cursors
+    fail, waiting falls back to a single check after the timeout.
+
+    A ring can be missed if it happens between two waits and has a smaller
+    `_id` than the last one seen, e.g. from another host in the same second.
+    Waiting should always use a timeout.
+
+    Attributes
+    ----------
+    storage : :class:`mongodb.MongoDBStorage`
+        the storage that holds the collection
+    name : str
+        the name of the capped collection
+
+    """
+    def __init__(self, storage, name='queue_bell', size=1024 ** 2, max=1000):
+        self.storage = storage
+        self.name = name
+        self.size = size
+        self.max = max
+        self._last = None
+        self._tailable = True
+        self._ensured = False
+
+    @property
+    def _document(self):
+        return self.storage.db[self.name]
+
+    def ensure(self):
+        """
+        Create the capped collection if it does not exist
+
+        """
+        if self._ensured:
+            return
+
+        db = self.storage.db
+        if self.name not in db.list_collection_names():
+            try:
+                db.create_collection(
+                    self.name, capped=True, size=self.size, max=self.max)
+                # tailable cursors on empty collections are closed at once
+                self._document.insert_one({'rung': time.time()})
+            except CollectionInvalid:
+                # created by someone else in the meantime
+                pass
+
+        if self._last is None:
+            newest = self._document.find_one(sort=[('$natural', -1)])
+            self._last = newest['_id'] if newest else None
+
+        self._ensured = True
+
+    def ring(self, **info):
+        """
+        Wake up all waiting threads
+
+        Parameters
+        ----------
+        info : dict
+            additional fields stored with the ring
+
+        """
+        self.ensure()
+        doc = dict(info)
+        doc['rung'] = time.time()
+        self._document.insert_one(doc)
+
+    def _check(self):
+        newest = self._document.find_one(sort=[('$natural', -1)])
+        if newest is not None and newest['_id'] != self._last:
+            self._last = newest['_id']
+            return True
+
+        return False
+
+    def _tail(self, end):
+        # a tailable cursor without a matching document is closed at once,
+        # so start at the last ring seen and skip it
+        if self._last is None:
+            query = {}
+        else:
+            query = {'_id': {'$gte': self._last}}
+
+        cursor = self._document.find(
+            query,
+            cursor_type=CursorType.TAILABLE_AWAIT
+        ).max_await_time_ms(max(1, int((end - time.time()) * 1000)))
+
+        try:
+            while cursor.alive and time.time() < end:
+                rung = False
+                for doc in cursor:
+                    if doc['_id'] != self._last:
+                        self._last = doc['_id']
+                        rung = True
+
+                if rung:
+                    return True
+
+        finally:
+            cursor.close()
+
+        return False
+
+    def wait(self, timeout):
+        """
+        Block until the bell rings
+
+        Parameters
+        ----------
+        timeout : float
+            maximal number of seconds to wait
+
+        Returns
+        -------
+        bool
+            True if the bell rang since the last call, False after a timeout
+
+        """
+        self.ensure()
+        end = time.time() + timeout
+
+        if self._tailable:
+            try:
+                if self._tail(end):
+                    return True
+
+            except OperationFailure as e:
+                logger.info(
+                    'Tailable cursors not available (%s). Sleeping instead.'
+                    % e)
+                self._tailable = False
+
+        remaining = end - time.time()
+        if remaining > 0:
+            time.sleep(remaining)
+
+        return self._check()
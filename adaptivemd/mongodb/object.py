@@ -25,7 +25,8 @@
 # <http://github.com/openpathsampling/openpathsampling
 # for details and license
 
-from uuid import UUID
+import time
+from uuid import UUID, uuid4
 from weakref import WeakValueDictionary
 
 from numpy.random import randint
@@ -35,12 +36,76 @@ import six
 from .base import StorableMixin, long_t
 from .cache import MaxCache, Cache, NoCache, \
     WeakLRUCache
-from .proxy import LoaderProxy
+from .proxy import LoaderProxy, DocumentProxy
+from .syncvar import sync_variables
+from .stats import instrumented, mark_hit
 
 from ..util import get_logger
 logger = get_logger(__name__)
 
 
+# marks the place of a removed UUID in `UUIDIndex`
+_removed = object()
+
+
+class UUIDIndex(object):
+    """
+    Set of stored UUIDs that keeps the insertion order
+
+    Membership tests and removals are O(1) while positional access (used to
+    pick random elements) and ordered iteration are still possible. A removed
+    UUID leaves a gap that is closed on the next positional access or once
+    half of the entries are gaps.
+
+    """
+    def __init__(self, iterable=None):
+        self._list = []
+        self._pos = dict()
+        if iterable is not None:
+            self.extend(iterable)
+
+    def append(self, uuid):
+        if uuid not in self._pos:
+            self._pos[uuid] = len(self._list)
+            self._list.append(uuid)
+
+    def extend(self, iterable):
+        for uuid in iterable:
+            self.append(uuid)
+
+    def remove(self, uuid):
+        self._list[self._pos.pop(uuid)] = _removed
+        if 2 * len(self._pos) < len(self._list):
+            self._compact()
+
+    def discard(self, uuid):
+        if uuid in self._pos:
+            self.remove(uuid)
+
+    def clear(self):
+        self._pos.clear()
+        del self._list[:]
+
+    def _compact(self):
+        self._list = [uuid for uuid in self._list if uuid is not _removed]
+        self._pos = {uuid: pos for pos, uuid in enumerate(self._list)}
+
+    def __contains__(self, uuid):
+        return uuid in self._pos
+
+    def __len__(self):
+        return len(self._pos)
+
+    def __iter__(self):
+        return (uuid for uuid in self._list if uuid is not _removed)
+
+    def __getitem__(self, item):
+        if len(self._list) != len(self._pos):
+            self._compact()
+
+        return self._list[item]
+
+
 class ObjectStore(StorableMixin):
     """
     Base Class for storing complex objects in a netCDF4 file. It holds a
@@ -71,6 +136,10 @@ class ObjectStore(StorableMixin):
     default_store_chunk_size = 256
     default_cache = 10000
 
+    # seconds subtracted from the last index refresh when asking for new
+    # documents. Covers clock differences between clients writing `_saved`
+    index_refresh_margin = 10.0
+
     def __init__(self, name, content_class):
         """
 
@@ -93,6 +162,12 @@ class ObjectStore(StorableMixin):
         self._created = False
         self._document = None
 
+        # documents fetched in bulk that are waiting to be built
+        self._prefetched = dict()
+
+        # a `SyncWatcher` that updates sync variables of cached objects
+        self._watcher = None
+
         self.name = name
 
         self.attribute_list = {}
@@ -106,6 +181,9 @@ class ObjectStore(StorableMixin):
         self.units = dict()
 
         self.index = None
+        self._index_refreshed = None
+        # False if the index only contains the objects used so far
+        self._index_complete = True
 
         self.proxy_index = WeakValueDictionary()
 
@@ -134,8 +212,17 @@ class ObjectStore(StorableMixin):
             returns True if an update was performed
 
         """
+        if not self._index_complete:
+            # only pick up documents saved since the store was opened
+            self.update_indices()
+            return True
+
         if len(self) > len(self.index):
-            self.load_indices()
+            self.update_indices()
+            if len(self) > len(self.index):
+                # documents without a `_saved` stamp, e.g. from older versions
+                self.load_indices()
+
             return True
 
         return False
@@ -156,17 +243,93 @@ class ObjectStore(StorableMixin):
         self.index = self.create_uuid_index()
         self._document = storage.db[self.name]
 
+    def rebind(self):
+        """
+        Use the current DB handle of the storage, e.g. after a reconnect
+
+        """
+        self._document = self.storage.db[self.name]
+
     @staticmethod
     def create_uuid_index():
-        return []
+        return UUIDIndex()
 
     def restore(self):
-        self.load_indices()
+        # the full index is loaded on first use, see `complete_index`
+        self._index_refreshed = time.time()
+        self._index_complete = False
+
+    def complete_index(self):
+        """
+        Make sure the index contains all stored objects
+
+        When a store is restored, only the objects that are used are added to
+        the index. Iterating or picking random objects needs all of them.
+
+        """
+        if not self._index_complete:
+            self.load_indices()
+
+    def is_stored(self, idx):
+        """
+        Return True if an object is stored
+
+        Parameters
+        ----------
+        idx : int
+            the integer UUID of the object
+
+        Returns
+        -------
+        bool
+            True if the object is stored in this store
+
+        """
+        if idx in self.index:
+            return True
+
+        if self._index_complete:
+            self.check_size()
+            return idx in self.index
+
+        # look up only the single document instead of loading the index
+        if self._document.find_one(
+                {'_id': str(UUID(int=idx))}, projection=['_id']) is not None:
+            self.index.append(idx)
+            return True
+
+        return False
 
     def load_indices(self):
-        # self.index.clear()
-        # self.index.extend(
-        self.index = [int(UUID(x)) for x in self._document.distinct('_id')]
+        """
+        Rebuild the index of stored UUIDs from all documents in the DB
+
+        """
+        refreshed = time.time()
+        self.index.clear()
+        self.index.extend(
+            int(UUID(x)) for x in self._document.distinct('_id'))
+        self._index_refreshed = refreshed
+        self._index_complete = True
+
+    def update_indices(self):
+        """
+        Add the UUIDs of documents saved since the last index refresh
+
+        Only the ids of new documents are transferred so the cost depends on
+        the number of new objects and not on the size of the store
+
+        """
+        if self._index_refreshed is None:
+            self.load_indices()
+            return
+
+        refreshed = time.time()
+        since = self._index_refreshed - self.index_refresh_margin
+        self.index.extend(
+            int(UUID(dct['_id'])) for dct in self._document.find(
+                {'_saved': {'$gte': since}}, projection=['_id']))
+        self._index_refreshed = refreshed
 
     @property
     def storage(self):
@@ -255,9 +418,13 @@ class ObjectStore(StorableMixin):
         """
         Add iteration over all elements in the storage
         """
+        self.complete_index()
         self.check_size()
-        for uuid in list(self.index):
-            yield self.load(uuid)
+        uuids = list(self.index)
+        chunk_size = self.default_store_chunk_size
+        for pos in range(0, len(uuids), chunk_size):
+            for obj in self.load_many(uuids[pos:pos + chunk_size]):
+                yield obj
 
     def __len__(self):
         """
@@ -305,14 +472,7 @@ class ObjectStore(StorableMixin):
         return LoaderProxy(self, idx)
 
     def __contains__(self, item):
-        if item.__uuid__ in self.index:
-            return True
-
-        if self.check_size():
-            if item.__uuid__ in self.index:
-                return True
-
-        return False
+        return self.is_stored(item.__uuid__)
 
     def __getitem__(self, item):
         """
@@ -326,7 +486,12 @@ class ObjectStore(StorableMixin):
             elif type(item) is str or type(item) is long_t:
                 return self.load(item)
             elif type(item) is list:
-                return [self.load(idx) for idx in item]
+                chunk_size = self.default_store_chunk_size
+                objs = []
+                for pos in range(0, len(item), chunk_size):
+                    objs.extend(self.load_many(item[pos:pos + chunk_size]))
+
+                return objs
             elif item is Ellipsis:
                 return iter(self)
         except KeyError:
@@ -344,6 +509,65 @@ class ObjectStore(StorableMixin):
 
         return None
 
+    def count_by(self, key, query=None):
+        """
+        Count the stored objects by the value of a field on the server
+
+        Parameters
+        ----------
+        key : str
+            the name of the top-level field, e.g. one of the `_find_by`
+            attributes
+        query : dict or None
+            if given, only documents matching this query are counted
+
+        Returns
+        -------
+        dict
+            the number of objects for each value of the field
+
+        """
+        pipeline = []
+        if query:
+            pipeline.append({'$match': query})
+
+        pipeline.append({'$group': {'_id': '$' + key, 'count': {'$sum': 1}}})
+
+        return {
+            group['_id']: group['count']
+            for group in self._document.aggregate(pipeline)}
+
+    def find_proxies(self, query, fields):
+        """
+        Return proxies to all objects matching a query without building them
+
+        Parameters
+        ----------
+        query : dict
+            the MongoDB query to select objects
+        fields : list of str
+            the top-level fields that are read and kept with each proxy
+
+        Returns
+        -------
+        list of :class:`mongodb.proxy.DocumentProxy`
+            proxies that return the given fields directly and load the
+            object for all other attributes
+
+        """
+        fields = list(fields)
+        proxies = []
+        for doc in self._document.find(query, projection=fields):
+            proxies.append(DocumentProxy(
+                self, int(UUID(doc['_id'])),
+                {
+                    key: self.simplifier.build(doc[key])
+                    for key in fields if key in doc
+                }))
+
+        return proxies
+
+    @instrumented('consume_one')
     def consume_one(self, test_fnc=None):
         """
         Remove one object and return it in the process
@@ -382,12 +606,13 @@ class ObjectStore(StorableMixin):
                 pass
 
         if consumed is not None:
-            self.index.remove(consumed.__uuid__)
+            self.index.discard(consumed.__uuid__)
             if consumed.__uuid__ in self.cache:
                 del self.cache[consumed.__uuid__]
 
         return consumed
 
+    @instrumented('modify_one')
     def modify_one(self, key, value, update):
         """
         Change an attribute of one object
@@ -413,7 +638,9 @@ class ObjectStore(StorableMixin):
 
             erg = self._document.find_and_modify(
                 query={key: value},
-                update={"$set": {key: update}},
+                update={
+                    "$set": {key: update},
+                    "$currentDate": {'_modified': True}},
                 upsert=False
                 )
 
@@ -429,6 +656,173 @@ class ObjectStore(StorableMixin):
 
         return modified
 
+    @instrumented('claim_one')
+    def claim_one(self, query, update, sort=None):
+        """
+        Atomically change one object matching a query and return it
+
+        Parameters
+        ----------
+        query : dict
+            the MongoDB query to find the object
+        update : dict
+            the new values by field name in their stored representation
+        sort : list of (str, int) or None
+            if several objects match, the first one in this order is used
+
+        Returns
+        -------
+        None or `StorableMixin`
+            if None then no object was altered, otherwise the changed object
+            is returned
+
+        """
+        erg = self._document.find_one_and_update(
+            query,
+            {'$set': update, '$currentDate': {'_modified': True}},
+            projection=['_id'],
+            sort=sort)
+
+        if erg is None:
+            return None
+
+        obj = self.load(int(UUID(erg['_id'])))
+
+        # make sure a cached object sees the changes
+        variables = sync_variables(obj.__class__)
+        for key, data in update.items():
+            if key in variables:
+                variables[key].apply(obj, data)
+
+        return obj
+
+    @instrumented('claim_many')
+    def claim_many(self, query, update, number, sort=None):
+        """
+        Atomically change up to `number` objects matching a query
+
+        The candidates are found with one query and claimed with a single
+        update that only changes documents still matching the query. Only
+        if another client claimed some of them in the meantime, the claimed
+        ones are read again.
+
+        Parameters
+        ----------
+        query : dict
+            the MongoDB query to find the objects
+        update : dict
+            the new values by field name in their stored representation
+        number : int
+            the maximal number of objects to be changed
+        sort : list of (str, int) or None
+            if more objects match, the first ones in this order are used
+
+        Returns
+        -------
+        list of `StorableMixin`
+            the changed objects in the given order
+
+        """
+        candidates = [
+            doc['_id'] for doc in self._document.find(
+                query, projection=['_id'], sort=sort, limit=number)]
+
+        if not candidates:
+            return []
+
+        # marks the documents changed by this call
+        token = str(uuid4())
+        changed = dict(update)
+        changed['_claim'] = token
+
+        erg = self._document.update_many(
+            {'$and': [query, {'_id': {'$in': candidates}}]},
+            {'$set': changed, '$currentDate': {'_modified': True}})
+
+        if erg.modified_count == 0:
+            return []
+
+        if erg.modified_count < len(candidates):
+            claimed = set(
+                doc['_id'] for doc in self._document.find(
+                    {'_id': {'$in': candidates}, '_claim': token},
+                    projection=['_id']))
+            candidates = [idx for idx in candidates if idx in claimed]
+
+        objs = self.load_many([int(UUID(idx)) for idx in candidates])
+
+        # make sure cached objects see the changes
+        for obj in objs:
+            variables = sync_variables(obj.__class__)
+            for key, data in update.items():
+                if key in variables:
+                    variables[key].apply(obj, data)
+
+        return objs
+
+    @instrumented('modify_if')
+    def modify_if(self, obj, query, update):
+        """
+        Change a stored object with a single update if it matches a query
+
+        Parameters
+        ----------
+        obj : :class:`mongodb.base.StorableMixin`
+            the object to be changed
+        query : dict
+            the MongoDB query the stored object has to match
+        update : dict
+            the new values by field name in their stored representation
+
+        Returns
+        -------
+        bool
+            True if the object matched and has been changed
+
+        """
+        erg = self._document.update_one(
+            {'$and': [{'_id': str(UUID(int=obj.__uuid__))}, query]},
+            {'$set': update, '$currentDate': {'_modified': True}})
+
+        if erg.modified_count == 0:
+            return False
+
+        # make sure the object sees the changes
+        variables = sync_variables(obj.__class__)
+        for key, data in update.items():
+            if key in variables:
+                variables[key].apply(obj, data)
+
+        return True
+
+    @instrumented('modify_many')
+    def modify_many(self, query, update):
+        """
+        Change all objects matching a query with a single update
+
+        Cached objects read the new values of sync variables from the DB
+        or get them from a watcher.
+
+        Parameters
+        ----------
+        query : dict
+            the MongoDB query to select the objects
+        update : dict
+            the new values by field name in their stored representation
+
+        Returns
+        -------
+        int
+            the number of changed objects
+
+        """
+        erg = self._document.update_many(
+            query,
+            {'$set': update, '$currentDate': {'_modified': True}})
+
+        return erg.modified_count
+
+    @instrumented('modify_test_one')
     def modify_test_one(self, test_fnc, key, value, update):
         """
         Change an attribute of one object that matches a function
@@ -480,8 +874,12 @@ class ObjectStore(StorableMixin):
 
         return modified
 
+    @instrumented('_load')
     def _load(self, idx, builders=list()):
-        one = self._document.find_one({'_id': str(UUID(int=idx))})
+        one = self._prefetched.pop(idx, None)
+        if one is None:
+            one = self._document.find_one({'_id': str(UUID(int=idx))})
+
         obj = self.storage.simplifier.from_simple_dict(one, builders)
         obj.__store__ = self
         return obj
@@ -504,6 +902,7 @@ class ObjectStore(StorableMixin):
 
             self._cached_all = True
 
+    @instrumented('_save')
     def _save(self, obj):
         """Save can recieve an object or group of objects to store.
            The group can be `list`, `set`, or `tuple`.
@@ -521,20 +920,24 @@ class ObjectStore(StorableMixin):
             obj = [obj]
 
         # mark as saved so circular dependencies will not cause infinite loops
-        next_idc = len(self.index)
         [self.index.append(o.__uuid__) for o in obj]
 
         logger.debug('Saving objects of type ' + str(type(obj[0])) + ' using IDX #' + str(obj[0].__uuid__))
 
         try:
             l_dct = [self.storage.simplifier.to_simple_dict(o) for o in obj]
+            saved = time.time()
+            for dct in l_dct:
+                # used to find new documents without reading all ids
+                dct['_saved'] = saved
+
             self._document.insert_many(l_dct)
             [setattr(o,'__store__',self) for o in obj]
             [self.cache.update({o.__uuid__: o}) for o in obj]
 
         except Exception as e:
             # in case we did not succeed remove the mark as being saved
-            del self.index[next_idc:]
+            [self.index.discard(o.__uuid__) for o in obj]
             raise
 
         return [self.reference(o) for o in obj]
@@ -589,7 +992,9 @@ class ObjectStore(StorableMixin):
         #       number argument to get multiple.
         #       use/implement bulk pull&load for
         #       for this
-        length = len(self)
+        self.complete_index()
+        self.check_size()
+        length = len(self.index)
         if length:
             idx = randint(length)
             return self.load(self.index[idx])
@@ -647,9 +1052,109 @@ class ObjectStore(StorableMixin):
         Initialize the associated storage to allow for object storage. Mainly
         creates an index dimension with the name of the object.
         """
-
+        self.ensure_indexes()
         self._created = True
 
+    def _content_classes(self):
+        if self.content_class is None:
+            return []
+
+        return [self.content_class] + self.content_class.descendants()
+
+    def ensure_indexes(self):
+        """
+        Create the DB indexes used to find stored objects
+
+        Single field indexes are created for `name`, `_time`, `_saved`,
+        `_modified` and the public `_find_by` fields of all content classes
+        together with the compound indexes they request in `_indexes`.
+        Existing indexes are left untouched.
+
+        """
+        fields = ['name', '_time', '_saved', '_modified']
+        indexes = []
+        for cls in self._content_classes():
+            fields.extend(
+                key for key in cls._find_by
+                if not key.startswith('_') and key not in fields)
+            indexes.extend(
+                index for index in cls._indexes if index not in indexes)
+
+        for key in fields:
+            self._document.create_index(key)
+
+        for index in indexes:
+            self._document.create_index(index)
+
+    def backfill_index_fields(self):
+        """
+        Write missing `_index_by` fields of stored objects
+
+        Objects saved by older versions lack these fields and cannot be
+        found by queries on them.
+
+        Returns
+        -------
+        int
+            the number of updated objects
+
+        """
+        keys = set()
+        for cls in self._content_classes():
+            keys.update(cls._index_by)
+
+        if not keys:
+            return 0
+
+        idxs = [
+            int(UUID(dct['_id'])) for dct in self._document.find(
+                {'$or': [{key: {'$exists': False}} for key in keys]},
+                projection=['_id'])]
+
+        chunk_size = self.default_store_chunk_size
+        for pos in range(0, len(idxs), chunk_size):
+            for obj in self.load_many(idxs[pos:pos + chunk_size]):
+                self.update_index_fields(obj)
+
+        return len(idxs)
+
+    def collect_arrays(self, ids):
+        """
+        Add the GridFS ids of all arrays referenced by stored objects
+
+        Parameters
+        ----------
+        ids : set
+            the set the found ids are added to
+
+        Returns
+        -------
+        set
+            the updated `ids`
+
+        """
+        for dct in self._document.find():
+            self.storage.simplifier.collect_arrays(dct, ids)
+
+        return ids
+
+    def update_index_fields(self, obj):
+        """
+        Write the derived `_index_by` fields of a stored object
+
+        Parameters
+        ----------
+        obj : :class:`mongodb.base.StorableMixin`
+            the object whose fields are to be updated
+
+        """
+        if obj._index_by:
+            self._document.update_one(
+                {'_id': str(UUID(int=obj.__uuid__))},
+                {'$set': {
+                    key: self.simplifier.simplify(getattr(obj, key))
+                    for key in obj._index_by}})
+
     # ==========================================================================
     # LOAD/SAVE DECORATORS FOR CACHE HANDLING
     # ==========================================================================
@@ -658,6 +1163,7 @@ class ObjectStore(StorableMixin):
         idx = self._document.find_one(dct)['_id']
         return self.load(int(UUID(idx)))
 
+    @instrumented('load')
     def load(self, idx, builders=list(), force_load=False):
         """
         Returns an object from the storage.
@@ -677,11 +1183,9 @@ class ObjectStore(StorableMixin):
             idx = int(UUID(self._document.find_one({'name': idx})['_id']))
 
         if type(idx) is long_t:
-            if idx not in self.index:
-                self.check_size()
-                if idx not in self.index:
-                    raise ValueError(
-                        'str %s not found in storage for class %s' % (idx, self.content_class.__name__))
+            if not self.is_stored(idx):
+                raise ValueError(
+                    'str %s not found in storage for class %s' % (idx, self.content_class.__name__))
 
         else:
             raise ValueError((
@@ -694,6 +1198,7 @@ class ObjectStore(StorableMixin):
             try:
                 obj = self.cache[idx]
                 logger.debug('Found IDX #' + str(idx) + ' in cache. Not loading!')
+                mark_hit(self, True)
                 return obj
 
             except KeyError:
@@ -704,6 +1209,8 @@ class ObjectStore(StorableMixin):
                 'Forcing load of object #%d of class %s' %
                 (idx, self.content_class.__name__))
 
+        mark_hit(self, False)
+
         logger.debug(
             'Calling load object of type `%s` @ IDX #%d' %
             (self.content_class.__name__, idx))
@@ -733,11 +1240,89 @@ class ObjectStore(StorableMixin):
         return obj
 
 
+    def prefetch(self, idxs):
+        """
+        Fetch the documents of several uncached objects with a single query
+
+        The documents are kept until the objects are loaded using `load`.
+
+        Parameters
+        ----------
+        idxs : iterable of int
+            the integer indices of the objects to be fetched
+
+        Returns
+        -------
+        list of int
+            the indices of all documents that were fetched
+
+        """
+        fetch = set(
+            idx for idx in idxs
+            if idx not in self.cache and idx not in self._prefetched)
+
+        if not fetch:
+            return []
+
+        fetched = []
+        for one in self._document.find(
+                {'_id': {'$in': [str(UUID(int=idx)) for idx in fetch]}}):
+            idx = int(UUID(one['_id']))
+            self._prefetched[idx] = one
+            self.index.append(idx)
+            fetched.append(idx)
+
+        return fetched
+
+    def load_many(self, idxs, builders=list()):
+        """
+        Returns several objects from the storage
+
+        All objects not present in the cache are fetched using a single query
+
+        Parameters
+        ----------
+        idxs : list of int
+            the integer indices of the objects to be loaded
+
+        Returns
+        -------
+        list of :py:class:`mongodb.base.StorableMixin`
+            the loaded objects in the order of `idxs`
+        """
+        fetched = self.prefetch(idxs)
+
+        # fetch the referenced objects of all documents at once
+        referenced = self.simplifier.prefetch(
+            [self._prefetched[idx] for idx in fetched])
+
+        try:
+            return [self.load(idx, builders) for idx in idxs]
+
+        finally:
+            # do not keep documents that were not needed
+            self.release(fetched)
+            self.simplifier.release(referenced)
+
+    def release(self, idxs):
+        """
+        Drop prefetched documents that have not been loaded
+
+        Parameters
+        ----------
+        idxs : iterable of int
+            the integer indices of the documents to be dropped
+
+        """
+        for idx in idxs:
+            self._prefetched.pop(idx, None)
+
     @staticmethod
     def reference(obj):
         return obj.__uuid__
 
 
+    @instrumented('save')
     def save(self, obj):
         """
         Handler for saving objects to storage.
@@ -82,6 +82,12 @@ class LoaderProxy(object):
     def __len__(self):
         return len(self.__subject__)
 
+    def __bool__(self):
+        # do not fall back to `__len__`, most subjects have no length
+        return bool(self.__subject__)
+
+    __nonzero__ = __bool__
+
     @property
     def __class__(self):
         return self._store.content_class
@@ -110,6 +116,26 @@ class LoaderProxy(object):
                     self._idx)
 
 
+class DocumentProxy(LoaderProxy):
+    """
+    A `LoaderProxy` that also carries some fields of the stored document
+
+    The fields can be accessed without building the underlying object. All
+    other attributes load the full object.
+    """
+    __slots__ = ['_fields']
+
+    def __init__(self, store, idx, fields):
+        super(DocumentProxy, self).__init__(store, idx)
+        self._fields = fields
+
+    def __getattr__(self, item):
+        if item in self._fields:
+            return self._fields[item]
+
+        return getattr(self.__subject__, item)
+
+
 class DelayedLoader(object):
     """
     Descriptor class to handle proxy objects in attributes
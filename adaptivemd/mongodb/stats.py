@@ -0,0 +1,332 @@
+##############################################################################
+# adaptiveMD: A Python Framework to Run Adaptive Molecular Dynamics (MD)
+#             Simulations on HPC Resources
+# Copyright 2017 FU Berlin and the Authors
+#
+# Authors: Jan-Hendrik Prinz
+# Contributors:
+#
+# `adaptiveMD` is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with MDTraj. If not, see <http://www.gnu.org/licenses/>.
+##############################################################################
+from __future__ import absolute_import
+
+import bisect
+import functools
+import json
+import threading
+import time
+
+import six
+from pymongo import monitoring
+
+from ..util import get_logger
+logger = get_logger(__name__)
+
+
+# upper bounds of the latency histogram bins in seconds
+latency_bins = [1e-4, 3e-4, 1e-3, 3e-3, 1e-2, 3e-2, 1e-1, 3e-1, 1.0]
+latency_labels = [
+    '<0.1ms', '<0.3ms', '<1ms', '<3ms', '<10ms', '<30ms', '<100ms',
+    '<300ms', '<1s', '>=1s']
+
+
+class OperationStats(object):
+    """
+    Counters and a latency histogram of one operation of one store
+    """
+    def __init__(self):
+        self.calls = 0
+        self.hits = 0
+        self.misses = 0
+        self.round_trips = 0
+        self.time = 0.0
+        self.histogram = [0] * len(latency_labels)
+
+    def add(self, seconds):
+        self.calls += 1
+        self.time += seconds
+        self.histogram[bisect.bisect_right(latency_bins, seconds)] += 1
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'hits': self.hits,
+            'misses': self.misses,
+            'round_trips': self.round_trips,
+            'time': self.time,
+            'histogram': dict(
+                (label, n) for label, n in zip(latency_labels, self.histogram)
+                if n > 0)
+        }
+
+
+class Operation(object):
+    """
+    A running instrumented operation
+    """
+    __slots__ = ['stats', 'start', 'hit']
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.start = time.time()
+        self.hit = None
+
+
+class StorageStats(monitoring.CommandListener):
+    """
+    Opt-in instrumentation of a `MongoDBStorage`
+
+    Instrumented store operations count their calls, cache hits and misses
+    and latencies. The recorder is also registered as a pymongo command
+    listener, so every command sent to the server is counted as a round trip
+    of its collection and of the innermost running operation of the thread.
+
+    Nothing is recorded unless `enabled` is set.
+
+    Attributes
+    ----------
+    enabled : bool
+        if False all recording is skipped
+    database : str or None
+        if set, only commands sent to this database are counted
+
+    """
+    def __init__(self, database=None):
+        self.enabled = False
+        self.database = database
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._operations = dict()
+        self._commands = dict()
+        self._pending = dict()
+        self.started_at = time.time()
+
+    def reset(self):
+        """
+        Clear all counters
+
+        """
+        with self._lock:
+            self._operations = dict()
+            self._commands = dict()
+            self._pending = dict()
+            self.started_at = time.time()
+
+    def _get(self, table, store, op):
+        key = (store, op)
+        stats = table.get(key)
+        if stats is None:
+            with self._lock:
+                stats = table.setdefault(key, OperationStats())
+
+        return stats
+
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def begin(self, store, op):
+        """
+        Start recording an operation in the current thread
+
+        Parameters
+        ----------
+        store : str
+            the name of the store
+        op : str
+            the name of the operation
+
+        Returns
+        -------
+        :class:`Operation`
+            the running operation to be passed to `end`
+
+        """
+        operation = Operation(self._get(self._operations, store, op))
+        self._stack().append(operation)
+        return operation
+
+    def end(self, operation):
+        """
+        Finish recording an operation started with `begin`
+
+        """
+        stack = self._stack()
+        if stack and stack[-1] is operation:
+            stack.pop()
+
+        stats = operation.stats
+        stats.add(time.time() - operation.start)
+        if operation.hit is True:
+            stats.hits += 1
+        elif operation.hit is False:
+            stats.misses += 1
+
+    def mark(self, hit):
+        """
+        Mark the innermost running operation as cache hit or miss
+
+        """
+        stack = self._stack()
+        if stack:
+            stack[-1].hit = hit
+
+    # pymongo command listener interface
+
+    def started(self, event):
+        if not self.enabled:
+            return
+
+        if self.database is not None and \
+                event.database_name != self.database:
+            return
+
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, six.string_types):
+            collection = event.database_name
+
+        stack = self._stack()
+        if stack:
+            stack[-1].stats.round_trips += 1
+
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = \
+                (collection, event.command_name)
+
+    def _finished(self, event):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            key = self._pending.pop(
+                (event.connection_id, event.request_id), None)
+
+        if key is not None:
+            stats = self._get(self._commands, *key)
+            stats.add(event.duration_micros * 1e-6)
+            stats.round_trips += 1
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+    def to_dict(self):
+        """
+        Return all counters as a JSON serializable dict
+
+        Returns
+        -------
+        dict
+            `operations` and `commands` counters by store or collection name
+            and operation name and the `duration` of the recording in seconds
+
+        """
+        def nested(table):
+            result = dict()
+            for (store, op), stats in sorted(table.items()):
+                result.setdefault(store, dict())[op] = stats.to_dict()
+
+            return result
+
+        with self._lock:
+            return {
+                'duration': time.time() - self.started_at,
+                'operations': nested(self._operations),
+                'commands': nested(self._commands)
+            }
+
+
+def stats_recorder(store):
+    """
+    Return the enabled recorder of a store or None
+
+    Parameters
+    ----------
+    store : :class:`mongodb.ObjectStore` or None
+        the store
+
+    Returns
+    -------
+    :class:`StorageStats` or None
+        the recorder if it is enabled else None
+
+    """
+    storage = getattr(store, '_storage', None)
+    if storage is None:
+        return None
+
+    recorder = storage.recorder
+    if recorder.enabled:
+        return recorder
+
+    return None
+
+
+def mark_hit(store, hit):
+    """
+    Mark the running operation of a store as cache hit or miss
+
+    """
+    recorder = stats_recorder(store)
+    if recorder is not None:
+        recorder.mark(hit)
+
+
+def instrumented(op):
+    """
+    Decorator to record calls and latencies of a method of a store
+
+    Parameters
+    ----------
+    op : str
+        the name of the operation
+
+    """
+    def _decorator(func):
+        @functools.wraps(func)
+        def _wrapper(self, *args, **kwargs):
+            recorder = stats_recorder(self)
+            if recorder is None:
+                return func(self, *args, **kwargs)
+
+            operation = recorder.begin(self.name, op)
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                recorder.end(operation)
+
+        return _wrapper
+
+    return _decorator
+
+
+def dump_stats(storage, filename):
+    """
+    Write the counters of a storage to a JSON file
+
+    Parameters
+    ----------
+    storage : :class:`mongodb.MongoDBStorage`
+        the storage
+    filename : str
+        the path of the file to be written
+
+    """
+    with open(filename, 'w') as f:
+        json.dump(storage.stats(), f, indent=2, sort_keys=True)
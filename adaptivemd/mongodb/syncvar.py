@@ -27,17 +27,31 @@
 from __future__ import absolute_import
 
 
+import time
 import uuid
 
+from pymongo import ReturnDocument
+
 from adaptivemd.mongodb.base import long_t
 from .dictify import ObjectJSON
+from .stats import stats_recorder
 
 
 class SyncVariable(object):
+    """
+    Attribute that is kept in sync with the stored document of its instance
+
+    If the store of the instance is watched by a
+    :class:`mongodb.watcher.SyncWatcher` values are read locally as long as
+    they are younger than the maximal staleness of the watcher. Otherwise
+    every read will query the DB.
+
+    """
     def __init__(self, name, fix_fnc=None):
         self.name = name
         self.fix_fnc = fix_fnc
         self.key = '_' + self.name + '_'
+        self.synced_key = '_' + self.name + '_synced_'
 
     @staticmethod
     def _idx(instance):
@@ -50,10 +64,48 @@ class SyncVariable(object):
     def _update(self, store, idx):
         if store is not None:
             return store._document.find_one(
-                {'_id': idx})
+                {'_id': idx}, projection=[self.name])
 
         return None
 
+    def _push(self, instance, data):
+        store = instance.__store__
+        batch = _current_batch(store)
+        if batch is not None:
+            batch.set(store, self._idx(instance), self.name, data)
+            return
+
+        store._document.update_one(
+            {'_id': self._idx(instance)},
+            {
+                '$set': {self.name: data},
+                '$currentDate': {'_modified': True}
+            })
+
+    def is_pending(self, instance):
+        """
+        Return True if a write of the local value has not been sent yet
+
+        """
+        store = instance.__store__
+        batch = _current_batch(store)
+        return batch is not None and \
+            batch.is_pending(store, self._idx(instance), self.name)
+
+    def decode(self, instance, data):
+        """
+        Convert the stored representation into the attribute value
+
+        """
+        return data
+
+    def encode(self, value):
+        """
+        Convert the attribute value into the stored representation
+
+        """
+        return value
+
     def read(self, instance):
         try:
             return getattr(instance, self.key)
@@ -62,43 +114,260 @@ class SyncVariable(object):
 
     def write(self, instance, v):
         setattr(instance, self.key, v)
+        setattr(instance, self.synced_key, time.time())
+
+    def is_synced(self, instance):
+        """
+        Return True if the local value is kept up-to-date by a watcher
+
+        """
+        watcher = instance.__store__._watcher
+        if watcher is None or not watcher.is_alive():
+            return False
+
+        synced = getattr(instance, self.synced_key, None)
+
+        return synced is not None and synced >= watcher.started and \
+            time.time() - synced < watcher.max_staleness
+
+    def is_fixed(self, instance):
+        """
+        Return True if the local value cannot change anymore
+
+        """
+        if self.fix_fnc:
+            val = self.read(instance)
+            return val is not None and self.fix_fnc(val)
+
+        return False
+
+    def apply(self, instance, data):
+        """
+        Set the local value from its stored representation
+
+        """
+        self.write(instance, self.decode(instance, data))
 
     def __get__(self, instance, owner):
         if instance is None:
             return self
-        else:
-            if self.fix_fnc:
-                val = self.read(instance)
-                if val is not None and self.fix_fnc(val):
-                    return val
-
-            if instance.__store__ is not None:
-                idx = self._idx(instance)
-                dct = self._update(instance.__store__, idx)
-                if dct and self.name in dct:
-                    value = dct[self.name]
-                    self.write(instance, value)
-                    return value
 
+        recorder = stats_recorder(instance.__store__)
+        if recorder is None:
+            return self._get(instance)
+
+        operation = recorder.begin(
+            instance.__store__.name, self.name + '.get')
+        try:
+            return self._get(instance, operation)
+        finally:
+            recorder.end(operation)
+
+    def _get(self, instance, operation=None):
+        if self.is_fixed(instance):
+            if operation is not None:
+                operation.hit = True
             return self.read(instance)
 
+        if instance.__store__ is not None:
+            if self.is_synced(instance) or self.is_pending(instance):
+                if operation is not None:
+                    operation.hit = True
+                return self.read(instance)
+
+            if operation is not None:
+                operation.hit = False
+
+            idx = self._idx(instance)
+            dct = self._update(instance.__store__, idx)
+            if dct and self.name in dct:
+                value = self.decode(instance, dct[self.name])
+                self.write(instance, value)
+                return value
+
+        return self.read(instance)
+
     def __set__(self, instance, value):
+        recorder = stats_recorder(instance.__store__)
+        if recorder is None:
+            return self._set(instance, value)
+
+        operation = recorder.begin(
+            instance.__store__.name, self.name + '.set')
+        try:
+            return self._set(instance, value)
+        finally:
+            recorder.end(operation)
+
+    def _set(self, instance, value):
         if instance.__store__ is not None:
-            if self.fix_fnc:
-                val = self.read(instance)
-                if val is not None and self.fix_fnc(val):
-                    return
-
-            idx = str(uuid.UUID(int=instance.__uuid__))
-            instance.__store__._document.find_and_modify(
-                query={'_id': idx},
-                update={"$set": {self.name: value}},
-                upsert=False
-                )
+            if self.is_fixed(instance):
+                return
+
+            self._push(instance, self.encode(value))
 
         self.write(instance, value)
 
 
+def _current_batch(store):
+    storage = getattr(store, '_storage', None)
+    if storage is None:
+        return None
+
+    return storage.current_batch()
+
+
+def sync_variables(cls):
+    """
+    Return all sync variables of a class
+
+    Parameters
+    ----------
+    cls : type
+        the class to be inspected
+
+    Returns
+    -------
+    dict of str, :class:`SyncVariable`
+        the variables by the name of the stored field
+
+    """
+    variables = _sync_variables.get(cls)
+    if variables is None:
+        variables = dict()
+        for klass in reversed(cls.__mro__):
+            for value in vars(klass).values():
+                if isinstance(value, SyncVariable):
+                    variables[value.name] = value
+
+        _sync_variables[cls] = variables
+
+    return variables
+
+
+_sync_variables = dict()
+
+
+def refresh_sync_variables(instance, names=None):
+    """
+    Update several sync variables of an object with a single query
+
+    Parameters
+    ----------
+    instance : :class:`mongodb.StorableMixin`
+        the object to be updated
+    names : list of str or None
+        the names of the variables to be updated. If None all sync
+        variables of the object are updated
+
+    Returns
+    -------
+    dict of str, object
+        the current values by variable name
+
+    """
+    variables = sync_variables(instance.__class__)
+    if names is not None:
+        variables = {name: variables[name] for name in names}
+
+    store = instance.__store__
+    update = [
+        name for name, var in variables.items()
+        if not var.is_fixed(instance) and not var.is_pending(instance)]
+
+    if store is not None and update:
+        dct = store._document.find_one(
+            {'_id': SyncVariable._idx(instance)}, projection=update)
+
+        if dct:
+            for name in update:
+                if name in dct:
+                    variables[name].apply(instance, dct[name])
+
+    return {name: var.read(instance) for name, var in variables.items()}
+
+
+
+def exchange_sync_variables(instance, values, names):
+    """
+    Write and read several sync variables with a single atomic operation
+
+    The read values are the ones before the write. A variable that is read
+    and written is swapped atomically, e.g. setting a command to None
+    consumes it exactly once.
+
+    `_modified` is only changed if a written value differs from the local
+    one or a swapped variable had another value, so repeated exchanges of
+    the same values do not wake up watchers.
+
+    Parameters
+    ----------
+    instance : :class:`mongodb.StorableMixin`
+        the object to be changed
+    values : dict of str, object
+        the new values by variable name
+    names : list of str
+        the names of the variables to be read
+
+    Returns
+    -------
+    dict of str, object
+        the values of the read variables before the write
+
+    """
+    variables = sync_variables(instance.__class__)
+    values = {
+        name: value for name, value in values.items()
+        if not variables[name].is_fixed(instance)}
+
+    encoded = {
+        name: variables[name].encode(value) for name, value in values.items()}
+
+    store = instance.__store__
+    dct = None
+    if store is not None:
+        idx = SyncVariable._idx(instance)
+        changed = any(
+            variables[name].encode(variables[name].read(instance)) != data
+            for name, data in encoded.items())
+
+        update = {}
+        if changed:
+            update['$currentDate'] = {'_modified': True}
+        if encoded:
+            update['$set'] = encoded
+
+        if update:
+            dct = store._document.find_one_and_update(
+                {'_id': idx},
+                update,
+                projection=list(names),
+                return_document=ReturnDocument.BEFORE)
+        else:
+            dct = store._document.find_one(
+                {'_id': idx}, projection=list(names))
+
+        if not changed and dct is not None and any(
+                name in dct and dct[name] != data
+                for name, data in encoded.items()):
+            # a swapped value has been changed by someone else, e.g. a
+            # command was consumed
+            store._document.update_one(
+                {'_id': idx}, {'$currentDate': {'_modified': True}})
+
+    result = dict()
+    for name in names:
+        var = variables[name]
+        if dct is not None and name in dct:
+            var.apply(instance, dct[name])
+
+        result[name] = var.read(instance)
+
+    for name, value in values.items():
+        variables[name].write(instance, value)
+
+    return result
+
 # class NoneOrValueSyncVariable(SyncVariable):
 #     """
 #     Variable that can be set once
@@ -164,57 +433,20 @@ class ObjectSyncVariable(SyncVariable):
         super(ObjectSyncVariable, self).__init__(name, fix_fnc)
         self.store = store
 
-    def __get__(self, instance, owner):
-        if instance is None:
-            return self
-        else:
-            if self.fix_fnc:
-                val = self.read(instance)
-                if val is not None and self.fix_fnc(val):
-                    return val
-
-            if instance.__store__ is not None:
-                idx = self._idx(instance)
-                dct = self._update(instance.__store__, idx)
-
-                if dct and self.name in dct:
-                    data = dct[self.name]
-
-                    if data is None:
-                        value = None
-                    else:
-                        obj_idx = long_t(data['_hex_uuid'], 16)
-                        value = getattr(instance.__store__.storage, self.store).load(obj_idx)
-
-                    self.write(instance, value)
-                    return value
-
-            return self.read(instance)
+    def decode(self, instance, data):
+        if data is None:
+            return None
 
-    def __set__(self, instance, value):
-        if instance.__store__ is not None:
-            if self.fix_fnc:
-                val = self.read(instance)
-                if val is not None and self.fix_fnc(val):
-                    return
+        obj_idx = long_t(data['_hex_uuid'], 16)
+        return getattr(instance.__store__.storage, self.store).load(obj_idx)
 
-            idx = self._idx(instance)
-            if value is not None:
-                instance.__store__._document.find_and_modify(
-                    query={'_id': idx},
-                    update={"$set": {self.name: {
-                        '_hex_uuid': self._hex(value),
-                        '_store': self.store}}},
-                    upsert=False
-                    )
-            else:
-                instance.__store__._document.find_and_modify(
-                    query={'_id': idx},
-                    update={"$set": {self.name: None}},
-                    upsert=False
-                    )
+    def encode(self, value):
+        if value is None:
+            return None
 
-        self.write(instance, value)
+        return {
+            '_hex_uuid': self._hex(value),
+            '_store': self.store}
 
 
 _json_sync_simplifier = ObjectJSON()
@@ -224,51 +456,14 @@ class JSONDataSyncVariable(SyncVariable):
     def __init__(self, name, fix_fnc=None):
         super(JSONDataSyncVariable, self).__init__(name, fix_fnc)
 
-    def __get__(self, instance, owner):
-        if instance is None:
-            return self
-        else:
-            if self.fix_fnc:
-                val = self.read(instance)
-                if val is not None and self.fix_fnc(val):
-                    return val
-
-            if instance.__store__ is not None:
-                idx = self._idx(instance)
-                dct = self._update(instance.__store__, idx)
-
-                if dct and self.name in dct:
-                    data = dct[self.name]
-
-                    if data is None:
-                        value = None
-                    else:
-                        value = _json_sync_simplifier.build(data)
-
-                    self.write(instance, value)
-                    return value
-
-            return self.read(instance)
+    def decode(self, instance, data):
+        if data is None:
+            return None
 
-    def __set__(self, instance, value):
-        if instance.__store__ is not None:
-            if self.fix_fnc:
-                val = self.read(instance)
-                if val is not None and self.fix_fnc(val):
-                    return
+        return _json_sync_simplifier.build(data)
 
-            idx = self._idx(instance)
-            if value is not None:
-                instance.__store__._document.find_and_modify(
-                    query={'_id': idx},
-                    update={"$set": {self.name: _json_sync_simplifier.simplify(value)}},
-                    upsert=False
-                    )
-            else:
-                instance.__store__._document.find_and_modify(
-                    query={'_id': idx},
-                    update={"$set": {self.name: None}},
-                    upsert=False
-                    )
+    def encode(self, value):
+        if value is None:
+            return None
 
-        self.write(instance, value)
+        return _json_sync_simplifier.simplify(value)
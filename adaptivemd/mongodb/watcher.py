@@ -0,0 +1,170 @@
+##############################################################################
+# adaptiveMD: A Python Framework to Run Adaptive Molecular Dynamics (MD)
+#             Simulations on HPC Resources
+# Copyright 2017 FU Berlin and the Authors
+#
+# Authors: Jan-Hendrik Prinz
+# Contributors:
+#
+# `adaptiveMD` is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with MDTraj. If not, see <http://www.gnu.org/licenses/>.
+##############################################################################
+from __future__ import absolute_import
+
+import threading
+import time
+from uuid import UUID
+
+from pymongo.errors import OperationFailure
+
+from .syncvar import sync_variables
+
+from ..util import get_logger
+logger = get_logger(__name__)
+
+
+class SyncWatcher(threading.Thread):
+    """
+    Background thread that pushes changes of sync variables to cached objects
+
+    Changes are received from a MongoDB change stream. If the server does
+    not support change streams (e.g. a standalone mongod) the stores are
+    polled for documents with a recent `_modified` stamp instead.
+
+    Attributes
+    ----------
+    stores : list of :class:`mongodb.ObjectStore`
+        the watched stores
+    max_staleness : float
+        number of seconds a synced value is trusted without reading it from
+        the DB again. This bounds the staleness if an update is missed
+    interval : float
+        number of seconds between polls or waits for the change stream
+    mode : str or None
+        either `changestream` or `polling` once started
+
+    """
+    def __init__(self, stores, max_staleness=30.0, interval=1.0):
+        super(SyncWatcher, self).__init__()
+        self.daemon = True
+        self.stores = list(stores)
+        self.max_staleness = max_staleness
+        self.interval = interval
+        self.mode = None
+        self.started = time.time()
+        self._stopped = threading.Event()
+
+        self._stores = {store.name: store for store in self.stores}
+        self._variables = {
+            store.name: self._store_variables(store) for store in self.stores}
+
+    @staticmethod
+    def _store_variables(store):
+        variables = dict()
+        if store.content_class is not None:
+            for cls in [store.content_class] + store.content_class.descendants():
+                variables.update(sync_variables(cls))
+
+        return variables
+
+    def stop(self):
+        """
+        Stop watching. Reads will query the DB again afterwards
+
+        """
+        self._stopped.set()
+
+    def is_alive(self):
+        return not self._stopped.is_set() and \
+            super(SyncWatcher, self).is_alive()
+
+    def run(self):
+        try:
+            try:
+                self._watch_changes()
+
+            except OperationFailure as e:
+                logger.info(
+                    'Change streams not available (%s). Using polling.' % e)
+                self._poll()
+
+        except Exception as e:
+            # without a watcher all reads go to the DB again
+            logger.warning('SyncWatcher stopped: %s' % e)
+            raise
+
+    def _apply(self, store_name, doc_id, fields):
+        store = self._stores[store_name]
+        obj = store.cache.get_silent(int(UUID(doc_id)))
+        if obj is None:
+            return
+
+        variables = sync_variables(obj.__class__)
+        for name, data in fields.items():
+            var = variables.get(name)
+            if var is not None:
+                var.apply(obj, data)
+
+    def _watch_changes(self):
+        db = self.stores[0].storage.db
+        pipeline = [{'$match': {
+            'operationType': 'update',
+            'ns.coll': {'$in': [store.name for store in self.stores]}}}]
+
+        self.started = time.time()
+        with db.watch(
+                pipeline,
+                max_await_time_ms=int(self.interval * 1000)) as stream:
+            self.mode = 'changestream'
+            while not self._stopped.is_set():
+                change = stream.try_next()
+                if change is not None:
+                    self._apply(
+                        change['ns']['coll'],
+                        change['documentKey']['_id'],
+                        change['updateDescription']['updatedFields'])
+
+    def _poll(self):
+        self.mode = 'polling'
+        self.started = time.time()
+        last = dict()
+        for store in self.stores:
+            newest = store._document.find_one(
+                {'_modified': {'$exists': True}},
+                projection=['_modified'],
+                sort=[('_modified', -1)])
+
+            last[store.name] = newest['_modified'] if newest else None
+
+        while not self._stopped.wait(self.interval):
+            for store in self.stores:
+                names = list(self._variables[store.name])
+                if not names:
+                    continue
+
+                since = last[store.name]
+                if since is None:
+                    query = {'_modified': {'$exists': True}}
+                else:
+                    query = {'_modified': {'$gte': since}}
+
+                for doc in store._document.find(
+                        query, projection=names + ['_modified']):
+                    if since is None or doc['_modified'] > since:
+                        since = doc['_modified']
+
+                    self._apply(
+                        store.name, doc['_id'],
+                        {name: doc[name] for name in names if name in doc})
+
+                last[store.name] = since
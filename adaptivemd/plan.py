@@ -1,5 +1,7 @@
 import types
 
+from .condition import merge_dependencies
+
 
 class ExecutionPlan(object):
     """
@@ -60,6 +62,21 @@ class ExecutionPlan(object):
     def __bool__(self):
         return self._running
 
+    def dependencies(self):
+        """
+        Return the names of the stores the conditions waited for depend on
+
+        Returns
+        -------
+        set of str or None
+            the store names or None if the dependencies are unknown
+
+        """
+        if not self._running:
+            return set()
+
+        return merge_dependencies(self._finish_conditions)
+
     def __nonzero__(self):
         return self.__bool__()
 
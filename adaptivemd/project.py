@@ -28,11 +28,14 @@ import time
 import numpy as np
 import os
 import types
+import uuid
+
+import six
 
 from .file import URLGenerator, File
 from .engine import Trajectory
 from .bundle import StoredBundle
-from .condition import Condition
+from .condition import Condition, merge_dependencies
 from .resource import Resource
 from .generator import TaskGenerator
 from .model import Model
@@ -290,6 +293,13 @@ class Project(object):
         # timeout if a worker is not changing its heartbeat in the last n seconds
         self._worker_dead_time = 60
 
+        # events and conditions are checked again if a store they depend on
+        # changes. Ones with unknown dependencies are checked every
+        # `_trigger_interval` seconds and all at least every
+        # `_max_trigger_interval` seconds, e.g. to detect dead workers
+        self._trigger_interval = 5.0
+        self._max_trigger_interval = 30.0
+
         # tasks from dead workers that were started or queue should do what?
         self._set_task_state_from_dead_workers = 'created'
 
@@ -416,16 +426,20 @@ class Project(object):
             self.storage.data.set_caching(WeakValueCache())
             self.storage.logs.set_caching(WeakValueCache())
 
-            # make sure that the file number will be new
-            # TODO This may note work...
-            self.traj_name.initialize_from_files(self.trajectories)
+            # trajectory numbers are reserved using a counter in the DB.
+            # Projects without a counter scan the trajectories once
+            self.traj_name.use_counter(self.storage, 'traj_name')
+            self.traj_name.initialize_on_demand(lambda: self.trajectories)
 
     def reconnect(self):
         """
         Reconnect the DB
 
+        The stores and cached objects are kept, only the connection is
+        renewed.
+
         """
-        self._open_db()
+        self.storage.reconnect()
 
     def _close_db(self):
         self.storage.close()
@@ -545,6 +559,10 @@ class Project(object):
 
         self.tasks.add(_task)
 
+        if _task:
+            # wake up idle workers
+            self.storage.bell().ring(n_tasks=len(_task))
+
     def new_trajectory(self, frame, length, engine=None, number=1):
         """
         Convenience function to create a new `Trajectory` object
@@ -574,12 +592,12 @@ class Project(object):
         `Trajectory` or list of `Trajectory`
 
         """
-        if number == 1:
-            traj = Trajectory(next(self.traj_name), frame, length, engine)
-            return [traj]
-
-        elif number > 1:
-            return [self.new_trajectory(frame, length, engine)[0] for _ in range(number)]
+        if number >= 1:
+            # reserve all names with a single DB round trip
+            self.traj_name.reserve(number)
+            return [
+                Trajectory(next(self.traj_name), frame, length, engine)
+                for _ in range(number)]
 
     def on_ntraj(self, numbers):
         """
@@ -855,30 +873,126 @@ class Project(object):
                     found_iteration = 0
 
             # check worker status and mark as dead if not responding for long times
-            now = time.time()
-            for w in self.workers:
-                if w.state not in ['dead', 'down'] and now - w.seen > self._worker_dead_time:
-                    # make sure it will end and not finish any jobs, just in case
-                    w.command = 'kill'
+            self._mark_dead_workers()
+
+            # tasks might be waiting for more than their dependencies
+            self.release_ready_tasks()
+
+    def release_ready_tasks(self):
+        """
+        Make created tasks claimable again that have become ready
+
+        The stored `ready` field of a task is only set back by its
+        dependencies when they succeed. Tasks that wait for something else,
+        e.g. the source of an extension, that were given back by a worker or
+        whose dependencies succeeded before they were stored, are found here.
+        Only tasks without unfinished dependencies are loaded.
+
+        Returns
+        -------
+        int
+            the number of tasks that can now be claimed
+
+        """
+        waiting = self.storage.tasks.find_proxies(
+            {'state': 'created', 'ready': False}, ['dependency_ids'])
+
+        if not waiting:
+            return 0
+
+        dependencies = set()
+        for proxy in waiting:
+            dependencies.update(proxy.dependency_ids or [])
 
-                    # and mark it dead
-                    w.state = 'dead'
+        unfinished = set()
+        if dependencies:
+            unfinished = set(
+                str(uuid.UUID(int=proxy.__uuid__))
+                for proxy in self.storage.tasks.find_proxies({
+                    '_id': {'$in': list(dependencies)},
+                    'state': {'$ne': 'success'}
+                }, []))
 
-                    # search for abandoned tasks and do something with them
-                    if self._set_task_state_from_dead_workers:
-                        for t in self.tasks:
-                            if t.worker == w and t.state in ['queued', 'running']:
-                                t.state = self._set_task_state_from_dead_workers
+        candidates = [
+            proxy.__uuid__ for proxy in waiting
+            if not unfinished.intersection(proxy.dependency_ids or [])]
 
-                    w.current = None
+        ready = [
+            str(uuid.UUID(int=task.__uuid__))
+            for task in self.storage.tasks.load_many(candidates)
+            if task.ready]
+
+        if not ready:
+            return 0
+
+        n_tasks = self.storage.tasks.modify_many(
+            {'_id': {'$in': ready}, 'state': 'created', 'ready': False},
+            {'ready': True})
+
+        if n_tasks:
+            # wake up idle workers
+            self.storage.bell().ring(n_tasks=n_tasks)
+
+        return n_tasks
+
+    def _mark_dead_workers(self):
+        """
+        Mark workers without a recent heartbeat as dead
+
+        Only the stale workers are read from the DB. Their unfinished tasks
+        are changed with a single update.
+
+        """
+        stale = self.storage.workers.find_proxies({
+            'state': {'$nin': ['dead', 'down']},
+            'seen': {'$lt': time.time() - self._worker_dead_time}
+        }, [])
+
+        if not stale:
+            return
+
+        dead = []
+        with self.storage.batch():
+            for proxy in stale:
+                w = proxy.__subject__
+
+                # make sure it will end and not finish any jobs, just in case
+                w.command = 'kill'
+
+                # and mark it dead
+                w.state = 'dead'
+                w.current = None
+                dead.append(w)
+
+        # search for abandoned tasks and do something with them
+        if self._set_task_state_from_dead_workers:
+            update = {'state': self._set_task_state_from_dead_workers}
+            if update['state'] == 'created':
+                # can be claimed by other workers again
+                update['worker'] = None
+
+            n_tasks = self.storage.tasks.modify_many(
+                {
+                    'worker': {'$in': [Task.worker.encode(w) for w in dead]},
+                    'state': {'$in': ['queued', 'submit', 'running']}
+                },
+                update)
+
+            logger.info(
+                'Marked %d workers dead and set %d of their tasks to `%s`' %
+                (len(dead), n_tasks, self._set_task_state_from_dead_workers))
+
+            if n_tasks and self._set_task_state_from_dead_workers == 'created':
+                # wake up idle workers
+                self.storage.bell().ring(n_tasks=n_tasks)
 
     def run(self):
         """
         Starts observing events in the project
 
         This is still somehow experimental and will call a background thread to
-        call :meth:`Project.trigger` in regular intervals. Make sure to call
-        :meth:`Project.stop`
+        call :meth:`Project.trigger` whenever a store the events depend on
+        changes. Make sure to call :meth:`Project.stop`
         before you quit the notebook session or exit. Otherwise there might
         be a job in the background left (not confirmed but possible!)
 
@@ -895,9 +1009,62 @@ class Project(object):
         """
         if self._event_timer:
             self._stop_event.set()
+            if self.storage.notifier is not None:
+                self.storage.notifier.wake()
+
             self._event_timer = None
             self._stop_event = None
 
+    def _snapshot_changes(self, conditions=()):
+        """
+        Return the versions of the change notifier before checking conditions
+
+        The stores the events or conditions depend on are watched from now
+        on, so a change before `_wait_for_changes` is not missed.
+
+        Parameters
+        ----------
+        conditions : iterable of `Condition` or callable -> bool
+            conditions that are waited for besides the events
+
+        Returns
+        -------
+        dict of str, int
+            the snapshot to be passed to `_wait_for_changes`
+
+        """
+        deps = merge_dependencies(list(self._events) + list(conditions))
+        return self.storage.change_notifier().snapshot(deps or ())
+
+    def _wait_for_changes(self, since, conditions=(), cancel=None):
+        """
+        Block until a change of the DB might affect the events or conditions
+
+        Parameters
+        ----------
+        since : dict of str, int
+            a snapshot of the change notifier taken before the last check
+        conditions : iterable of `Condition` or callable -> bool
+            conditions that are waited for besides the events
+        cancel : `threading.Event` or None
+            stops waiting if set
+
+        Returns
+        -------
+        bool
+            True if a store the events or conditions depend on was changed
+
+        """
+        deps = merge_dependencies(list(self._events) + list(conditions))
+        if deps is None:
+            deps = set()
+            timeout = self._trigger_interval
+        else:
+            timeout = self._max_trigger_interval
+
+        return self.storage.change_notifier().wait(
+            deps, since, timeout, cancel)
+
     def wait_until(self, condition):
         """
         Block until the given condition evaluates to true
@@ -905,14 +1072,19 @@ class Project(object):
         Parameters
         ----------
         condition : callable
-            function that is called in regular intervals. If it evaluates to
-            True the function returns
+            function that is called whenever a store it depends on changes.
+            If it evaluates to True the function returns. Conditions with
+            unknown dependencies are called in regular intervals
 
         """
         def check_condition(c):
-            while not c():
+            while True:
+                since = self._snapshot_changes([c])
+                if c():
+                    break
+
                 self.trigger()
-                time.sleep(5.0)
+                self._wait_for_changes(since, [c])
 
         if not isinstance(condition, list):
             condition = [condition]
@@ -928,23 +1100,46 @@ class Project(object):
         self.tasks._set.load_indices()
 
     @property
-    def task_states(self, deep_check=False):
+    def task_states(self):
         """
         Tallies for each task state.
+
+        The counts are computed on the server without loading any task.
+
+        Returns
+        -------
+        dict of str, int
+            count of the number of tasks in each observed task state.
+        """
+        return self.storage.tasks.count_by('state')
+
+    def tasks_by_state(self, states, projection=None):
+        """
+        Find all tasks in given states without loading them
+
+        Parameters
+        ----------
+        states : str or iterable of str
+            the task states to look for
+        projection : list of str or None
+            the stored task fields that are available from the returned
+            proxies without loading the task, defaults to `['state']`
+
         Returns
         -------
-        count of the number of tasks in each observed task state.
+        list of :class:`adaptivemd.mongodb.DocumentProxy`
+            proxies for the tasks. Accessing other attributes than the
+            projected ones will load the full task
+
         """
-        taskstates = dict()
-        if deep_check:
-            self.tasks._set.clear_cache()
-            self.tasks._set.load_indices()
+        if isinstance(states, six.string_types):
+            states = [states]
 
-        for task in self.tasks:
-            if task.state not in taskstates: taskstates[task.state] = 1
-            else: taskstates[task.state] += 1
+        if projection is None:
+            projection = ['state']
 
-        return taskstates
+        return self.storage.tasks.find_proxies(
+            {'state': {'$in': list(states)}}, projection)
 
 
     class EventTriggerTimer(threading.Thread):
@@ -959,8 +1154,10 @@ class Project(object):
             self.project = project
 
         def run(self):
-            while not self.stopped.wait(5.0):
+            while not self.stopped.is_set():
+                since = self.project._snapshot_changes()
                 self.project.trigger()
+                self.project._wait_for_changes(since, cancel=self.stopped)
 
 
 class NTrajectories(Condition):
@@ -976,6 +1173,9 @@ class NTrajectories(Condition):
     def check(self):
         return len(self.project.trajectories) >= self.number
 
+    def dependencies(self):
+        return {'files'}
+
     def __str__(self):
         return '#files[%d] >= %d' % (len(self.project.trajectories), self.number)
 
@@ -1000,6 +1200,9 @@ class NModels(Condition):
     def check(self):
         return len(self.project.models) >= self.number
 
+    def dependencies(self):
+        return {'models'}
+
     def __str__(self):
         return '#models[%d] >= %d' % (len(self.project.models), self.number)
 
@@ -1,5 +1,5 @@
 import time
-from pymongo import MongoClient
+from adaptivemd.mongodb.connection import get_client
 from pprint import pprint
 from utils import hex_to_id, resolve_location
 from datetime import datetime
@@ -37,7 +37,8 @@ class Database():
         self.configuration_collection = 'configurations'
         self.file_collection = 'files'
         self.generator_collection = 'generators'
-        self.client = MongoClient(self.url)
+        # shared with all other connections of this process to the url
+        self.client = get_client(self.url)
         self.db = self.client[self.store_name]
 
     def get_task_descriptions(self, state='created'):
@@ -111,6 +111,8 @@ class TaskManager(object):
     def _running_checker(self, checklist, dburl, projectname):
         self._db_obj = Database(dburl, projectname)
         task_col = self._db_obj.db[self._db_obj.tasks_collection]
+        # only tasks submitted through RP have a cuid
+        task_col.create_index("cuid", sparse=True)
         while not self._terminate.is_set():
             # Get a batch of cu's to check
             for j,((starttime,waittime),(cuids,kills)) in enumerate(checklist.items()):
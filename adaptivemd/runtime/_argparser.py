@@ -154,4 +154,8 @@ def get_argparser():
         help="Quit runtime after rescue check",
         action="store_true")
 
+    parser.add_argument("--storage-stats", dest="storage_stats",
+        help="Record storage statistics and write them to this JSON file",
+        type=stripped, default=None)
+
     return parser
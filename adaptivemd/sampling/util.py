@@ -15,15 +15,15 @@ def get_model(project, filters=dict()):
       reverse=True, key=lambda m: m.__time__)
 
     # filterkeys: (1 parameter under 1 module) with 1 value
-    filters = map(lambda fk,v: (fk.split('.'), v), filters.items())
+    filters = [(fk.split('.'), v) for fk, v in filters.items()]
     for model in models:
         # best thing & somewhat erroneous check is
         # isinstance(model,p.models._set.content_class)
         #assert(isinstance(model, Model))
-        if not all([model.data.data.get(mod).get(par) == v for (mod,par),v in filters]):
+        if not all([model.parameter(mod, par) == v for (mod,par),v in filters]):
             continue
 
-        logger.info("The selected model analyzed %d trajectories" % len(model.data['input']['trajectories']))
+        logger.info("The selected model analyzed %d trajectories" % model.shape('input', 'trajectories')[0])
         return model
 
     else:
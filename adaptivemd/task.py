@@ -191,11 +191,21 @@ class Task(BaseTask):
         'stdout', 'stderr', 'restartable', 'cleanup',
         'generator', 'dependencies', 'state', 'worker',
         'est_exec_time', 'resource_requirements',
-        'resource_name'
+        'resource_name', 'priority'
         ]
 
     _find_by = ['state', 'worker', 'stderr', 'stdout']
 
+    # used by workers to claim tasks, see `Worker.claim_next`. A stored
+    # `ready` of False is set back by `_release_dependents` and
+    # `Project.release_ready_tasks`
+    _index_by = ['ready', 'generator_name', 'priority', 'dependency_ids']
+    _indexes = [
+        [('state', 1), ('ready', 1), ('generator_name', 1),
+         ('priority', -1), ('_time', 1)],
+        [('dependency_ids', 1)]
+    ]
+
     state = SyncVariable('state', lambda x: x in ['success', 'cancelled'])
     worker = ObjectSyncVariable('worker', 'workers')
     stdout = ObjectSyncVariable('stdout', 'logs', lambda x: x is not None)
@@ -208,12 +218,13 @@ class Task(BaseTask):
     RUNNABLE_STATES = ['created']
 
     def __init__(self, generator=None, resource_name=None, est_exec_time=5,
-                 cpu_threads=1, gpu_contexts=0, mpi_rank=0):
+                 cpu_threads=1, gpu_contexts=0, mpi_rank=0, priority=0):
 
         super(Task, self).__init__()
 
         self.generator = generator
         self.dependencies = None
+        self.priority = priority
         self._on = {}
         self._add_files = []
 
@@ -312,6 +323,72 @@ class Task(BaseTask):
 
         return True
 
+    @property
+    def generator_name(self):
+        """
+        str or None
+            the name of the generator that created this task
+
+        """
+        if self.generator is not None:
+            return self.generator.name
+
+        return None
+
+    @property
+    def dependency_ids(self):
+        """
+        list of str
+            the stored ids of all dependency tasks
+
+        """
+        return [
+            str(uuid.UUID(int=d.__uuid__)) for d in self.dependencies or []]
+
+    def _release_dependents(self):
+        """
+        Mark stored tasks as ready whose dependencies have all succeeded
+
+        """
+        if self.__store__ is None:
+            return
+
+        tasks = self.__store__
+        waiting = tasks.find_proxies(
+            {
+                'dependency_ids': str(uuid.UUID(int=self.__uuid__)),
+                'ready': False
+            }, ['dependency_ids'])
+
+        if not waiting:
+            return
+
+        dependencies = set()
+        for proxy in waiting:
+            dependencies.update(proxy.dependency_ids)
+
+        unfinished = set(
+            str(uuid.UUID(int=proxy.__uuid__))
+            for proxy in tasks.find_proxies({
+                '_id': {'$in': list(dependencies)},
+                'state': {'$ne': 'success'}
+            }, []))
+
+        ready = [
+            str(uuid.UUID(int=proxy.__uuid__)) for proxy in waiting
+            if not unfinished.intersection(proxy.dependency_ids)]
+
+        if not ready:
+            return
+
+        # stamps `_modified`, so watchers and notifiers see the release
+        released = tasks.modify_many(
+            {'_id': {'$in': ready}, 'ready': False}, {'ready': True})
+
+        if released:
+            # wake up idle workers
+            tasks.storage.bell().ring(n_tasks=released)
+
     def _default_fail(self, scheduler, path=None):
         """
         the default function executed when a task fails
@@ -423,6 +500,9 @@ class Task(BaseTask):
         if event in ['submit', 'fail', 'success']:
             self.state = event
 
+        if event == 'success':
+            self._release_dependents()
+
     def is_done(self):
         """
         Check if the task is done executing. Can be failed, successful or cancelled
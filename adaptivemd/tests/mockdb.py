@@ -0,0 +1,64 @@
+"""
+Run tests against an in-memory `mongomock` database instead of a server
+"""
+import unittest
+import uuid
+
+try:
+    import mongomock
+    import mongomock.gridfs
+except ImportError:
+    mongomock = None
+
+from adaptivemd import Project
+from adaptivemd.mongodb import connection
+
+
+_client = None
+
+
+def _bulk_write(self, requests, ordered=True, **kwargs):
+    # mongomock cannot run the `UpdateOne` of current pymongo versions
+    for request in requests:
+        self.update_one(request._filter, request._doc)
+
+
+def mock_client(*args, **kwargs):
+    global _client
+    if _client is None:
+        mongomock.gridfs.enable_gridfs_integration()
+        mongomock.Collection.bulk_write = _bulk_write
+        _client = mongomock.MongoClient()
+
+    return _client
+
+
+@unittest.skipIf(mongomock is None, 'mongomock is not installed')
+class MockDBTestCase(unittest.TestCase):
+    """
+    A test with a fresh project in a `mongomock` database
+    """
+
+    def setUp(self):
+        self._client_class = connection.MongoClient
+        connection.close_all()
+        connection.MongoClient = mock_client
+
+        self.name = 'test_%s' % uuid.uuid4().hex[:8]
+        self.project = Project(self.name)
+        self.project.initialize()
+
+        # mongomock has no capped collections, a plain one works for ringing
+        self.project.storage.db.create_collection(
+            self.project.storage.bell().name)
+
+    def tearDown(self):
+        Project.delete(self.name)
+        connection.close_all()
+        connection.MongoClient = self._client_class
+
+    def reopen(self):
+        """
+        Open the project again with empty caches
+        """
+        return Project(self.name)
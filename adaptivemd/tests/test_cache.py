@@ -0,0 +1,91 @@
+import gc
+import unittest
+
+import numpy as np
+
+from adaptivemd.mongodb import MemoryLRUCache, MaxCache, WeakLRUCache
+
+
+class Item(object):
+    def __init__(self, nbytes):
+        self.payload = np.zeros(nbytes, dtype=np.uint8)
+
+
+class TestMemoryLRUCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = MemoryLRUCache(byte_limit=10000, sizeof=lambda x: 1000)
+
+    def test_byte_limit(self):
+        items = [Item(10) for _ in range(20)]
+        for i, item in enumerate(items):
+            self.cache[i] = item
+
+        self.assertEqual(self.cache.bytes, 10000)
+        self.assertEqual(self.cache.count, (10, 10))
+        self.assertEqual(self.cache.evictions, 10)
+
+        # evicted objects still in use are found through the weak references
+        self.assertIs(self.cache[0], items[0])
+        self.assertEqual(self.cache.bytes, 10000)
+
+    def test_evicted_objects_are_released(self):
+        for i in range(20):
+            self.cache[i] = Item(10)
+
+        gc.collect()
+        self.assertEqual(self.cache.count, (10, 0))
+        self.assertNotIn(0, self.cache)
+        self.assertIn(19, self.cache)
+
+    def test_lru_order(self):
+        items = [Item(10) for _ in range(10)]
+        for i, item in enumerate(items):
+            self.cache[i] = item
+
+        self.cache[0]
+        self.cache[10] = Item(10)
+        self.assertEqual(self.cache.count, (10, 1))
+        self.assertIsNone(self.cache._cache.get(1))
+        self.assertIs(self.cache._cache[0], items[0])
+
+    def test_counters(self):
+        item = Item(10)
+        self.cache[1] = item
+        self.cache[1]
+        self.assertRaises(KeyError, self.cache.__getitem__, 2)
+        self.assertIsNone(self.cache.get(2))
+        self.assertIs(self.cache.get_silent(1), item)
+
+        stats = self.cache.stats
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 2)
+
+        self.cache.reset_stats()
+        self.assertEqual(self.cache.stats['hits'], 0)
+
+    def test_approximate_size(self):
+        cache = MemoryLRUCache(byte_limit=50000)
+        items = [Item(20000) for _ in range(3)]
+        for i, item in enumerate(items):
+            cache[i] = item
+
+        self.assertGreaterEqual(cache.bytes, 20000)
+        self.assertEqual(cache.count[0], 2)
+
+    def test_transfer(self):
+        items = [Item(10) for _ in range(20)]
+        old = MaxCache()
+        for i, item in enumerate(items):
+            old[i] = item
+
+        cache = self.cache.transfer(old)
+        self.assertEqual(cache.count, (10, 10))
+        self.assertIs(cache._cache[19], items[19])
+
+        back = WeakLRUCache(5).transfer(cache)
+        self.assertEqual(len(back), 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
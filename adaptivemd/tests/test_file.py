@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+
+from adaptivemd import File, Model, Trajectory
+from adaptivemd.file import URLGenerator
+from adaptivemd.mongodb import DataDict, LoaderProxy
+from adaptivemd.sampling.util import get_model
+
+from adaptivemd.tests.mockdb import MockDBTestCase
+
+
+class TestStoredContent(MockDBTestCase):
+
+    def setUp(self):
+        super(TestStoredContent, self).setUp()
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+        super(TestStoredContent, self).tearDown()
+
+    def test_get_file(self):
+        path = os.path.join(self.folder, 'input.pdb')
+        with open(path, 'w') as f:
+            f.write('ATOM')
+
+        stored = File('file://' + path).load()
+        self.project.files.add(stored)
+
+        loaded = self.reopen().storage.files.load(stored.__uuid__)
+        self.assertTrue(loaded.has_file)
+        self.assertEqual(loaded.get_file(), 'ATOM')
+
+    def test_json_content(self):
+        # content stored by older versions
+        stored = DataDict({'lagtime': 2})
+        storage = self.project.storage
+        storage.data.grid.put(
+            storage.json_simplifier.to_json_object(stored),
+            _id=hex(stored.__uuid__),
+            _time=stored.__time__,
+            encoding='utf8')
+
+        loaded = self.reopen().storage.data.load(stored.__uuid__)
+        self.assertEqual(loaded.data, {'lagtime': 2})
+
+    def test_model_sections_are_lazy(self):
+        stored = Model({'msm': {'lagtime': 2, 'P': [[0.9, 0.1], [0.1, 0.9]]}})
+        self.project.models.add(stored)
+
+        loaded = self.reopen().storage.models.load(stored.__uuid__)
+        self.assertIsInstance(loaded._sections['msm'], LoaderProxy)
+        self.assertEqual(loaded.parameter('msm', 'lagtime'), 2)
+        self.assertEqual(loaded.msm['P'], [[0.9, 0.1], [0.1, 0.9]])
+
+    def test_model_without_header(self):
+        trajectories = [
+            Trajectory('file://{}/traj%d/' % n, None, 100) for n in range(3)]
+        self.project.files.add(trajectories)
+
+        # the layout of models stored by older versions
+        stored = Model(DataDict({
+            'input': {'trajectories': trajectories},
+            'msm': {'lagtime': 2, 'P': [[0.9, 0.1], [0.1, 0.9]]}}))
+        self.project.models.add(stored)
+
+        project = self.reopen()
+        loaded = project.storage.models.load(stored.__uuid__)
+        self.assertEqual(loaded.header, dict())
+        self.assertEqual(loaded.shape('input', 'trajectories'), [3])
+        self.assertEqual(loaded.shape('msm', 'P'), [2])
+        self.assertIsNone(loaded.shape('msm', 'lagtime'))
+        self.assertEqual(loaded.parameter('msm', 'lagtime'), 2)
+
+        self.assertEqual(get_model(project).__uuid__, stored.__uuid__)
+
+
+class TestURLGenerator(MockDBTestCase):
+
+    def generator(self):
+        gen = URLGenerator('trajs/{count:08d}/', block_size=8)
+        gen.use_counter(self.project.storage, 'test')
+        return gen
+
+    def counter(self):
+        return self.project.storage.db['counters'].find_one(
+            {'_id': 'test'})['count']
+
+    def test_blocks_grow(self):
+        gen = self.generator()
+        self.assertEqual(next(gen), 'trajs/00000000/')
+        self.assertEqual(self.counter(), 1)
+
+        names = [next(gen) for _ in range(14)]
+        self.assertEqual(names[-1], 'trajs/00000014/')
+        # blocks of 2, 4 and 8 names
+        self.assertEqual(self.counter(), 15)
+
+        next(gen)
+        self.assertEqual(self.counter(), 23)
+
+    def test_reserve(self):
+        gen = self.generator()
+        gen.reserve(20)
+        self.assertEqual(gen.available, 20)
+        self.assertEqual(self.counter(), 20)
+
+    def test_generators_do_not_collide(self):
+        first = self.generator()
+        second = self.generator()
+        names = [next(gen) for _ in range(10) for gen in [first, second]]
+        self.assertEqual(len(set(names)), len(names))
@@ -0,0 +1,208 @@
+import threading
+import time
+
+from pymongo.errors import OperationFailure
+
+from adaptivemd import Task
+from adaptivemd.condition import Condition
+from adaptivemd.mongodb.notifier import ChangeNotifier
+from adaptivemd.mongodb.watcher import SyncWatcher
+
+from adaptivemd.tests.mockdb import MockDBTestCase
+
+
+class PollingNotifier(ChangeNotifier):
+    # like a standalone mongod without change streams
+    def _watch_changes(self):
+        raise OperationFailure('no change streams')
+
+
+class PollingWatcher(SyncWatcher):
+    def _watch_changes(self):
+        raise OperationFailure('no change streams')
+
+
+class NTasks(Condition):
+    def __init__(self, project, number):
+        super(NTasks, self).__init__()
+        self.project = project
+        self.number = number
+
+    def check(self):
+        return self.project.task_states.get('success', 0) >= self.number
+
+    def dependencies(self):
+        return {'tasks'}
+
+
+class NotifierTestCase(MockDBTestCase):
+
+    def setUp(self):
+        super(NotifierTestCase, self).setUp()
+        self.task = Task()
+        self.project.queue(self.task)
+
+        storage = self.project.storage
+        storage.notifier = PollingNotifier(storage, interval=0.02)
+        storage.notifier.start()
+        self.notifier = storage.change_notifier()
+
+        self.other = self.reopen()
+        self.threads = []
+
+    def tearDown(self):
+        self.project.storage._stop_notifier()
+        for thread in self.threads:
+            thread.join(5.0)
+
+        super(NotifierTestCase, self).tearDown()
+
+    def later(self, func, delay=0.1):
+        def run():
+            time.sleep(delay)
+            func()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.threads.append(thread)
+
+    def finish_task(self):
+        self.other.storage.tasks.modify_many({}, {'state': 'success'})
+
+
+class TestChangeNotifier(NotifierTestCase):
+
+    def test_polling(self):
+        self.assertEqual(self.notifier.mode, 'polling')
+        self.assertIs(self.project.storage.change_notifier(), self.notifier)
+
+    def test_change_wakes_wait(self):
+        self.later(self.finish_task)
+
+        start = time.time()
+        self.assertTrue(self.notifier.wait(['tasks'], timeout=5.0))
+        self.assertLess(time.time() - start, 2.0)
+
+    def test_new_document_wakes_wait(self):
+        self.later(lambda: self.other.queue(Task()))
+        self.assertTrue(self.notifier.wait(['tasks'], timeout=5.0))
+
+    def test_change_before_wait_is_not_lost(self):
+        since = self.notifier.snapshot(['tasks'])
+
+        # the change happens while the caller checks its conditions
+        time.sleep(0.01)
+        self.finish_task()
+        time.sleep(0.2)
+
+        start = time.time()
+        self.assertTrue(self.notifier.wait(['tasks'], since, timeout=5.0))
+        self.assertLess(time.time() - start, 1.0)
+
+    def test_timeout(self):
+        self.assertFalse(self.notifier.wait(['tasks'], timeout=0.1))
+
+    def test_stop_unblocks_waiters(self):
+        result = []
+        thread = threading.Thread(
+            target=lambda: result.append(self.notifier.wait(['tasks'])))
+        thread.start()
+
+        time.sleep(0.1)
+        self.notifier.stop()
+        thread.join(2.0)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(result, [False])
+
+    def test_cancel(self):
+        cancel = threading.Event()
+        self.later(lambda: (cancel.set(), self.notifier.wake()))
+        self.assertFalse(
+            self.notifier.wait(['tasks'], timeout=5.0, cancel=cancel))
+
+
+class TestWaitUntil(NotifierTestCase):
+
+    def test_wait_until(self):
+        self.project._trigger_interval = 60.0
+        self.project._max_trigger_interval = 60.0
+
+        self.later(self.finish_task)
+
+        start = time.time()
+        self.project.wait_until(NTasks(self.project, 1))
+        self.assertLess(time.time() - start, 5.0)
+
+    def test_event_trigger_timer_stops(self):
+        self.project._trigger_interval = 60.0
+        self.project.run()
+        timer = self.project._event_timer
+        time.sleep(0.1)
+
+        self.project.stop()
+        timer.join(2.0)
+        self.assertFalse(timer.is_alive())
+
+
+class Reads(object):
+    """
+    Collection that counts the calls of `find_one`
+
+    """
+    def __init__(self, document):
+        self._wrapped = document
+        self.reads = 0
+
+    def __getattr__(self, item):
+        return getattr(self._wrapped, item)
+
+    def find_one(self, *args, **kwargs):
+        self.reads += 1
+        return self._wrapped.find_one(*args, **kwargs)
+
+
+class TestSyncWatcher(MockDBTestCase):
+
+    def setUp(self):
+        super(TestSyncWatcher, self).setUp()
+        self.task = Task()
+        self.project.queue(self.task)
+
+        # as done by `MongoDBStorage.watch`
+        storage = self.project.storage
+        storage.watcher = PollingWatcher([storage.tasks], 30.0, 0.02)
+        storage.tasks._watcher = storage.watcher
+        storage.watcher.start()
+
+        self.other = self.reopen()
+
+    def tearDown(self):
+        self.project.storage.unwatch()
+        super(TestSyncWatcher, self).tearDown()
+
+    def synced(self, state, timeout=2.0):
+        end = time.time() + timeout
+        while time.time() < end:
+            if Task.state.read(self.task) == state:
+                return True
+
+            time.sleep(0.01)
+
+        return False
+
+    def test_changes_are_pushed(self):
+        self.assertEqual(self.project.storage.watcher.mode, 'polling')
+
+        time.sleep(0.05)
+        self.other.storage.tasks.load(self.task.__uuid__).state = 'running'
+        self.assertTrue(self.synced('running'))
+
+        # synced values are read without a query
+        tasks = self.project.storage.tasks
+        tasks._document = Reads(tasks._document)
+        self.assertEqual(self.task.state, 'running')
+        self.assertEqual(tasks._document.reads, 0)
+
+        self.project.storage.unwatch()
+        self.assertEqual(self.task.state, 'running')
+        self.assertEqual(tasks._document.reads, 1)
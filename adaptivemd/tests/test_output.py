@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from adaptivemd.worker import OutputPump
+
+
+class TestOutputPump(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'task.stdout')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def pump(self, chunks, **kwargs):
+        read, write = os.pipe()
+        with os.fdopen(read, 'rb') as pipe:
+            pump = OutputPump(pipe, self.filename, **kwargs)
+            pump.start()
+            with os.fdopen(write, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    f.flush()
+
+            pump.join(10)
+
+        return pump
+
+    def test_short_output(self):
+        pump = self.pump([b'hello\n', b'world\n'])
+        self.assertFalse(pump.truncated)
+        self.assertEqual(pump.tail, 'hello\nworld\n')
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), b'hello\nworld\n')
+
+    def long_output(self):
+        # more than one read from the pipe for each rotation
+        lines = [b'%07d\n' % i for i in range(35000)]
+        return [b''.join(lines[i:i + 5000]) for i in range(0, 35000, 5000)]
+
+    def test_rotation_and_tail(self):
+        pump = self.pump(
+            self.long_output(),
+            max_bytes=100000, backup_count=2, tail_bytes=16)
+
+        self.assertEqual(pump.n_bytes, 280000)
+        self.assertTrue(pump.truncated)
+        self.assertTrue(pump.tail.endswith('0034998\n0034999\n'))
+        self.assertIn('279984 bytes skipped', pump.tail)
+
+        # only the newest files are kept
+        self.assertTrue(os.path.exists(self.filename + '.2'))
+        self.assertFalse(os.path.exists(self.filename + '.3'))
+        for name in os.listdir(self.folder):
+            self.assertLessEqual(
+                os.path.getsize(os.path.join(self.folder, name)), 100000)
+
+        with open(self.filename, 'rb') as f:
+            self.assertTrue(f.read().endswith(b'0034999\n'))
+
+    def test_remove(self):
+        pump = self.pump(
+            self.long_output(),
+            max_bytes=100000, backup_count=2, tail_bytes=16)
+
+        pump.remove()
+        self.assertEqual(os.listdir(self.folder), [])
+        self.assertIsNone(pump.filename)
+        self.assertTrue(pump.tail.startswith('[... 279984 bytes skipped]'))
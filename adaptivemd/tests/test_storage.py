@@ -0,0 +1,347 @@
+import datetime
+import time
+import unittest
+import uuid
+
+import numpy as np
+
+from adaptivemd import Model, Task, Trajectory, Worker
+from adaptivemd.mongodb import (
+    ObjectStore, StorableMixin, exchange_sync_variables)
+from adaptivemd.mongodb.object import UUIDIndex
+
+from adaptivemd.tests.mockdb import MockDBTestCase
+
+
+class TestIndexVersion(MockDBTestCase):
+
+    def test_old_project_is_migrated(self):
+        self.project.queue(Task(), Task())
+
+        # make it look like a project created by an older version
+        storage = self.project.storage
+        storage.db[storage._meta_name].drop()
+        storage.tasks._document.drop_indexes()
+        storage.tasks._document.update_many(
+            {}, {'$unset': {'ready': '', 'priority': ''}})
+
+        storage = self.reopen().storage
+        documents = storage.tasks._document
+        self.assertEqual(
+            documents.count_documents({'ready': True, 'priority': 0}),
+            documents.count_documents({}))
+        self.assertIn('_modified_1', documents.index_information())
+        self.assertEqual(
+            storage.db[storage._meta_name].find_one({'_id': 'indexes'})[
+                'version'], storage.index_version)
+
+    def test_new_project_is_stamped(self):
+        storage = self.project.storage
+        self.assertEqual(
+            storage.db[storage._meta_name].find_one({'_id': 'indexes'})[
+                'version'], storage.index_version)
+
+
+class TestUUIDIndex(unittest.TestCase):
+
+    def test_order_and_removal(self):
+        index = UUIDIndex([5, 3, 8, 3, 1])
+        self.assertEqual(list(index), [5, 3, 8, 1])
+
+        index.remove(3)
+        index.discard(3)
+        self.assertNotIn(3, index)
+        self.assertEqual(len(index), 3)
+        self.assertEqual(list(index), [5, 8, 1])
+        self.assertEqual(index[1], 8)
+
+        index.append(3)
+        index.remove(5)
+        self.assertEqual([index[n] for n in range(len(index))], [8, 1, 3])
+        self.assertRaises(KeyError, index.remove, 5)
+
+
+class TestIncrementalIndex(MockDBTestCase):
+
+    def test_new_documents_are_found(self):
+        tasks = self.project.storage.tasks
+        self.project.queue(Task())
+        n_tasks = len(list(tasks))
+        self.assertIn('_saved_1', tasks._document.index_information())
+
+        # saved by another client
+        task = Task()
+        self.reopen().storage.tasks.save(task)
+
+        def fail():
+            raise AssertionError('the full index was loaded')
+
+        tasks.load_indices = fail
+        self.assertTrue(tasks.check_size())
+        self.assertIn(task.__uuid__, tasks.index)
+        self.assertEqual(len(tasks.index), n_tasks + 1)
+
+
+class Queries(object):
+    """
+    Collection that records the queries of `find`
+
+    """
+    def __init__(self, document, calls):
+        self._wrapped = document
+        self._calls = calls
+
+    def __getattr__(self, item):
+        return getattr(self._wrapped, item)
+
+    def find(self, *args, **kwargs):
+        self._calls.append(self._wrapped.name)
+        return self._wrapped.find(*args, **kwargs)
+
+    def find_one(self, *args, **kwargs):
+        self._calls.append(self._wrapped.name)
+        return self._wrapped.find_one(*args, **kwargs)
+
+
+class TestPrefetch(MockDBTestCase):
+
+    def setUp(self):
+        super(TestPrefetch, self).setUp()
+        self.dependencies = []
+        for n in range(3):
+            task = Task()
+            task.touch(Trajectory('file://{}/traj%d/' % n, None, 100))
+            self.dependencies.append(task)
+
+        self.task = Task()
+        self.task.dependencies = self.dependencies
+        self.project.queue(self.task)
+
+        self.storage = self.reopen().storage
+        self.calls = []
+        for store in [self.storage.tasks, self.storage.files]:
+            store._document = Queries(store._document, self.calls)
+
+    def test_one_query_per_level(self):
+        task = self.storage.tasks.load_many([self.task.__uuid__])[0]
+        self.assertEqual(self.calls, ['tasks', 'tasks', 'files'])
+
+        self.assertEqual(
+            [x.__uuid__ for x in task.dependencies],
+            [x.__uuid__ for x in self.dependencies])
+        self.assertEqual(
+            task.dependencies[2]._main[0].source.basename, 'traj2')
+        self.assertEqual(self.calls, ['tasks', 'tasks', 'files'])
+
+        # nothing is kept after loading
+        self.assertEqual(self.storage.tasks._prefetched, {})
+        self.assertEqual(self.storage.files._prefetched, {})
+
+        # cached objects are not fetched again
+        self.storage.tasks.load_many([self.task.__uuid__])
+        self.assertEqual(len(self.calls), 3)
+
+    def test_release(self):
+        tasks = self.storage.tasks
+        idxs = [x.__uuid__ for x in self.dependencies]
+        self.assertEqual(sorted(tasks.prefetch(idxs)), sorted(idxs))
+        self.assertEqual(tasks.prefetch(idxs), [])
+        self.assertEqual(self.calls, ['tasks'])
+
+        # a prefetched document is used for loading
+        self.assertEqual(tasks.load(idxs[0]).__uuid__, idxs[0])
+        self.assertEqual(self.calls.count('tasks'), 1)
+        self.assertNotIn(idxs[0], tasks._prefetched)
+
+        tasks.release(idxs)
+        self.assertEqual(tasks._prefetched, {})
+
+
+class Weights(StorableMixin):
+    def __init__(self, values):
+        super(Weights, self).__init__()
+        self.values = values
+
+
+class TestArrays(MockDBTestCase):
+
+    def setUp(self):
+        super(TestArrays, self).setUp()
+        self.project.storage.create_store(ObjectStore('weights', Weights))
+        self.storage = self.reopen().storage
+        self.storage.weights.set_caching(True)
+        self.storage.simplifier.array_gridfs_limit = 100
+
+    def test_arrays_are_shared_and_removed(self):
+        data = np.arange(100, dtype=np.float64)
+        first = Weights(data)
+        self.storage.weights.save(first)
+        self.storage.weights.save(Weights(data.copy()))
+
+        files = self.storage.db['arrays.files']
+        self.assertEqual(files.count_documents({}), 1)
+
+        loaded = self.reopen().storage.weights.load(first.__uuid__)
+        np.testing.assert_array_equal(loaded.values, data)
+
+        # only arrays without references are removed
+        self.storage.simplifier.array_grid.put(b'unused', _id='unused')
+        self.assertEqual(self.storage.remove_unused_arrays(grace=0), 1)
+        self.assertEqual(files.count_documents({}), 1)
+
+    def test_recently_used_arrays_are_kept(self):
+        simplifier = self.storage.simplifier
+        files = self.storage.db['arrays.files']
+        _id = simplifier.put_array(b'content', 'uint8', (7,))
+        simplifier.array_grid.put(b'old', _id='old')
+        files.update_many({}, {'$set': {
+            'uploadDate': datetime.datetime(2000, 1, 1)}})
+
+        # neither is referenced, but one is about to be used again
+        self.assertEqual(
+            simplifier.put_array(b'content', 'uint8', (7,)), _id)
+        self.assertEqual(self.storage.remove_unused_arrays(), 1)
+        self.assertEqual([x['_id'] for x in files.find()], [_id])
+
+    def test_model_arrays(self):
+        data = np.arange(90000, dtype=np.float64)
+        first = Model({'msm': {'P': data, 'lagtime': 2}})
+        self.storage.models.save(first)
+        self.storage.models.save(Model({'msm': {'P': data.copy()}}))
+
+        files = self.storage.db['arrays.files']
+        self.assertEqual(files.count_documents({}), 1)
+        for f in self.storage.db['fs.files'].find():
+            self.assertLess(f['length'], 1000)
+
+        loaded = self.reopen().storage.models.load(first.__uuid__)
+        np.testing.assert_array_equal(loaded.msm['P'], data)
+        self.assertEqual(loaded.msm['lagtime'], 2)
+
+        # arrays of model sections are still in use
+        self.assertEqual(self.storage.remove_unused_arrays(), 0)
+        self.assertEqual(files.count_documents({}), 1)
+
+    def test_small_model_arrays_are_binary(self):
+        data = np.arange(5, dtype=np.int32)
+        stored = Model({'msm': {'P': data}})
+        self.storage.models.save(stored)
+        self.assertEqual(self.storage.db['arrays.files'].count_documents({}), 0)
+
+        loaded = self.reopen().storage.models.load(stored.__uuid__)
+        np.testing.assert_array_equal(loaded.msm['P'], data)
+
+
+class TestExchange(MockDBTestCase):
+
+    def setUp(self):
+        super(TestExchange, self).setUp()
+        self.worker = Worker()
+        self.project.workers.add(self.worker)
+        self.document = self.project.storage.workers._document
+        self.query = {'_id': str(uuid.UUID(int=self.worker.__uuid__))}
+
+    def modified(self):
+        return self.document.find_one(self.query)['_modified']
+
+    def exchange(self, **values):
+        return exchange_sync_variables(
+            self.worker, values, ['state', 'command'])
+
+    def test_command_is_consumed_once(self):
+        self.document.update_one(
+            self.query, {'$set': {'command': 'halt', 'state': 'running'}})
+
+        result = self.exchange(command=None)
+        self.assertEqual(result, {'state': 'running', 'command': 'halt'})
+        self.assertEqual(self.worker.state, 'running')
+        self.assertIsNone(self.document.find_one(self.query)['command'])
+
+        self.assertEqual(
+            self.exchange(command=None),
+            {'state': 'running', 'command': None})
+
+    def test_modified_only_on_changes(self):
+        self.exchange(command=None, seen=time.time())
+        modified = self.modified()
+
+        # nothing changes
+        time.sleep(0.01)
+        self.exchange(command=None)
+        self.assertEqual(self.modified(), modified)
+
+        # a new heartbeat
+        time.sleep(0.01)
+        self.exchange(command=None, seen=time.time())
+        self.assertGreater(self.modified(), modified)
+        modified = self.modified()
+
+        # a consumed command
+        self.document.update_one(self.query, {'$set': {'command': 'halt'}})
+        time.sleep(0.01)
+        self.assertEqual(self.exchange(command=None)['command'], 'halt')
+        self.assertGreater(self.modified(), modified)
+
+
+class Recorded(object):
+    """
+    Collection that records the number of requests of bulk writes
+
+    """
+    def __init__(self, document):
+        self._wrapped = document
+        self.calls = []
+
+    def __getattr__(self, item):
+        return getattr(self._wrapped, item)
+
+    def bulk_write(self, requests, **kwargs):
+        self.calls.append(len(requests))
+        return self._wrapped.bulk_write(requests, **kwargs)
+
+
+class TestWriteBatch(MockDBTestCase):
+
+    def setUp(self):
+        super(TestWriteBatch, self).setUp()
+        self.tasks = [Task(), Task()]
+        self.project.queue(*self.tasks)
+        self.store = self.project.storage.tasks
+        self.store._document = Recorded(self.store._document)
+
+    def stored(self, task):
+        return self.store._document.find_one(
+            {'_id': str(uuid.UUID(int=task.__uuid__))})
+
+    def test_writes_are_merged(self):
+        first, second = self.tasks
+        worker = Worker()
+        self.project.workers.add(worker)
+        with self.project.storage.batch():
+            first.state = 'queued'
+            first.worker = worker
+            second.state = 'running'
+            first.state = 'running'
+
+            # pending writes are read locally
+            self.assertEqual(first.state, 'running')
+            self.assertEqual(self.stored(first)['state'], 'created')
+
+        self.assertEqual(self.store._document.calls, [2])
+        self.assertEqual(self.stored(first)['state'], 'running')
+        self.assertEqual(
+            self.stored(first)['worker'], Task.worker.encode(worker))
+        self.assertEqual(self.stored(second)['state'], 'running')
+
+    def test_flush_after_max_ops(self):
+        first, second = self.tasks
+        with self.project.storage.batch(max_ops=2):
+            first.state = 'queued'
+            second.state = 'queued'
+            self.assertEqual(self.stored(first)['state'], 'queued')
+
+            with self.project.storage.batch():
+                first.state = 'running'
+
+        self.assertEqual(self.store._document.calls, [2, 1])
+        self.assertEqual(self.stored(first)['state'], 'running')
@@ -0,0 +1,357 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import uuid
+
+from adaptivemd import Task, Worker
+from adaptivemd.worker import (
+    PollingBackoff, SlotWorkerScheduler, WorkerScheduler)
+
+from adaptivemd.tests.mockdb import MockDBTestCase
+
+
+class WorkerTestCase(MockDBTestCase):
+
+    def setUp(self):
+        super(WorkerTestCase, self).setUp()
+        self.worker = self.add_worker()
+
+    def add_worker(self):
+        worker = Worker()
+        self.project.workers.add(worker)
+        worker._project = self.project
+        return worker
+
+    def document(self, task):
+        return self.project.storage.tasks._document.find_one(
+            {'_id': str(uuid.UUID(int=task.__uuid__))})
+
+
+class TestClaim(WorkerTestCase):
+
+    def test_priority_order(self):
+        low = Task(priority=-1)
+        old = Task()
+        new = Task()
+        high = Task(priority=2)
+        old.__time__ -= 10
+        self.project.queue(new, low, old, high)
+
+        self.assertEqual(
+            [self.worker.claim_next() for _ in range(5)],
+            [high, old, new, low, None])
+
+    def test_claim_many_with_contention(self):
+        tasks = [Task() for _ in range(4)]
+        for n, task in enumerate(tasks):
+            task.__time__ -= 10 - n
+        self.project.queue(*tasks)
+
+        other = self.add_worker()
+        store = self.project.storage.tasks
+        store._document = Contended(
+            store._document, tasks[1], Task.worker.encode(other))
+
+        # the second task is claimed by another worker after it was found
+        self.assertEqual(self.worker.claim_many(3), [tasks[0], tasks[2]])
+        self.assertEqual(
+            self.document(tasks[1])['worker'], Task.worker.encode(other))
+        self.assertEqual(self.document(tasks[3])['state'], 'created')
+
+    def test_waiting_task_is_released(self):
+        dependency = Task()
+        dependent = Task()
+        dependent.dependencies = [dependency]
+        self.project.queue(dependency, dependent)
+
+        self.assertIs(self.worker.claim_next(), dependency)
+        self.assertIsNone(self.worker.claim_next())
+
+        # the dependency succeeded without releasing its dependents
+        dependency.state = 'success'
+        self.assertIsNone(self.worker.claim_next())
+
+        self.assertEqual(self.project.release_ready_tasks(), 1)
+        self.assertIs(self.worker.claim_next(), dependent)
+        self.assertEqual(self.project.release_ready_tasks(), 0)
+
+    def test_released_tasks_ring_the_bell(self):
+        dependency = Task()
+        dependent = Task()
+        dependent.dependencies = [dependency]
+        self.project.queue(dependency, dependent)
+
+        bell = self.project.storage.bell()
+        rings = bell._document.count_documents({})
+        modified = self.document(dependent).get('_modified')
+
+        time.sleep(0.01)
+        dependency.state = 'success'
+        dependency._release_dependents()
+        self.assertEqual(bell._document.count_documents({}), rings + 1)
+        self.assertNotEqual(
+            self.document(dependent).get('_modified'), modified)
+        self.assertIs(self.worker.claim_next(), dependent)
+
+    def test_give_back(self):
+        task = Task()
+        self.project.queue(task)
+        self.assertEqual(self.worker.claim_many(2), [task])
+
+        self.worker._give_back(task)
+        self.assertEqual(task.state, 'created')
+        self.assertIsNone(task.worker)
+        self.assertEqual(self.document(task)['ready'], False)
+
+        # given back tasks become claimable once found ready
+        self.assertEqual(self.worker.claim_many(2), [])
+        self.assertEqual(self.project.release_ready_tasks(), 1)
+        self.assertEqual(self.worker.claim_many(2), [task])
+
+    def test_give_back_keeps_other_claims(self):
+        task = Task()
+        self.project.queue(task)
+        self.assertIs(self.worker.claim_next(), task)
+
+        # released and claimed by another worker in the meantime
+        other = self.add_worker()
+        self.project.storage.tasks.modify_many(
+            {}, {'state': 'queued', 'worker': Task.worker.encode(other)})
+
+        self.worker._give_back(task)
+        stored = self.document(task)
+        self.assertEqual(stored['state'], 'queued')
+        self.assertEqual(
+            stored['worker'], Task.worker.encode(other))
+        self.assertNotEqual(stored.get('ready'), False)
+
+
+class TestDeadWorkers(WorkerTestCase):
+
+    def test_tasks_of_dead_workers_are_released(self):
+        live = self.add_worker()
+        tasks = [Task() for _ in range(4)]
+        self.project.queue(*tasks)
+        claimed = self.worker.claim_many(2) + live.claim_many(1)
+        self.assertEqual(len(claimed), 3)
+
+        dead_time = self.project._worker_dead_time
+        self.worker.seen = time.time() - 2 * dead_time
+        live.seen = time.time()
+
+        self.project._mark_dead_workers()
+
+        workers = self.project.storage.workers._document
+        self.assertEqual(
+            workers.find_one(
+                {'_id': str(uuid.UUID(int=self.worker.__uuid__))})['state'],
+            'dead')
+        self.assertNotEqual(
+            workers.find_one(
+                {'_id': str(uuid.UUID(int=live.__uuid__))})['state'],
+            'dead')
+
+        for task in claimed[:2]:
+            stored = self.document(task)
+            self.assertEqual(stored['state'], 'created')
+            self.assertIsNone(stored['worker'])
+
+        stored = self.document(claimed[2])
+        self.assertEqual(stored['state'], 'queued')
+        self.assertEqual(stored['worker'], Task.worker.encode(live))
+
+        # the released tasks can be claimed again
+        self.assertEqual(
+            set(live.claim_many(3)), set(tasks) - set(claimed[2:]))
+
+
+class Contended(object):
+    """
+    Collection that lets another worker claim a task before each update
+
+    """
+    def __init__(self, document, task, worker):
+        self._wrapped = document
+        self._task = task
+        self._worker = worker
+
+    def __getattr__(self, item):
+        return getattr(self._wrapped, item)
+
+    def update_many(self, *args, **kwargs):
+        self._wrapped.update_one(
+            {'_id': str(uuid.UUID(int=self._task.__uuid__))},
+            {'$set': {'state': 'queued', 'worker': self._worker}})
+        return self._wrapped.update_many(*args, **kwargs)
+
+
+class Configuration(object):
+    def __init__(self, shared_path):
+        self.resource = {'shared_path': shared_path}
+
+
+class TestRelease(WorkerTestCase):
+
+    def setUp(self):
+        super(TestRelease, self).setUp()
+        self.folder = tempfile.mkdtemp()
+        self.scheduler = WorkerScheduler(Configuration(self.folder))
+        self.scheduler.project = self.project
+        self.scheduler.worker = self.worker
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+        super(TestRelease, self).tearDown()
+
+    def prepared(self):
+        task = Task()
+        self.project.queue(task)
+        self.assertIs(self.worker.claim_next(), task)
+
+        # as left by `_prepare_job`
+        self.scheduler.tasks[task.__uuid__] = task
+        self.scheduler._prepared.add(task.__uuid__)
+        folder = os.path.join(
+            self.folder, 'workers', self.scheduler._unit_dir(task))
+        os.makedirs(folder)
+        return task, folder
+
+    def test_release_prepared_task(self):
+        task, folder = self.prepared()
+
+        self.scheduler.release_queued_tasks()
+        self.assertFalse(os.path.exists(folder))
+        self.assertEqual(self.scheduler._prepared, set())
+        self.assertEqual(self.scheduler.tasks, {})
+
+        stored = self.document(task)
+        self.assertEqual(stored['state'], 'created')
+        self.assertIsNone(stored['worker'])
+
+    def test_release_keeps_other_claims(self):
+        task, folder = self.prepared()
+
+        other = self.add_worker()
+        self.project.storage.tasks.modify_many(
+            {}, {'worker': Task.worker.encode(other)})
+
+        self.assertFalse(self.scheduler.release_task(task))
+        self.assertFalse(os.path.exists(folder))
+        self.assertEqual(
+            self.document(task)['worker'], Task.worker.encode(other))
+
+
+class TestStart(TestRelease):
+
+    def test_job_runs_in_task_folder(self):
+        task, folder = self.prepared()
+        with open(os.path.join(folder, 'running.sh'), 'w') as f:
+            f.write('pwd > where')
+
+        cwd = os.getcwd()
+        slot = self.scheduler.slots[0]
+        self.scheduler._start_job(task, slot)
+        self.assertIs(self.scheduler.current_task, task)
+        self.assertEqual(os.getcwd(), cwd)
+
+        slot.process.wait()
+        with open(os.path.join(folder, 'where')) as f:
+            self.assertEqual(
+                os.path.realpath(f.read().strip()), os.path.realpath(folder))
+
+        self.scheduler.stop_task(task)
+        self.assertTrue(slot.is_free)
+        self.assertIsNone(self.scheduler.current_task)
+        self.assertEqual(os.getcwd(), cwd)
+
+
+class TestSlots(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = SlotWorkerScheduler(
+            Configuration(tempfile.gettempdir()),
+            slots=3, cpus=4, gpus=['0', '1'])
+
+    def test_allocate_and_release(self):
+        first, second, third = self.scheduler.slots
+
+        self.assertTrue(self.scheduler._allocate(
+            first, Task(cpu_threads=2, gpu_contexts=1)))
+        self.assertEqual(first.cpus, 2)
+        self.assertEqual(first.gpus, ['0'])
+
+        # not enough cores left
+        self.assertFalse(
+            self.scheduler._allocate(second, Task(cpu_threads=3)))
+        self.assertEqual(second.cpus, 0)
+
+        self.assertTrue(
+            self.scheduler._allocate(second, Task(gpu_contexts=1)))
+        self.assertEqual(second.gpus, ['1'])
+
+        # no devices left
+        self.assertFalse(
+            self.scheduler._allocate(third, Task(gpu_contexts=1)))
+
+        self.scheduler._release(first)
+        self.assertEqual((first.cpus, first.gpus), (0, []))
+        self.assertEqual(self.scheduler._free_cpus, 3)
+        self.assertEqual(self.scheduler._free_gpus, ['0'])
+
+        self.assertTrue(self.scheduler._allocate(
+            third, Task(cpu_threads=3, gpu_contexts=1)))
+        self.assertEqual(third.gpus, ['0'])
+        self.assertEqual(self.scheduler._free_cpus, 0)
+
+    def test_large_task_gets_the_node(self):
+        slot = self.scheduler.slots[0]
+        self.assertTrue(self.scheduler._allocate(
+            slot, Task(cpu_threads=16, gpu_contexts=4)))
+        self.assertEqual(slot.cpus, 4)
+        self.assertEqual(slot.gpus, ['0', '1'])
+
+    def test_task_environment(self):
+        first, second = self.scheduler.slots[:2]
+        self.scheduler._allocate(first, Task(cpu_threads=2, gpu_contexts=1))
+        self.scheduler._allocate(second, Task(cpu_threads=1, gpu_contexts=1))
+
+        env = self.scheduler._task_environment(Task(), second)
+        self.assertEqual(env['OMP_NUM_THREADS'], '1')
+        self.assertEqual(env['CUDA_VISIBLE_DEVICES'], '1')
+        self.assertEqual(env['WORKERDEVICE'], '0')
+
+    def test_claimable(self):
+        self.scheduler.state = 'running'
+        self.assertEqual(self.scheduler.n_claimable(2), 4)
+
+        self.scheduler.tasks[1] = Task()
+        self.assertEqual(self.scheduler.n_claimable(2), 3)
+
+        self.scheduler.state = 'down'
+        self.assertEqual(self.scheduler.n_claimable(2), 0)
+
+
+class TestPollingBackoff(unittest.TestCase):
+
+    def test_interval(self):
+        backoff = PollingBackoff(0.5, 3.0)
+        backoff.increase()
+        self.assertEqual(backoff.interval, 1.0)
+        backoff.increase()
+        backoff.increase()
+        self.assertEqual(backoff.interval, 3.0)
+
+        backoff.reset()
+        self.assertEqual(backoff.interval, 0.5)
+
+    def test_delay_jitter(self):
+        backoff = PollingBackoff(1.0, 8.0, jitter=0.25)
+        delays = [backoff.delay for _ in range(100)]
+        self.assertGreaterEqual(min(delays), 0.75)
+        self.assertLessEqual(max(delays), 1.25)
+        self.assertGreater(len(set(delays)), 1)
+
+        backoff.jitter = 0.0
+        self.assertEqual(backoff.delay, 1.0)
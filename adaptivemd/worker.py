@@ -51,16 +51,21 @@ import sys
 import random
 import signal
 import ctypes
+import contextlib
+import multiprocessing
 import re
 import shutil
-from fcntl import fcntl, F_GETFL, F_SETFL
+import uuid
+import threading
 
 from .mongodb import (StorableMixin, SyncVariable, create_to_dict,
-                      ObjectSyncVariable)
+                      ObjectSyncVariable, refresh_sync_variables,
+                      exchange_sync_variables)
 
 from .scheduler import Scheduler
 from .reducer import StrFilterParser, WorkerParser, BashParser, PrefixParser
 from .logentry import LogEntry
+from .task import Task
 from .util import DT, get_logger
 from .file import Transfer
 
@@ -76,6 +81,169 @@ except OSError:
     libc = None
 
 
+
+class OutputPump(threading.Thread):
+    """
+    Background thread that copies the output of a process to rotating files
+
+    The pipe is read as soon as data is available, so a process producing a
+    lot of output never blocks on a full pipe. Only the end of the output
+    is kept in memory.
+
+    Attributes
+    ----------
+    filename : str or None
+        the file the output is written to. Once it exceeds `max_bytes` it
+        is renamed to `filename.1` and older files to `filename.2`, etc.
+        None after the files have been removed
+    max_bytes : int
+        the size of a file before it is rotated
+    backup_count : int
+        the number of rotated files that are kept
+    tail_bytes : int
+        the number of bytes kept from the end of the output
+    n_bytes : int
+        the total number of bytes read
+
+    """
+    def __init__(self, pipe, filename, max_bytes=64 * 1024 ** 2,
+                 backup_count=3, tail_bytes=64 * 1024, echo=None):
+        super(OutputPump, self).__init__()
+        self.daemon = True
+        self.pipe = pipe
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.tail_bytes = tail_bytes
+        self.echo = echo
+        self.n_bytes = 0
+        self._tail = bytearray()
+        self._file = None
+        self._size = 0
+
+    @property
+    def truncated(self):
+        """
+        Returns
+        -------
+        bool
+            True if `tail` does not contain the full output
+
+        """
+        return self.n_bytes > len(self._tail)
+
+    @property
+    def tail(self):
+        """
+        Returns
+        -------
+        str
+            the end of the output. If truncated, it starts with a note on the
+            number of skipped bytes and the file with the full output
+
+        """
+        text = bytes(self._tail).decode('utf8', 'replace')
+        if self.truncated and self.filename is not None:
+            text = '[... %d bytes skipped, see %s]\n%s' % (
+                self.n_bytes - len(self._tail), self.filename, text)
+        elif self.truncated:
+            text = '[... %d bytes skipped]\n%s' % (
+                self.n_bytes - len(self._tail), text)
+
+        return text
+
+    def remove(self):
+        """
+        Delete the file and all rotated files once the pipe is closed
+
+        """
+        if self.filename is None:
+            return
+
+        for i in range(self.backup_count + 1):
+            name = self.filename if i == 0 else '%s.%d' % (self.filename, i)
+            if os.path.exists(name):
+                os.remove(name)
+
+        self.filename = None
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            src = '%s.%d' % (self.filename, i)
+            if os.path.exists(src):
+                os.rename(src, '%s.%d' % (self.filename, i + 1))
+
+        if self.backup_count > 0:
+            os.rename(self.filename, self.filename + '.1')
+
+        self._file = open(self.filename, 'wb')
+        self._size = 0
+
+    def _write(self, data):
+        if self._size > 0 and self._size + len(data) > self.max_bytes:
+            self._rotate()
+
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+
+    def run(self):
+        fd = self.pipe.fileno()
+        self._file = open(self.filename, 'wb')
+        try:
+            while True:
+                data = os.read(fd, 65536)
+                if not data:
+                    break
+
+                self.n_bytes += len(data)
+                self._write(data)
+
+                self._tail.extend(data)
+                if len(self._tail) > self.tail_bytes:
+                    del self._tail[:len(self._tail) - self.tail_bytes]
+
+                if self.echo is not None:
+                    self.echo.write(data.decode('utf8', 'replace')
+                                    if six.PY3 else data)
+                    self.echo.flush()
+
+        except (OSError, IOError, ValueError) as e:
+            logger.warning('Stopped reading output: %s' % e)
+
+        finally:
+            self._file.close()
+
+
+class Slot(object):
+    """
+    An execution slot of a worker scheduler
+
+    A slot runs one task at a time with the cpu cores and GPU devices that
+    were allocated for it and keeps the process and the output of the task.
+
+    """
+    def __init__(self, index):
+        self.index = index
+        self.cpus = 0
+        self.gpus = []
+
+        # the execution state while the task runs
+        self.task = None
+        self.process = None
+        self.std = {}
+
+    @property
+    def is_free(self):
+        return self.task is None
+
+    def clear(self):
+        self.task = None
+        self.process = None
+        self.std = {}
+
+
 class WorkerScheduler(Scheduler):
     def __init__(self, configuration, verbose=False):
         """
@@ -89,9 +257,7 @@ class WorkerScheduler(Scheduler):
             if True the worker will report lots of stuff
         """
         super(WorkerScheduler, self).__init__(configuration)
-        self._current_sub = None
-        self._current_unit_dir = None
-        self.current_task = None
+        self.slots = [Slot(0)]
         self.home_path = os.path.expanduser('~')
         self._done_tasks = set()
         self._save_log_to_db = True
@@ -99,7 +265,19 @@ class WorkerScheduler(Scheduler):
         self._fail_after_each_command = True
         self._cleanup_successful = True
 
-        self._std = {}
+        # ids of tasks with folder and script, ready to be started
+        self._prepared = set()
+
+        # the `Worker` that claims the tasks, set by `Worker.create`
+        self.worker = None
+
+        # seconds to wait for the output of a finished task
+        self.std_join_timeout = 10.0
+
+        # size and number of the output files kept for each task and stream.
+        # Files of successful tasks are removed with their folder
+        self.std_max_bytes = 64 * 1024 ** 2
+        self.std_backup_count = 3
 
     @property
     def path(self):
@@ -161,6 +339,21 @@ class WorkerScheduler(Scheduler):
 
         return tasks
 
+    @property
+    def current_task(self):
+        """
+        Returns
+        -------
+        `Task` or None
+            the first running task or None if no task is executed
+
+        """
+        running = self.running_tasks
+        if running:
+            return running[0]
+
+        return None
+
     @property
     def current_task_dir(self):
         """
@@ -171,24 +364,52 @@ class WorkerScheduler(Scheduler):
             the path or None if no task is executed at the time
 
         """
-        if self._current_unit_dir is not None:
-            return self.path + '/workers/' + self._current_unit_dir
+        task = self.current_task
+        if task is not None:
+            return self._task_dir(task)
         else:
             return None
 
-    def _start_job(self, task):
+    @staticmethod
+    def _unit_dir(task):
+        return 'worker.%s' % hex(task.__uuid__)
+
+    def _task_dir(self, task):
+        return self.path + '/workers/' + self._unit_dir(task)
+
+    @contextlib.contextmanager
+    def _task_folder(self, task):
         """
-        Start execution of a task
+        Resolve relative paths in the folder of a task
+
+        Task callbacks and the `WorkerParser` use paths relative to the task
+        folder. The previous directory is restored afterwards, so the worker
+        never stays in the folder of a task.
 
         Parameters
         ----------
         task : `Task`
-            the task to be executed
+            the task whose folder is used
 
         """
-        self._current_unit_dir = 'worker.%s' % hex(task.__uuid__)
+        cwd = os.getcwd()
+        os.chdir(self._task_dir(task))
+        try:
+            yield
+        finally:
+            os.chdir(cwd)
+
+    def _prepare_job(self, task):
+        """
+        Create the folder, input files and script of a task
+
+        Parameters
+        ----------
+        task : `Task`
+            the task to be prepared. It will be in state `submit` afterwards
 
-        script_location = self.current_task_dir
+        """
+        script_location = self._task_dir(task)
 
         if os.path.exists(script_location):
             logger.info('removing existing folder {}'.format(script_location))
@@ -199,20 +420,66 @@ class WorkerScheduler(Scheduler):
         # create a fresh folder
         os.makedirs(script_location)
 
-        # and set the current directory
-        os.chdir(script_location)
+        with self._task_folder(task):
+            task.fire('submit', self)
 
-        task.fire('submit', self)
-
-        script = self.task_to_script(task >> self.wrapper >> self.configuration.wrapper)
+            script = self.task_to_script(
+                task >> self.wrapper >> self.configuration.wrapper)
 
         # write the script
 
         with open(script_location + '/running.sh', 'w') as f:
             f.write('\n'.join(script))
 
+        self._prepared.add(task.__uuid__)
+
+    def _prepare_next(self):
+        """
+        Prepare the next waiting task while others are running
+
+        Returns
+        -------
+        bool
+            True if a task was prepared
+
+        """
+        running = set(t.__uuid__ for t in self.running_tasks)
+        for task in list(self.tasks.values()):
+            if task.__uuid__ in running or task.__uuid__ in self._prepared:
+                continue
+
+            logger.info('preparing next task')
+            self._prepare_job(task)
+            return True
+
+        return False
+
+    def _start_job(self, task, slot):
+        """
+        Start execution of a task in a slot
+
+        The task is prepared first unless this happened already while the
+        previous task was running. The process runs in the task folder.
+
+        Parameters
+        ----------
+        task : `Task`
+            the task to be executed
+        slot : `Slot`
+            the free slot that runs the task
+
+        """
+        script_location = self._task_dir(task)
+
+        if task.__uuid__ not in self._prepared:
+            self._prepare_job(task)
+
+        self._prepared.discard(task.__uuid__)
+
+        slot.task = task
         task.state = 'running'
-        task.fire(task.state, self)
+        with self._task_folder(task):
+            task.fire(task.state, self)
 
         if libc is not None:
             def set_pdeathsig(sig=signal.SIGTERM):
@@ -225,107 +492,196 @@ class WorkerScheduler(Scheduler):
         else:
             preexec_fn = None
 
-        self._current_sub = subprocess.Popen(
+        slot.process = subprocess.Popen(
             ['/bin/bash', script_location + '/running.sh'],
             stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-            preexec_fn=preexec_fn, shell=False)
+            preexec_fn=preexec_fn, shell=False, cwd=script_location,
+            env=self._task_environment(task, slot))
+
+        # start pumping stdout and stderr to files
+        self._start_std(slot)
+
+    def _task_environment(self, task, slot):
+        """
+        Return the environment variables of the process running a task
 
-        # this is a special hack that allows to read from stdout and stderr
-        # without a blocking `.read`, let's hope this works
-        flags = fcntl(self._current_sub.stdout, F_GETFL)  # get current p.stdout flags
-        fcntl(self._current_sub.stdout, F_SETFL, flags | os.O_NONBLOCK)
+        Parameters
+        ----------
+        task : `Task`
+            the task to be started
+        slot : `Slot`
+            the slot that runs the task
 
-        flags = fcntl(self._current_sub.stderr, F_GETFL)  # get current p.stderr flags
-        fcntl(self._current_sub.stderr, F_SETFL, flags | os.O_NONBLOCK)
+        Returns
+        -------
+        dict or None
+            the environment or None to inherit the one of the worker
 
-        # prepare std catching
-        self._start_std()
+        """
+        return None
+
+    @property
+    def running_tasks(self):
+        """
+        Returns
+        -------
+        list of `Task`
+            the tasks that are executed at the moment
+
+        """
+        return [slot.task for slot in self.slots if not slot.is_free]
+
+    def n_claimable(self, prefetch):
+        """
+        Return the number of tasks that should be claimed now
+
+        Parameters
+        ----------
+        prefetch : int
+            the number of tasks to claim once the scheduler is idle
+
+        Returns
+        -------
+        int
+            the number of tasks the scheduler accepts
+
+        """
+        if self.state != 'running':
+            return 0
+
+        # tasks beyond the running one are prepared in the meantime
+        return max(0, prefetch - len(self.tasks))
+
+    def stop_task(self, task):
+        """
+        Stop execution of a running task immediately
+
+        Parameters
+        ----------
+        task : `Task`
+            the task to be stopped
+
+        Returns
+        -------
+        bool
+            if True the task was cancelled, False if it was not running
+
+        """
+        for slot in self.slots:
+            if slot.task is task:
+                return self._stop_slot(slot)
+
+        return False
+
+    def _stop_slot(self, slot):
+        """
+        Kill the process of a slot and free the slot
+
+        Parameters
+        ----------
+        slot : `Slot`
+            the slot running the task to be stopped
+
+        Returns
+        -------
+        bool
+            if True the task was cancelled, False if it had no process
+
+        """
+        if slot.process is None:
+            return False
+
+        task = slot.task
+        slot.process.kill()
+        del self.tasks[task.__uuid__]
+        self._final_std(slot)
+        slot.clear()
+
+        return True
 
     def stop_current(self):
         """
-        Stop execution of the current task immediately
+        Stop execution of the running tasks immediately
 
         Returns
         -------
         bool
-            if True the current task was cancelled, False if there
+            if True at least one task was cancelled, False if there
             was no task running
 
         """
-        if self._current_sub is not None:
-            task = self.current_task
-            self._current_sub.kill()
-            del self.tasks[task.__uuid__]
-            self._final_std()
-            self.current_task = None
+        stopped = False
+        for task in self.running_tasks:
+            stopped = self.stop_task(task) or stopped
 
-            return True
-        else:
-            return False
+        return stopped
 
-    def _start_std(self):
-        self._std = {
-            'stdout': '',
-            'stderr': ''
-        }
+    @property
+    def log_path(self):
+        """
+        Return the folder with the stdout and stderr files of tasks
 
-    def _advance_std(self):
         """
-        Advance the stdout and stderr for some bytes, save it and redirect
+        return self.path + '/workers/logs'
+
+    def _start_std(self, slot):
         """
-        for s in ['stdout', 'stderr']:
-            try:
-                new_std = os.read(getattr(self._current_sub, s).fileno(), 1024)
-                if six.PY3:
-                    new_std = new_std.decode('utf8')
-                self._std[s] += new_std
-                if self.verbose:
-                    # send to stdout, stderr
-                    std = getattr(sys, s)
-                    std.write(new_std)
-                    std.flush()
+        Start threads that write stdout and stderr of the task to files
 
-            except OSError:
-                pass
+        Parameters
+        ----------
+        slot : `Slot`
+            the slot with the started process
 
-    def _final_std(self):
+        """
+        slot.std = {}
+        for s in ['stdout', 'stderr']:
+            slot.std[s] = OutputPump(
+                getattr(slot.process, s),
+                '%s/%s.%s' % (self.log_path, self._unit_dir(slot.task), s),
+                max_bytes=self.std_max_bytes,
+                backup_count=self.std_backup_count,
+                echo=getattr(sys, s) if self.verbose else None)
+            slot.std[s].start()
+
+    def _final_std(self, slot, keep_files=True):
         """
         Finish capturing of stdout and stderr
 
+        The end of both outputs is saved as `LogEntry` objects that
+        reference the files with the full output.
+
+        Parameters
+        ----------
+        slot : `Slot`
+            the slot with the finished or killed process
+        keep_files : bool
+            if False the files are removed and the entries only keep the end
+            of the output
+
         """
-        task = self.current_task
-        try:
-            out, err = self._current_sub.communicate()
-            if six.PY3:
-                out = out.decode('utf8')
-                err = err.decode('utf8')
-            if self.verbose:
-                sys.stderr.write(err)
-                sys.stdout.write(out)
-
-            # save full message
-            stdout = self._std['stdout'] + out
-            stderr = self._std['stderr'] + err
-
-            if self._save_log_to_db:
-                log_err = LogEntry(
-                    'worker',
-                    'stderr from running task',
-                    stderr
-                )
-                log_out = LogEntry(
+        task = slot.task
+        slot.process.wait()
+
+        for pump in slot.std.values():
+            pump.join(self.std_join_timeout)
+            if not keep_files:
+                pump.remove()
+
+        if self._save_log_to_db:
+            logs = {
+                s: LogEntry(
                     'worker',
-                    'stdout from running task',
-                    stdout
-                )
-                self.project.logs.add(log_err)
-                self.project.logs.add(log_out)
+                    '%s from running task' % s,
+                    slot.std[s].tail,
+                    location=slot.std[s].filename
+                ) for s in ['stdout', 'stderr']}
 
-                task.stdout = log_out
-                task.stderr = log_err
+            self.project.logs.add(logs['stderr'])
+            self.project.logs.add(logs['stdout'])
 
-        except ValueError:
-            pass
+            task.stdout = logs['stdout']
+            task.stderr = logs['stderr']
 
     def advance(self):
         """
@@ -335,78 +691,105 @@ class WorkerScheduler(Scheduler):
         worker instance
 
         """
-        if self.current_task is None:
+        slot = self.slots[0]
+        if slot.is_free:
             if len(self.tasks) > 0:
-                t = next(iter(self.tasks.values()))
-                self.current_task = t
-                self._start_job(t)
+                self._start_next()
+        elif self._advance_slot(slot):
+            if len(self.tasks) > 0:
+                # start the next (prepared) task without waiting
+                self._start_next()
         else:
-            task = self.current_task
-            # get current outputs
-            return_code = self._current_sub.poll()
-
-            # update current stdout and stderr by 1024 bytes
-
-            self._advance_std()
-
-            if return_code is not None:
-                # finish std catching
-                self._final_std()
-
-                if return_code == 0:
-                    # success
-
-                    all_files_present = True
-                    # see first if we have all claimed files for worker output staging transfer
-                    for f in task.targets:
-                        if isinstance(f, Transfer):
-                            if not os.path.exists(self.replace_prefix(f.source.url)):
-                                log = LogEntry(
-                                    'worker',
-                                    'execution error',
-                                    'failed to create file before staging %s' % f.source.short,
-                                    objs={'file': f, 'task': task}
-                                )
-                                self.project.logs.add(log)
-                                all_files_present = False
-
-                    if all_files_present:
-                        try:
-                            task.fire('success', self)
-                            task.state = 'success'
-                            logger.info('task succeeded')
-                            if self._cleanup_successful:
-                                logger.info('removing worker dir')
-                                # go to an existing folder before we delete
-                                os.chdir(self.path)
-                                script_location = self.current_task_dir
-                                if script_location is not None:
-                                    shutil.rmtree(script_location)
-                        except IOError:
-
-                            task.state = 'fail'
-                    else:
-                        task.state = 'fail'
-                else:
-                    # failed
-                    log = LogEntry(
-                        'worker',
-                        'task failed',
-                        'see log files',
-                        objs={'task': task}
-                    )
-                    self.project.logs.add(log)
-                    task.state = 'failed'
-                    try:
-                        task.fire('fail', self)
-                    except IOError:
-                        pass
+            self._prepare_next()
+
+    def _advance_slot(self, slot):
+        """
+        Check if the task of a slot is completed or failed
+
+        Parameters
+        ----------
+        slot : `Slot`
+            the slot with the running task
+
+        Returns
+        -------
+        bool
+            True if the task has finished and the slot is free again
+
+        """
+        task = slot.task
+        # get current outputs
+        return_code = slot.process.poll()
+
+        if return_code is None:
+            return False
+
+        # finish std catching. The output files of successful tasks
+        # are removed like their folder
+        self._final_std(
+            slot,
+            keep_files=return_code != 0 or not self._cleanup_successful)
+
+        if return_code == 0:
+            # success
+
+            all_files_present = True
+            # see first if we have all claimed files for worker output staging transfer
+            with self._task_folder(task):
+                for f in task.targets:
+                    if isinstance(f, Transfer):
+                        if not os.path.exists(self.replace_prefix(f.source.url)):
+                            log = LogEntry(
+                                'worker',
+                                'execution error',
+                                'failed to create file before staging %s' % f.source.short,
+                                objs={'file': f, 'task': task}
+                            )
+                            self.project.logs.add(log)
+                            all_files_present = False
+
+            if all_files_present:
+                try:
+                    with self._task_folder(task):
+                        task.fire('success', self)
+
+                    task.state = 'success'
+                    logger.info('task succeeded')
+                    if self._cleanup_successful:
+                        logger.info('removing worker dir')
+                        shutil.rmtree(self._task_dir(task))
+                except IOError:
 
                     task.state = 'fail'
+            else:
+                task.state = 'fail'
+        else:
+            # failed
+            log = LogEntry(
+                'worker',
+                'task failed',
+                'see log files',
+                objs={'task': task}
+            )
+            self.project.logs.add(log)
+            task.state = 'failed'
+            try:
+                with self._task_folder(task):
+                    task.fire('fail', self)
+            except IOError:
+                pass
+
+            task.state = 'fail'
+
+        del self.tasks[task.__uuid__]
+        self._done_tasks.add(task.__uuid__)
+        slot.clear()
+
+        return True
 
-                del self.tasks[task.__uuid__]
-                self._done_tasks.add(task.__uuid__)
-                self._initialize_current()
+    def _start_next(self):
+        t = next(iter(self.tasks.values()))
+        self._start_job(t, self.slots[0])
 
     def release_queued_tasks(self):
         """
@@ -416,16 +799,49 @@ class WorkerScheduler(Scheduler):
         and this releases not started jobs back to the queue
 
         """
+        running = set(t.__uuid__ for t in self.running_tasks)
+        released = 0
         for t in list(self.tasks.values()):
-            if t.state == 'queued':
-                t.state = 'created'
-                t.worker = None
-                del self.tasks[t.__uuid__]
+            if t.__uuid__ not in running and self.release_task(t):
+                released += 1
 
-    def _initialize_current(self):
-        self._current_sub = None
-        self._current_unit_dir = None
-        self.current_task = None
+        if released:
+            # wake up idle workers
+            self.project.storage.bell().ring(n_tasks=released)
+
+    def release_task(self, task):
+        """
+        Remove a task that has not been started and give it back to the queue
+
+        The folder of a prepared task is removed. The task is only given back
+        if it is still queued for this worker, a single update changes its
+        state and worker.
+
+        Parameters
+        ----------
+        task : `Task`
+            the task to be released
+
+        Returns
+        -------
+        bool
+            True if the task was given back to the queue
+
+        """
+        self.tasks.pop(task.__uuid__, None)
+
+        if task.__uuid__ in self._prepared:
+            self._prepared.discard(task.__uuid__)
+            folder = self._task_dir(task)
+            if os.path.exists(folder):
+                shutil.rmtree(folder)
+
+        query = {'state': {'$in': ['queued', 'submit']}}
+        if self.worker is not None:
+            query['worker'] = Task.worker.encode(self.worker)
+
+        return self.project.storage.tasks.modify_if(
+            task, query, {'state': 'created', 'worker': None})
 
     def enter(self, project=None):
         self.change_state('booting')
@@ -457,7 +873,8 @@ class WorkerScheduler(Scheduler):
 
         paths = [
             self.path + '/workers',
-            self.path + '/workers/staging_area'
+            self.path + '/workers/staging_area',
+            self.log_path
             # self.path + '/workers/staging_area/trajs'
         ]
 
@@ -516,18 +933,189 @@ class WorkerScheduler(Scheduler):
                 self.advance()
                 time.sleep(2.0)
 
-        # kill the current job
+        # kill the current jobs
         self.change_state('shuttingdown')
-        if self.current_task:
+        for task in self.running_tasks:
             if True:
-                self.current_task.state = 'created'
+                task.state = 'created'
             else:
-                self.current_task.state = 'cancelled'
-            self.stop_current()
+                task.state = 'cancelled'
+            self.stop_task(task)
 
         self.change_state('down')
 
 
+class SlotWorkerScheduler(WorkerScheduler):
+    def __init__(self, configuration, verbose=False, slots=1, cpus=None,
+                 gpus=None):
+        """
+        A worker scheduler that runs several tasks concurrently
+
+        Tasks are packed onto the cpu cores and GPU devices of the node
+        using their `resource_requirements`. A task is started once a slot
+        and enough free cores and devices are available. Smaller tasks can
+        start before larger tasks that are waiting for resources.
+
+        Parameters
+        ----------
+        configuration : `Configuration`
+            the (resource) configuration this scheduler should use.
+        verbose : bool
+            if True the worker will report lots of stuff
+        slots : int
+            the maximal number of tasks that run at the same time
+        cpus : int or None
+            the number of cpu cores to be used. If None all cores available
+            to the worker process
+        gpus : list of str or None
+            the GPU devices to be used. If None the devices listed in
+            `CUDA_VISIBLE_DEVICES` are used, if not set no GPUs
+
+        """
+        super(SlotWorkerScheduler, self).__init__(configuration, verbose)
+
+        if cpus is None:
+            if hasattr(os, 'sched_getaffinity'):
+                cpus = len(os.sched_getaffinity(0))
+            else:
+                cpus = multiprocessing.cpu_count()
+
+        if gpus is None:
+            gpus = [
+                x for x in os.environ.get('CUDA_VISIBLE_DEVICES', '').split(',')
+                if x]
+
+        self.slots = [Slot(index) for index in range(slots)]
+        self.cpus = cpus
+        self.gpus = [str(x) for x in gpus]
+        self._free_cpus = cpus
+        self._free_gpus = list(self.gpus)
+
+    def _requirements(self, task):
+        req = getattr(task, 'resource_requirements', None) or {}
+
+        # a task larger than the node gets the whole node
+        cpus = min(max(1, req.get('cpu_threads', 1)), self.cpus)
+        gpus = min(req.get('gpu_contexts', 0), len(self.gpus))
+
+        return cpus, gpus
+
+    def _allocate(self, slot, task):
+        cpus, gpus = self._requirements(task)
+        if cpus > self._free_cpus or gpus > len(self._free_gpus):
+            return False
+
+        self._free_cpus -= cpus
+        slot.cpus = cpus
+        slot.gpus = self._free_gpus[:gpus]
+        self._free_gpus = self._free_gpus[gpus:]
+
+        return True
+
+    def _release(self, slot):
+        self._free_cpus += slot.cpus
+        self._free_gpus.extend(slot.gpus)
+        slot.cpus = 0
+        slot.gpus = []
+
+    def _task_environment(self, task, slot):
+        env = dict(os.environ)
+        env['OMP_NUM_THREADS'] = str(slot.cpus)
+        if slot.gpus:
+            env['CUDA_VISIBLE_DEVICES'] = ','.join(slot.gpus)
+            # the device indices within the visible devices
+            env['WORKERDEVICE'] = ','.join(
+                str(i) for i in range(len(slot.gpus)))
+
+        return env
+
+    def n_claimable(self, prefetch):
+        if self.state != 'running':
+            return 0
+
+        # keep all slots busy and `prefetch - 1` tasks waiting
+        return max(0, len(self.slots) + prefetch - 1 - len(self.tasks))
+
+    def advance(self):
+        """
+        Advance all running tasks and start waiting tasks in free slots
+
+        """
+        for slot in self.slots:
+            if not slot.is_free and self._advance_slot(slot):
+                self._release(slot)
+
+        running = set(t.__uuid__ for t in self.running_tasks)
+        for task in list(self.tasks.values()):
+            if task.__uuid__ in running:
+                continue
+
+            free = [slot for slot in self.slots if slot.is_free]
+            if not free:
+                break
+
+            slot = free[0]
+            if self._allocate(slot, task):
+                self._start_job(task, slot)
+
+                logger.info(
+                    'started task in slot %d using %d cpus and gpus [%s]' % (
+                        slot.index, slot.cpus, ','.join(slot.gpus)))
+
+        self._prepare_next()
+
+    def _stop_slot(self, slot):
+        stopped = super(SlotWorkerScheduler, self)._stop_slot(slot)
+        self._release(slot)
+        return stopped
+
+
+class PollingBackoff(object):
+    """
+    Exponential backoff with jitter for polling the DB
+
+    The interval doubles each time nothing happened up to `maximum` and
+    goes back to `minimum` once there is work. Each delay is randomized by
+    `jitter` so many workers do not poll at the same time.
+
+    Attributes
+    ----------
+    minimum : float
+        the interval in seconds while busy
+    maximum : float
+        the largest interval in seconds
+    factor : float
+        the increase of the interval for each idle poll
+    jitter : float
+        the relative random variation of each delay
+
+    """
+    def __init__(self, minimum, maximum, factor=2.0, jitter=0.25):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.interval = minimum
+
+    def reset(self):
+        self.interval = self.minimum
+
+    def increase(self):
+        self.interval = min(self.maximum, self.interval * self.factor)
+
+    @property
+    def delay(self):
+        """
+        Returns
+        -------
+        float
+            the current interval with random jitter in seconds
+
+        """
+        return self.interval * random.uniform(
+            1.0 - self.jitter, 1.0 + self.jitter)
+
+
 class Worker(StorableMixin):
     """
     A Worker instance the will submit tasks from the DB to a scheduler
@@ -544,7 +1132,8 @@ class Worker(StorableMixin):
     current = ObjectSyncVariable('current', 'tasks')
 
     def __init__(self, walltime=None, generators=None, sleep=None,
-                 heartbeat=None, prefetch=1, verbose=False):
+                 heartbeat=None, prefetch=1, verbose=False, slots=1,
+                 gpus=None, max_sleep=30):
         super(Worker, self).__init__()
         self.hostname = socket.gethostname()
         self.cwd = os.getcwd()
@@ -562,10 +1151,13 @@ class Worker(StorableMixin):
         self.current = None
         self._last_current = None
         self.pid = os.getpid()
+        self.slots = slots
+        self.gpus = gpus
+        self.max_sleep = max_sleep
 
     to_dict = create_to_dict([
         'walltime', 'generators', 'sleep', 'heartbeat', 'hostname',
-        'cwd', 'seen', 'prefetch', 'pid'
+        'cwd', 'seen', 'prefetch', 'pid', 'slots', 'gpus', 'max_sleep'
     ])
 
     @classmethod
@@ -582,8 +1174,17 @@ class Worker(StorableMixin):
         if not project._current_configuration:
             project.set_current_configuration('rhea')
 
-        scheduler = WorkerScheduler(project._current_configuration, self.verbose)
+        if self.slots > 1 or self.gpus:
+            # run several tasks at once on the cores and GPUs of the node
+            scheduler = SlotWorkerScheduler(
+                project._current_configuration, self.verbose,
+                slots=self.slots, gpus=self.gpus)
+        else:
+            scheduler = WorkerScheduler(
+                project._current_configuration, self.verbose)
+
         scheduler._state_cb = self._state_cb
+        scheduler.worker = self
         self._scheduler = scheduler
         self._project = project
         scheduler.enter(project)
@@ -617,13 +1218,13 @@ class Worker(StorableMixin):
 
     def _stop_current(self, mode):
         sc = self.scheduler
-        task = sc.current_task
 
-        if task:
-            attempt = self.project.storage.tasks.modify_test_one(
-                lambda x: x == task, 'state', 'running', 'stopping')
+        for task in sc.running_tasks:
+            attempt = self.project.storage.tasks.claim_one(
+                {'_id': str(uuid.UUID(int=task.__uuid__)), 'state': 'running'},
+                {'state': 'stopping'})
             if attempt is not None:
-                if sc.stop_current():
+                if sc.stop_task(task):
                     # success, so mark the task as cancelled
                     task.state = mode
                     task.worker = None
@@ -638,6 +1239,85 @@ class Worker(StorableMixin):
                 # semms in the meantime the task has finished (success/fail)
                 pass
 
+    def _claim_query(self):
+        query = {'state': 'created', 'ready': {'$ne': False}}
+        if self.generators:
+            query['generator_name'] = {'$in': list(self.generators)}
+
+        return query
+
+    def _give_back(self, task):
+        # stored without the claim fields, a dependency has been restarted or
+        # it waits for something else, so give it back with a single update
+        # unless another worker owns it already. The task is only claimed
+        # again once `Project.release_ready_tasks`, run by the trigger of the
+        # project, finds it ready
+        self.project.storage.tasks.modify_if(
+            task,
+            {'state': 'queued', 'worker': Task.worker.encode(self)},
+            {'state': 'created', 'worker': None, 'ready': False})
+
+    def claim_next(self):
+        """
+        Atomically claim the next ready task in the DB for this worker
+
+        Tasks are matched on their stored `ready` and `generator_name` fields
+        and claimed by priority and age in a single DB operation.
+
+        Returns
+        -------
+        `Task` or None
+            the claimed task, now `queued` and assigned to this worker
+
+        """
+        task = self.project.storage.tasks.claim_one(
+            self._claim_query(),
+            {'state': 'queued', 'worker': Task.worker.encode(self)},
+            sort=[('priority', -1), ('_time', 1)])
+
+        if task is not None and not task.ready:
+            self._give_back(task)
+            return None
+
+        return task
+
+    def claim_many(self, number):
+        """
+        Atomically claim several ready tasks in the DB for this worker
+
+        Like `claim_next`, but all tasks are claimed by a single update, which
+        pays off for many short tasks.
+
+        Parameters
+        ----------
+        number : int
+            the maximal number of tasks to claim
+
+        Returns
+        -------
+        list of `Task`
+            the claimed tasks, now `queued` and assigned to this worker
+
+        """
+        if number == 1:
+            task = self.claim_next()
+            return [] if task is None else [task]
+
+        claimed = self.project.storage.tasks.claim_many(
+            self._claim_query(),
+            {'state': 'queued', 'worker': Task.worker.encode(self)},
+            number,
+            sort=[('priority', -1), ('_time', 1)])
+
+        tasks = []
+        for task in claimed:
+            if task.ready:
+                tasks.append(task)
+            else:
+                self._give_back(task)
+
+        return tasks
+
     def execute(self, command):
         """
         Send and execute a single command to the worker
@@ -657,6 +1337,10 @@ class Worker(StorableMixin):
         """
         self.command = command
 
+        if self.__store__ is not None:
+            # wake up the worker if idle
+            self.__store__.storage.bell().ring(command=command)
+
     def run(self):
         """
         Start the worker to execute tasks until it is shut down
@@ -669,10 +1353,9 @@ class Worker(StorableMixin):
         last_n_tasks = 0
         self.seen = last
 
-        def task_test(x):
-            return x.ready and (not self.generators or (
-                hasattr(x.generator, 'name') and x.generator.name
-                in self.generators))
+        # poll at `sleep` while busy, back off to `max_sleep` while idle
+        backoff = PollingBackoff(self.sleep, max(self.sleep, self.max_sleep))
+        bell = project.storage.bell()
 
         logger.info('up and running ...')
 
@@ -689,64 +1372,85 @@ class Worker(StorableMixin):
 
                         logger.info('remove all pending tasks')
                         # remove all pending tasks as much as possible
+                        running = scheduler.running_tasks
                         for t in list(scheduler.tasks.values()):
-                            if t is not scheduler.current_task:
-                                if t.worker == self:
-                                    t.state = 'created'
-                                    t.worker = None
-
-                                del scheduler.tasks[t.__uuid__]
-
-                        # see, if we can salvage the currently running task
-                        # unless it has been cancelled and is running with another worker
-                        t = scheduler.current_task
-                        if t.worker == self and t.state == 'running':
-                            logger.info('continuing current task')
-                            # seems like the task is still ours to finish
-                            pass
-                        else:
-                            logger.info('current task has been captured. releasing.')
-                            scheduler.stop_current()
+                            if t not in running:
+                                scheduler.release_task(t)
+
+                        # see, if we can salvage the currently running tasks
+                        # unless cancelled and running with another worker
+                        for t in scheduler.running_tasks:
+                            if t.worker == self and t.state == 'running':
+                                logger.info('continuing current task')
+                                # seems like the task is still ours to finish
+                                pass
+                            else:
+                                logger.info('current task has been captured. releasing.')
+                                scheduler.stop_task(t)
 
                     # the main worker loop
+                    status = refresh_sync_variables(self, ['state', 'prefetch'])
                     while scheduler.state != 'down':
-                        state = self.state
+                        state = status['state']
+                        active = False
                         # check the state of the worker
                         if state in self._running_states:
                             scheduler.advance()
-                            if scheduler.is_idle:
-                                for _ in range(self.prefetch):
-                                    done = False
-                                    attempt = 0
-                                    retries = 10
-                                    while not done:
-
-                                        try:
-                                            tasklist = scheduler(
-                                                project.storage.tasks.modify_test_one(
-                                                 task_test, 'state', 'created', 'queued'))
-                                            done = True
-
-                                        except RuntimeError as e:
-                                            if attempt < retries:
-                                                logger.info("Connection Timeout #{0} ignored"
-                                                      .format(attempt))
-                                                attempt += 1
-                                                time.sleep(2)
-                                            else:
-                                                raise e
-
-                                    for task in tasklist:
-                                        task.worker = self
-                                        logger.info('queued a task [%s] from generator `%s`' % (
-                                            task.__class__.__name__,
-                                            task.generator.name if task.generator else '---'))
-
-                                self.n_tasks = len(scheduler.tasks)
+                            n_claimable = scheduler.n_claimable(
+                                status['prefetch'])
+                            if n_claimable > 0:
+                                done = False
+                                attempt = 0
+                                retries = 10
+                                while not done:
+
+                                    try:
+                                        # all tasks with a single update
+                                        claimed = self.claim_many(n_claimable)
+                                        done = True
+
+                                    except RuntimeError as e:
+                                        if attempt < retries:
+                                            logger.info("Connection Timeout #{0} ignored"
+                                                  .format(attempt))
+                                            attempt += 1
+                                            time.sleep(2)
+                                        else:
+                                            raise e
+
+                                if claimed:
+                                    active = True
+
+                                for task in scheduler(claimed):
+                                    logger.info('queued a task [%s] from generator `%s`' % (
+                                        task.__class__.__name__,
+                                        task.generator.name if task.generator else '---'))
+
+                        # a single round trip per iteration writes the
+                        # heartbeat and counters, reads the state and
+                        # consumes a pending command
+                        updates = {'command': None}
+                        if time.time() - last > self.heartbeat:
+                            # heartbeat
+                            last = time.time()
+                            updates['seen'] = last
+
+                        if scheduler.current_task is not self._last_current:
+                            updates['current'] = scheduler.current_task
+                            self._last_current = scheduler.current_task
+
+                        n_tasks = len(scheduler.tasks)
+                        if n_tasks != last_n_tasks:
+                            updates['n_tasks'] = n_tasks
+                            last_n_tasks = n_tasks
+
+                        status = exchange_sync_variables(
+                            self, updates, ['state', 'prefetch', 'command'])
 
                         # handle commands
-                        # todo: Place all commands in a separate store and consume ?!?
-                        command = self.command
+                        command = status['command']
+                        if command:
+                            active = True
 
                         if command == 'shutdown':
                             # someone wants us to shutdown
@@ -773,29 +1477,29 @@ class Worker(StorableMixin):
                                 )
                             )
 
-                        if command:
-                            self.command = None
+                        if active or scheduler.running_tasks:
+                            # running tasks are checked at the fastest rate
+                            backoff.reset()
+                        else:
+                            backoff.increase()
 
-                        if time.time() - last > self.heartbeat:
-                            # heartbeat
-                            last = time.time()
-                            self.seen = last
+                        # never wait past the next heartbeat, otherwise an
+                        # idle worker with a long `max_sleep` is marked dead
+                        delay = min(
+                            backoff.delay,
+                            max(0.1, last + self.heartbeat - time.time()))
+
+                        if scheduler.tasks or scheduler.state == 'down':
+                            time.sleep(delay)
+                        elif bell.wait(delay):
+                            # new tasks were queued
+                            backoff.reset()
 
-                        time.sleep(self.sleep)
                         if self.walltime and time.time() - self.__time__ > self.walltime:
                             # we have reached the set walltime and will shutdown
                             logger.info('hit walltime of %s' % DT(self.walltime).length)
                             scheduler.shut_down()
 
-                        if scheduler.current_task is not self._last_current:
-                            self.current = scheduler.current_task
-                            self._last_current = self.current
-
-                        n_tasks = len(scheduler.tasks)
-                        if n_tasks != last_n_tasks:
-                            self.n_tasks = n_tasks
-                            last_n_tasks = n_tasks
-
                 except (pymongo.errors.ConnectionFailure, pymongo.errors.AutoReconnect) as e:
                     logger.info('pymongo connection error', e)
                     logger.info('try reconnection after %d seconds' % self.reconnect_time)